@@ -1,31 +1,159 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, Response, current_app
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import perfil_de_configuracion
+from route_registry import RouteRegistry
 from db import db
+from db_routing import db_router
 from models import Usuarios, Sala, MiembroSala, Transaccion
 from forms import UserFrom, UserSignupForm, UserLoginForm
+from template_links import HtmlLinksExtension
+from identity import init_identity, get_current_user, user_cache
+from payments_client import payments_client, PaymentsServiceBusy, PaymentsServiceUnavailable
+from outbox import outbox_dispatcher, encolar_pago, encolar_lote
+from pagination import keyset_page, parse_limit
+from sql_instrumentation import sql_instrumentation
+from request_log import request_log
+from metrics import metrics
+from room_codes import room_code_allocator
+from password_hashing import password_hasher
+from revenue import acumular, init_revenue, totales_vendedor
+from reconciler import transaction_reconciler
+from payment_events import payment_events, estados_publicos
+from payment_state import payment_state
+from idempotency import idempotency_cache, IdempotencyKeyReused, IdempotencyTimeout
+from static_assets import static_assets
+from compression import response_compressor
+from sala_search import buscar_salas, CONDICIONES
+from sala_chat import chat_hub, ChatSaturado
+from rate_limit import rate_limiter, por_usuario
 from functools import wraps
+import os
 import requests
 import uuid
 import json
+import time
 from datetime import datetime
+from sqlalchemy import insert, select, update, func, exists
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
 
-# Crea la app
-app = Flask(__name__)
+# Rutas de la app; se registran en cada app que crea create_app
+rutas = RouteRegistry()
 
-USER_DB = 'postgres'
-USER_PASS = '1234'
-SERVER_DB = 'localhost'
-NAME_DB = 'demo'
+# Migraciones del modelo (`flask db ...`)
+migrate = Migrate()
 
-URL_DB = f'postgresql://{USER_DB}:{USER_PASS}@{SERVER_DB}/{NAME_DB}'
 
-# Variable de configuracion que se integra a Flask 
-app.config['SQLALCHEMY_DATABASE_URI'] = URL_DB
-app.config['SECRET_KEY'] = 'YOLOLO'
-db.init_app(app)  # inicializar la aplicacion
+def create_app(config=None):
+    """Crea y configura la aplicación.
+
+    `config` puede ser el nombre de un perfil de config.py ('development',
+    'production', 'testing'), una clase de configuración o un dict con valores
+    que se aplican sobre el perfil de APP_ENV. Después se leen las variables
+    de entorno con prefijo SHIFTING_.
+
+    Las extensiones de este proyecto son objetos globales por proceso: se usa
+    una app por proceso (el servidor de desarrollo o cada worker de gunicorn).
+    """
+    app = Flask(__name__)
+    
+    if isinstance(config, dict):
+        app.config.from_object(perfil_de_configuracion())
+        app.config.update(config)
+    elif isinstance(config, str) or config is None:
+        app.config.from_object(perfil_de_configuracion(config))
+    else:
+        app.config.from_object(config)
+    app.config.from_prefixed_env('SHIFTING')
+    
+    faltantes = [nombre for nombre in app.config.get('REQUIRED_ENV', ()) if not os.environ.get(nombre)]
+    if faltantes:
+        raise RuntimeError(f'Faltan variables de entorno para este perfil: {", ".join(faltantes)}')
+    
+    # Detrás del proxy, remote_addr (límites por IP, logs) debe ser el del cliente:
+    # PROXY_FIX_X_FOR es la cantidad de proxies de confianza delante de la app
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config.get('PROXY_FIX_X_PROTO', 1))
+    
+    # Opciones del pool y réplicas de lectura; tiene que ir antes de db.init_app
+    db_router.init_app(app)
+    
+    db.init_app(app)  # inicializar la aplicacion
+    
+    # Log de requests en JSON lines escrito desde un hilo de fondo; va primero
+    # para que su after_request corra último y vea el status final
+    request_log.init_app(app)
+    
+    # Contadores e histogramas para /metrics (Prometheus), sumados entre workers
+    metrics.init_app(app)
+    
+    # Conteo de consultas por request, log de consultas lentas y header Server-Timing
+    sql_instrumentation.init_app(app)
+    
+    # Reemplazar los links .html hardcodeados por rutas Flask al compilar los templates
+    app.jinja_env.add_extension(HtmlLinksExtension)
+    
+    # Caché de usuarios entre requests (ver identity.py)
+    init_identity(app)
+    
+    # Migrar el modelo
+    migrate.init_app(app, db)
+    
+    # Generador de códigos de sala sin colisiones
+    room_code_allocator.init_app(app)
+    
+    # Hashing de contraseñas en un pool de procesos acotado (503 si está lleno)
+    password_hasher.init_app(app)
+    
+    # Token buckets por IP y por usuario para login, signup y pagos (429 + Retry-After)
+    rate_limiter.init_app(app)
+    
+    # Acumulado de ingresos por vendedor y comando `flask recalcular-ingresos`
+    init_revenue(app)
+    
+    # Cliente compartido para el servicio de pagos
+    payments_client.init_app(app)
+    
+    # Despachador en segundo plano de la outbox de pagos
+    outbox_dispatcher.init_app(app)
+    
+    # Revisión periódica de transacciones abandonadas en 'pending'
+    transaction_reconciler.init_app(app)
+    
+    # Eventos SSE con el estado de cada transacción
+    payment_events.init_app(app)
+    
+    # Estado de los pagos en curso en la base (la cookie solo lleva un token)
+    payment_state.init_app(app)
+    
+    # Respuestas recientes de /initiate-payment por Idempotency-Key
+    idempotency_cache.init_app(app)
+    
+    # Chat en tiempo real de cada sala (SSE + escritura por lotes)
+    chat_hub.init_app(app)
+    
+    # CSS/JS con huella de contenido y variantes precomprimidas (`flask assets build`)
+    static_assets.init_app(app)
+    
+    # gzip/brotli para HTML, JSON y streams, con LRU de respuestas idénticas
+    response_compressor.init_app(app)
+    
+    rutas.init_app(app)
+    return app
+
+
+def __getattr__(nombre):
+    # `from app import app` y `flask --app app` crean la app solo cuando se
+    # pide, así importar el módulo para usar create_app('production') no arma
+    # además una app con el perfil por defecto
+    if nombre == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {nombre!r}')
 
-# Migrar el modelo
-migrate = Migrate(app, db)
 
 # Decorador para rutas que requieren autenticación
 def login_required(f):
@@ -37,13 +165,19 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Arrancar los hilos de la outbox y el reconciliador con el primer request de este proceso
+@rutas.before_request
+def iniciar_outbox():
+    outbox_dispatcher.ensure_started()
+    transaction_reconciler.ensure_started()
+
 # Context processor para inyectar URLs en todos los templates
-@app.context_processor
+@rutas.context_processor
 def inject_urls():
     """Inyecta URLs de navegación para que los templates puedan usarlas"""
     return dict(
         # Usuario actual
-        current_user=Usuarios.query.get(session.get('user_id')) if 'user_id' in session else None,
+        current_user=get_current_user(),
         is_authenticated='user_id' in session,
         # URLs principales
         url_inicio=url_for('inicio'),
@@ -56,47 +190,16 @@ def inject_urls():
         url_mis_salas=url_for('mis_salas'),
     )
 
-# Middleware para reemplazar automáticamente links hardcodeados en HTML
-@app.after_request
-def fix_html_links(response):
-    """Reemplaza automáticamente los links .html por rutas Flask"""
-    if response.content_type and 'text/html' in response.content_type:
-        data = response.get_data(as_text=True)
-        
-        # Mapeo de archivos HTML a rutas
-        replacements = {
-            'href="index.html"': f'href="{url_for("dashboard")}"',
-            "href='index.html'": f"href='{url_for('dashboard')}'",
-            'href="crear-sala.html"': f'href="{url_for("crear_sala")}"',
-            "href='crear-sala.html'": f"href='{url_for('crear_sala')}'",
-            'href="compartir-sala.html"': f'href="{url_for("compartir_sala")}"',
-            "href='compartir-sala.html'": f"href='{url_for('compartir_sala')}'",
-            'href="signup.html"': f'href="{url_for("signup")}"',
-            "href='signup.html'": f"href='{url_for('signup')}'",
-            'href="login.html"': f'href="{url_for("login")}"',
-            "href='login.html'": f"href='{url_for('login')}'",
-            'href="principal.html"': f'href="{url_for("inicio")}"',
-            "href='principal.html'": f"href='{url_for('inicio')}'",
-        }
-        
-        # Reemplazar cada ocurrencia
-        for old, new in replacements.items():
-            data = data.replace(old, new)
-        
-        response.set_data(data)
-    
-    return response
-
-
 # ========== RUTAS PÚBLICAS ==========
 
-@app.route('/')
+@rutas.route('/')
 def inicio():
     """Landing page principal - Página pública de bienvenida"""
     return render_template('principal.html')
 
 
-@app.route('/signup', methods=['GET', 'POST'])
+@rutas.route('/signup', methods=['GET', 'POST'])
+@rate_limiter.limit('signup_ip')
 def signup():
     """Registro de nuevos usuarios"""
     form = UserSignupForm()
@@ -130,17 +233,25 @@ def signup():
     return render_template('signup.html', formulario=form)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@rutas.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit('login_ip')
 def login():
     """Inicio de sesión - Solo email y contraseña"""
     form = UserLoginForm()
     
     if request.method == 'POST':
         if form.validate_on_submit():
+            # Límite por cuenta antes de gastar CPU en scrypt (credential stuffing sobre un mismo email)
+            rate_limiter.consumir('login_usuario', form.email.data.strip().lower())
+            
             # Buscar usuario por email
             user = Usuarios.query.filter_by(email=form.email.data).first()
             
             if user and user.check_password(form.password.data):
+                # Guardar el hash actualizado si cambiaron los parámetros de scrypt
+                if user in db.session.dirty:
+                    db.session.commit()
+                
                 # Credenciales correctas - iniciar sesión
                 session['user_id'] = user.id
                 session['user_name'] = user.name
@@ -154,7 +265,7 @@ def login():
     return render_template('login.html', formulario=form)
 
 
-@app.route('/logout')
+@rutas.route('/logout')
 def logout():
     """Cerrar sesión del usuario"""
     user_name = session.get('user_name', 'Usuario')
@@ -165,15 +276,18 @@ def logout():
 
 # ========== RUTAS PROTEGIDAS (REQUIEREN AUTENTICACIÓN) ==========
 
-@app.route('/dashboard')
+@rutas.route('/dashboard')
 @login_required
+@db_router.solo_lectura
 def dashboard():
     """Panel principal del usuario autenticado"""
-    user = Usuarios.query.get(session['user_id'])
-    return render_template('user_view.html', user=user)
+    user = get_current_user()
+    # Totales del vendedor desde el acumulado diario, sin recorrer transacciones
+    ingresos = totales_vendedor(user.id) if user else []
+    return render_template('user_view.html', user=user, ingresos=ingresos)
 
 
-@app.route('/crear-sala', methods=['GET', 'POST'])
+@rutas.route('/crear-sala', methods=['GET', 'POST'])
 @login_required
 def crear_sala():
     """Formulario para crear una nueva sala de negociación"""
@@ -194,7 +308,20 @@ def crear_sala():
         nueva_sala.creador_id = session['user_id']
         
         db.session.add(nueva_sala)
-        db.session.commit()
+        
+        # Los códigos nuevos nunca se repiten entre sí, pero pueden coincidir
+        # con una sala antigua de códigos aleatorios: en ese caso se toma otro
+        for _ in range(3):
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                db.session.add(nueva_sala)
+                nueva_sala.codigo = Sala.generar_codigo()
+        else:
+            flash('No se pudo crear la sala. Intenta de nuevo.', 'error')
+            return redirect(url_for('crear_sala'))
         
         # Guardar ID de la sala en sesión para mostrarla
         session['ultima_sala_id'] = nueva_sala.id
@@ -205,25 +332,19 @@ def crear_sala():
     return render_template('crear-sala.html')
 
 
-@app.route('/compartir-sala')
+@rutas.route('/compartir-sala')
 @login_required
 def compartir_sala():
     """Página para compartir link/código de la sala creada"""
     # Obtener la última sala creada
     sala_id = session.get('ultima_sala_id')
     
-    print(f"DEBUG: sala_id en sesión: {sala_id}")  # Debug
-    
     if not sala_id:
         flash('No hay ninguna sala creada. Crea una primero.', 'warning')
         return redirect(url_for('crear_sala'))
     
     sala = Sala.query.get(sala_id)
     
-    print(f"DEBUG: sala encontrada: {sala}")  # Debug
-    if sala:
-        print(f"DEBUG: código: {sala.codigo}, link: {sala.get_link()}")  # Debug
-    
     if not sala:
         flash('Sala no encontrada.', 'error')
         return redirect(url_for('crear_sala'))
@@ -231,40 +352,52 @@ def compartir_sala():
     return render_template('compartir-sala.html', sala=sala)
 
 
-@app.route('/sala/<codigo>')
+@rutas.route('/sala/<codigo>')
 @login_required
+@db_router.solo_lectura
 def ver_sala(codigo):
     """Ver detalles de una sala específica por código"""
-    sala = Sala.query.filter_by(codigo=codigo).first()
+    user_id = session.get('user_id')
     
-    if not sala:
+    # Sala + creador (JOIN por la relación Sala.creador) + conteo de miembros y
+    # membresía del usuario actual calculados en SQL, todo en una consulta
+    total_miembros = select(func.count(MiembroSala.id)).where(MiembroSala.sala_id == Sala.id).scalar_subquery()
+    ya_unido = exists().where(MiembroSala.sala_id == Sala.id, MiembroSala.usuario_id == user_id)
+    
+    fila = db.session.execute(
+        select(Sala, total_miembros.label('total_miembros'), ya_unido.label('ya_unido'))
+        .options(joinedload(Sala.creador))
+        .where(Sala.codigo == codigo)
+    ).first()
+    
+    if not fila:
         flash('Sala no encontrada.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Obtener información del creador
-    creador = Usuarios.query.get(sala.creador_id)
+    sala = fila.Sala
     
     # Verificar si el usuario actual es el creador
-    user_id = session.get('user_id')
     es_creador = (user_id == sala.creador_id)
     
-    # Verificar si el usuario ya está en la sala
-    ya_unido = MiembroSala.query.filter_by(sala_id=sala.id, usuario_id=user_id).first() is not None
-    
-    # Obtener todos los miembros de la sala
-    miembros = db.session.query(MiembroSala, Usuarios).join(
-        Usuarios, MiembroSala.usuario_id == Usuarios.id
-    ).filter(MiembroSala.sala_id == sala.id).all()
+    # Solo las columnas que muestra el template, con tope de miembros renderizados
+    miembros = db.session.execute(
+        select(Usuarios.name, Usuarios.lastanme)
+        .join(MiembroSala, MiembroSala.usuario_id == Usuarios.id)
+        .where(MiembroSala.sala_id == sala.id)
+        .order_by(MiembroSala.fecha_union)
+        .limit(current_app.config['VER_SALA_MAX_MIEMBROS'])
+    ).all()
     
     return render_template('ver-sala.html', 
                          sala=sala, 
-                         creador=creador, 
+                         creador=sala.creador, 
                          es_creador=es_creador,
-                         ya_unido=ya_unido,
-                         miembros=miembros)
+                         ya_unido=bool(fila.ya_unido),
+                         miembros=miembros,
+                         total_miembros=fila.total_miembros)
 
 
-@app.route('/sala/<codigo>/unirse', methods=['POST'])
+@rutas.route('/sala/<codigo>/unirse', methods=['POST'])
 @login_required
 def unirse_sala(codigo):
     """Unirse a una sala como comprador"""
@@ -300,7 +433,7 @@ def unirse_sala(codigo):
     return redirect(url_for('ver_sala', codigo=codigo))
 
 
-@app.route('/sala/<codigo>/salir', methods=['POST'])
+@rutas.route('/sala/<codigo>/salir', methods=['POST'])
 @login_required
 def salir_sala(codigo):
     """Salir de una sala"""
@@ -326,7 +459,7 @@ def salir_sala(codigo):
     return redirect(url_for('mis_salas'))
 
 
-@app.route('/unirse-por-codigo', methods=['POST'])
+@rutas.route('/unirse-por-codigo', methods=['POST'])
 @login_required
 def unirse_por_codigo():
     """Unirse a una sala ingresando el código"""
@@ -356,26 +489,249 @@ def unirse_por_codigo():
     return redirect(url_for('ver_sala', codigo=codigo))
 
 
-@app.route('/mis-salas')
+@rutas.route('/mis-salas')
 @login_required
+@db_router.solo_lectura
 def mis_salas():
-    """Listar todas las salas creadas por el usuario actual"""
+    """Listar las salas creadas por el usuario actual, paginadas por cursor"""
     user_id = session.get('user_id')
-    salas = Sala.query.filter_by(creador_id=user_id, activa=True).order_by(Sala.fecha_creacion.desc()).all()
+    query = Sala.query.filter_by(creador_id=user_id, activa=True)
+    salas, siguiente_cursor = keyset_page(query, Sala.fecha_creacion, Sala.id,
+                                          request.args.get('cursor'),
+                                          parse_limit(request.args.get('limit'), default=12))
+    
+    return render_template('mis-salas.html', salas=salas, siguiente_cursor=siguiente_cursor)
+
+
+@rutas.route('/buscar-salas')
+@login_required
+@db_router.solo_lectura
+def buscar_salas_route():
+    """Buscar salas por texto en nombre y descripción, con filtros y paginación por cursor.
+
+    Parámetros: q, condicion (Nuevo/Usado), precio_min, precio_max,
+    activa (1 por defecto, 0 para cerradas, 'todas' sin filtro), cursor y limit.
+    """
+    args = request.args
+    
+    condicion = args.get('condicion') or None
+    if condicion is not None and condicion not in CONDICIONES:
+        return jsonify({'success': False, 'error': f'condicion debe ser una de: {", ".join(CONDICIONES)}'}), 400
+    
+    try:
+        precio_min = float(args['precio_min']) if args.get('precio_min') else None
+        precio_max = float(args['precio_max']) if args.get('precio_max') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'precio_min y precio_max deben ser números'}), 400
     
-    return render_template('mis-salas.html', salas=salas)
+    activa = args.get('activa', '1').lower()
+    activa = None if activa == 'todas' else activa not in ('0', 'false', 'no')
     
-    return render_template('invitar-chat.html', sala=sala)
+    salas, siguiente_cursor = buscar_salas(args.get('q'), condicion=condicion, precio_min=precio_min,
+                                           precio_max=precio_max, activa=activa, cursor=args.get('cursor'),
+                                           limit=parse_limit(args.get('limit')))
+    
+    return jsonify({
+        'success': True,
+        'salas': [sala.to_dict() for sala in salas],
+        'next_cursor': siguiente_cursor
+    })
+
+
+@rutas.route('/sala/<codigo>/chat', methods=['POST'])
+@login_required
+def enviar_mensaje_chat(codigo):
+    """Publicar un mensaje en el chat de la sala (creador o miembros)"""
+    sala_id = chat_hub.sala_con_acceso(codigo, session.get('user_id'))
+    if sala_id is None:
+        return jsonify({'success': False, 'error': 'No tienes acceso al chat de esta sala'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    texto = (data.get('texto') or '').strip()
+    if not texto:
+        return jsonify({'success': False, 'error': 'Campo requerido: texto'}), 400
+    if len(texto) > chat_hub.max_length:
+        return jsonify({'success': False, 'error': f'El mensaje supera {chat_hub.max_length} caracteres'}), 400
+    
+    try:
+        mensaje = chat_hub.publicar(sala_id, get_current_user(), texto)
+    except ChatSaturado:
+        return jsonify({'success': False, 'error': 'Chat saturado, intenta de nuevo'}), 503, {'Retry-After': '1'}
+    
+    return jsonify({'success': True, 'mensaje': mensaje}), 201
+
+
+@rutas.route('/sala/<codigo>/chat/eventos')
+@login_required
+def eventos_chat(codigo):
+    """Stream SSE con los mensajes recientes del chat de la sala y los nuevos"""
+    sala_id = chat_hub.sala_con_acceso(codigo, session.get('user_id'))
+    if sala_id is None:
+        return jsonify({'success': False, 'error': 'No tienes acceso al chat de esta sala'}), 403
+    
+    # Cada stream ocupa un hilo del worker: pasado el límite, el navegador sigue por polling
+    if not chat_hub.reservar_stream():
+        return jsonify({'success': False, 'error': 'Demasiadas conexiones de chat abiertas'}), 503, {
+            'Retry-After': '30'}
+    
+    try:
+        sala = chat_hub.abrir(sala_id)
+    except Exception:
+        chat_hub.liberar_stream()
+        raise
+    # Liberar la conexión a la base antes de quedarse esperando mensajes
+    db.session.remove()
+    
+    response = Response(chat_hub.stream(sala), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(chat_hub.liberar_stream)
+    return response
+
+
+@rutas.route('/sala/<codigo>/chat/mensajes')
+@login_required
+def mensajes_chat(codigo):
+    """Mensajes del chat guardados después de `desde` (id); alternativa por polling al stream SSE"""
+    sala_id = chat_hub.sala_con_acceso(codigo, session.get('user_id'))
+    if sala_id is None:
+        return jsonify({'success': False, 'error': 'No tienes acceso al chat de esta sala'}), 403
+    
+    desde = request.args.get('desde', 0, type=int)
+    return jsonify({'success': True, 'mensajes': chat_hub.mensajes_desde(sala_id, desde)})
 
 
 # ========== RUTAS DE PAGOS OPEN PAYMENTS ==========
 
-PAYMENTS_SERVICE_URL = 'http://localhost:3001'
+# Usar siempre aledev como sender (tenemos las keys)
+SENDER_WALLET = '$ilp.interledger-test.dev/aledev'
+
+def validar_pago_sala(sala, user_id, receiver_wallet, amount=None):
+    """Valida que el usuario pueda pagar la sala. Devuelve (error, status) o None si es válido"""
+    # Verificar que la sala exista y esté activa
+    if not sala:
+        return 'Sala no encontrada', 404
+    
+    if not sala.activa:
+        return 'Esta sala ya no está disponible', 403
+    
+    # Verificar que el usuario no sea el creador de la sala
+    if sala.creador_id == user_id:
+        return 'No puedes pagar tu propio producto', 403
+    
+    # VALIDACIÓN CRÍTICA: El monto debe ser exactamente el precio de la sala
+    if amount is not None and abs(float(amount) - sala.precio) > 0.01:  # Tolerancia de 1 centavo por redondeo
+        return f'Monto inválido. El precio exacto es ${sala.precio:.2f} USD', 400
+    
+    # Validar formato del Payment Pointer
+    if not receiver_wallet.startswith('$'):
+        return 'La billetera debe usar formato Payment Pointer ($domain/user)', 400
+    
+    return None
+
+
+def respuesta_pago_iniciado(transaction_id):
+    """Respuesta de initiate_payment para un pago creado (o repetido con la misma clave)"""
+    return {
+        'success': True,
+        'transactionId': transaction_id,
+        'status': 'initiated',
+        'statusUrl': url_for('estado_transaccion', transaction_id=transaction_id),
+        'eventsUrl': url_for('eventos_transaccion', transaction_id=transaction_id)
+    }, 202
 
-@app.route('/initiate-payment', methods=['POST'])
+
+def crear_pago(data, user_id, idempotency_key):
+    """Valida y crea la transacción de un pago. Devuelve (body, status)"""
+    usuario = get_current_user()
+    
+    if not usuario:
+        return {'success': False, 'error': 'Usuario no encontrado'}, 404
+    
+    sala = db.session.get(Sala, data['salaId'])
+    receiver_wallet = data['receiverWallet'].strip()
+    
+    invalido = validar_pago_sala(sala, user_id, receiver_wallet, data['amount'])
+    if invalido:
+        error, status_code = invalido
+        return {'success': False, 'error': error}, status_code
+    
+    # La clave ya se usó en otro proceso o antes de que la caché la olvidara
+    existente = Transaccion.query.filter_by(sender_id=user_id, idempotency_key=idempotency_key).first()
+    if existente:
+        if existente.sala_id != sala.id:
+            return {'success': False, 'error': 'La Idempotency-Key ya se usó con otro pago'}, 422
+        return respuesta_pago_iniciado(existente.transaction_id)
+    
+    # Generar ID único para la transacción
+    transaction_id = str(uuid.uuid4())
+    
+    # Crear registro de transacción en la base de datos ANTES del pago
+    nueva_transaccion = Transaccion(
+        transaction_id=transaction_id,
+        sala_id=sala.id,
+        sender_id=user_id,
+        receiver_wallet=receiver_wallet,
+        amount=sala.precio,  # Usar siempre el precio exacto de la sala
+        currency='USD',
+        status='initiated',
+        idempotency_key=idempotency_key
+    )
+    
+    # Preparar datos para el servicio de pagos
+    payment_data = {
+        'senderWallet': SENDER_WALLET,
+        'receiverWallet': receiver_wallet,
+        'amount': sala.precio,  # Usar siempre el precio exacto de la sala
+        'currency': 'USD',
+        'transactionId': transaction_id
+    }
+    
+    # La transacción, su entrada de outbox y el estado que necesita
+    # payment_callback se guardan en el mismo commit; el despachador llama
+    # al servicio de pagos en segundo plano
+    try:
+        db.session.add(nueva_transaccion)
+        encolar_pago(nueva_transaccion, payment_data)
+        payment_state.guardar([{
+            'transaction_id': transaction_id,
+            'sala_id': sala.id,
+            'sender_id': user_id,
+            'amount': sala.precio,
+            'receiver_wallet': receiver_wallet,
+        }])
+        db.session.commit()
+    except IntegrityError:
+        # Otro proceso creó el pago con la misma clave mientras tanto
+        db.session.rollback()
+        existente = Transaccion.query.filter_by(sender_id=user_id, idempotency_key=idempotency_key).first()
+        if not existente:
+            return {'success': False, 'error': 'Error creando transacción'}, 500
+        if existente.sala_id != sala.id:
+            return {'success': False, 'error': 'La Idempotency-Key ya se usó con otro pago'}, 422
+        return respuesta_pago_iniciado(existente.transaction_id)
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'error': 'Error creando transacción'}, 500
+    
+    outbox_dispatcher.notify()
+    
+    return respuesta_pago_iniciado(transaction_id)
+
+
+@rutas.route('/initiate-payment', methods=['POST'])
 @login_required
+@rate_limiter.limit('pago_ip')
+@rate_limiter.limit('pago_usuario', clave=por_usuario)
 def initiate_payment():
-    """Iniciar un pago usando Open Payments"""
+    """Iniciar un pago usando Open Payments.
+
+    Acepta el header Idempotency-Key; sin él se deriva una clave de la sala y
+    una ventana de IDEMPOTENCY_WINDOW segundos. Un request repetido recibe la
+    respuesta original (con el header Idempotent-Replayed) y los duplicados
+    simultáneos esperan al primero en lugar de crear otro pago.
+    """
     try:
         data = request.get_json()
         
@@ -385,111 +741,179 @@ def initiate_payment():
             if field not in data:
                 return jsonify({'success': False, 'error': f'Campo requerido: {field}'}), 400
         
-        # Obtener información del usuario actual
         user_id = session.get('user_id')
-        usuario = Usuarios.query.get(user_id)
-        
-        if not usuario:
-            return jsonify({'success': False, 'error': 'Usuario no encontrado'}), 404
-        
-        # Verificar que la sala exista y esté activa
-        sala = Sala.query.get(data['salaId'])
-        if not sala:
-            return jsonify({'success': False, 'error': 'Sala no encontrada'}), 404
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:255]
+        if not idempotency_key:
+            ventana = int(time.time() // current_app.config['IDEMPOTENCY_WINDOW'])
+            idempotency_key = f'auto:{data["salaId"]}:{ventana}'
+        huella = (str(data['salaId']), str(data['receiverWallet']).strip(), str(data['amount']))
         
-        if not sala.activa:
-            return jsonify({'success': False, 'error': 'Esta sala ya no está disponible'}), 403
+        try:
+            (body, status_code), repetido = idempotency_cache.ejecutar_una_vez(
+                (user_id, idempotency_key), huella,
+                lambda: crear_pago(data, user_id, idempotency_key),
+                guardar=lambda resultado: resultado[1] == 202,
+            )
+        except IdempotencyKeyReused:
+            return jsonify({'success': False, 'error': 'La Idempotency-Key ya se usó con otro pago'}), 422
+        except IdempotencyTimeout:
+            return jsonify({'success': False, 'error': 'El pago original sigue en proceso'}), 409, {'Retry-After': '1'}
         
-        # Verificar que el usuario no sea el creador de la sala
-        if sala.creador_id == user_id:
-            return jsonify({'success': False, 'error': 'No puedes pagar tu propio producto'}), 403
+        response = jsonify(body)
+        if repetido:
+            response.headers['Idempotent-Replayed'] = 'true'
+        return response, status_code
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def sala_id_entero(valor):
+    """salaId del JSON como entero (acepta "5"); None si no es un id válido"""
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        return None
+
+
+@rutas.route('/initiate-payments', methods=['POST'])
+@login_required
+@rate_limiter.limit('pago_ip')
+def initiate_payments_batch():
+    """Iniciar el pago de varias salas en un solo request (checkout de varias salas)"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'Campo requerido: items'}), 400
+    
+    if len(items) > current_app.config['PAYMENT_BATCH_MAX_ITEMS']:
+        return jsonify({
+            'success': False,
+            'error': f'Máximo {current_app.config["PAYMENT_BATCH_MAX_ITEMS"]} salas por lote'
+        }), 400
+    
+    # Cada sala del lote cuenta como un pago para el límite por usuario
+    rate_limiter.consumir('pago_usuario', session.get('user_id'), costo=len(items))
+    
+    user_id = session.get('user_id')
+    if not get_current_user():
+        return jsonify({'success': False, 'error': 'Usuario no encontrado'}), 404
+    
+    # Cargar todas las salas del lote en una sola consulta
+    sala_ids = {sala_id_entero(item.get('salaId')) for item in items if isinstance(item, dict)} - {None}
+    salas = {sala.id: sala for sala in Sala.query.filter(Sala.id.in_(sala_ids)).all()}
+    
+    resultados = []
+    transacciones = []
+    pagos = []
+    vistas = set()
+    
+    for item in items:
+        if not isinstance(item, dict) or 'salaId' not in item or 'receiverWallet' not in item:
+            resultados.append({'success': False, 'error': 'Campos requeridos: salaId, receiverWallet', 'status': 400})
+            continue
         
-        # VALIDACIÓN CRÍTICA: El monto debe ser exactamente el precio de la sala
-        amount_received = float(data['amount'])
-        if abs(amount_received - sala.precio) > 0.01:  # Tolerancia de 1 centavo por redondeo
-            return jsonify({
-                'success': False, 
-                'error': f'Monto inválido. El precio exacto es ${sala.precio:.2f} USD'
-            }), 400
+        sala_id = sala_id_entero(item['salaId'])
+        if sala_id is None:
+            resultados.append({'salaId': item['salaId'], 'success': False, 'error': 'salaId inválido', 'status': 400})
+            continue
+        if sala_id in vistas:
+            resultados.append({'salaId': sala_id, 'success': False, 'error': 'Sala repetida en el lote', 'status': 400})
+            continue
         
-        # Validar formato del Payment Pointer
-        receiver_wallet = data['receiverWallet'].strip()
-        if not receiver_wallet.startswith('$'):
-            return jsonify({
-                'success': False, 
-                'error': 'La billetera debe usar formato Payment Pointer ($domain/user)'
-            }), 400
+        sala = salas.get(sala_id)
+        receiver_wallet = str(item['receiverWallet']).strip()
+        try:
+            invalido = validar_pago_sala(sala, user_id, receiver_wallet, item.get('amount'))
+        except (TypeError, ValueError):
+            invalido = ('Monto inválido', 400)
+        if invalido:
+            error, status_code = invalido
+            resultados.append({'salaId': sala_id, 'success': False, 'error': error, 'status': status_code})
+            continue
         
-        # Generar ID único para la transacción
+        vistas.add(sala_id)
         transaction_id = str(uuid.uuid4())
-        
-        # Crear registro de transacción en la base de datos ANTES del pago
-        nueva_transaccion = Transaccion(
-            transaction_id=transaction_id,
-            sala_id=sala.id,
-            sender_id=user_id,
-            receiver_wallet=receiver_wallet,
-            amount=sala.precio,  # Usar siempre el precio exacto de la sala
-            currency='USD',
-            status='initiated'
-        )
-        
+        transacciones.append({
+            'transaction_id': transaction_id,
+            'sala_id': sala.id,
+            'sender_id': user_id,
+            'receiver_wallet': receiver_wallet,
+            'amount': sala.precio,  # Usar siempre el precio exacto de la sala
+            'currency': 'USD',
+            'status': 'initiated',
+        })
+        pagos.append({
+            'senderWallet': SENDER_WALLET,
+            'receiverWallet': receiver_wallet,
+            'amount': sala.precio,
+            'currency': 'USD',
+            'transactionId': transaction_id,
+        })
+        resultados.append({
+            'salaId': sala_id,
+            'success': True,
+            'transactionId': transaction_id,
+            'status': 202,
+            'statusUrl': url_for('estado_transaccion', transaction_id=transaction_id),
+            'eventsUrl': url_for('eventos_transaccion', transaction_id=transaction_id),
+        })
+    
+    if transacciones:
+        # Todas las transacciones y sus entradas de outbox en un solo commit;
+        # el despachador reparte las llamadas con su límite de concurrencia
         try:
-            db.session.add(nueva_transaccion)
+            db.session.execute(insert(Transaccion), transacciones)
+            encolar_lote(pagos)
+            payment_state.guardar([{
+                campo: transaccion[campo]
+                for campo in ('transaction_id', 'sala_id', 'sender_id', 'amount', 'receiver_wallet')
+            } for transaccion in transacciones])
             db.session.commit()
         except Exception as e:
             db.session.rollback()
-            return jsonify({'success': False, 'error': 'Error creando transacción'}), 500
+            return jsonify({'success': False, 'error': 'Error creando transacciones'}), 500
         
-        # Preparar datos para el servicio de pagos
-        payment_data = {
-            'senderWallet': '$ilp.interledger-test.dev/aledev',  # Usar siempre aledev como sender (tenemos las keys)
-            'receiverWallet': receiver_wallet,
-            'amount': sala.precio,  # Usar siempre el precio exacto de la sala
-            'currency': 'USD',
-            'transactionId': transaction_id
-        }
-        
-        # Llamar al servicio de pagos
-        try:
-            import requests
-            response = requests.post(f'{PAYMENTS_SERVICE_URL}/initiate-payment', 
-                                   json=payment_data, 
-                                   timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('success'):
-                    # Guardar información de la transacción en la sesión
-                    session[f'transaction_{transaction_id}'] = {
-                        'sala_id': sala.id,
-                        'sender_id': user_id,
-                        'amount': payment_data['amount'],
-                        'receiver_wallet': payment_data['receiverWallet'],
-                        'continueUri': result.get('continueUri'),
-                        'continueToken': result.get('continueToken'),
-                        'timestamp': datetime.now().isoformat()
-                    }
-                    
-                    return jsonify({
-                        'success': True,
-                        'transactionId': transaction_id,
-                        'interactionUrl': result['interactionUrl'],
-                        'quote': result['quote']
-                    })
-                else:
-                    return jsonify({'success': False, 'error': result.get('error', 'Error desconocido')}), 500
-            else:
-                return jsonify({'success': False, 'error': 'Error comunicándose con el servicio de pagos'}), 500
-                
-        except requests.RequestException as e:
-            return jsonify({'success': False, 'error': f'Error de conexión: {str(e)}'}), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        # El INSERT por lote no pasa por los eventos de sesión
+        metrics.transicion(None, 'initiated', len(transacciones))
+        outbox_dispatcher.notify()
+    
+    return jsonify({
+        'success': bool(transacciones),
+        'aceptados': len(transacciones),
+        'rechazados': len(resultados) - len(transacciones),
+        'resultados': resultados
+    }), 202 if transacciones else 400
+
+
+def cerrar_transaccion(transaction_id, hacia, **valores):
+    """Pasa la transacción al estado final `hacia` solo si sigue en curso (sin commit).
 
+    UPDATE condicionado, como el reconciliador: si este ya la cerró entre la
+    consulta y el UPDATE no se toca, y las completadas se suman al acumulado
+    de ingresos una sola vez. Devuelve True si la fila cambió.
+    """
+    for desde in ('pending', 'initiated'):
+        filas = db.session.execute(
+            update(Transaccion)
+            .where(Transaccion.transaction_id == transaction_id, Transaccion.status == desde)
+            .values(status=hacia, **valores)
+            .returning(Transaccion.sala_id, Transaccion.amount, Transaccion.currency,
+                       Transaccion.fecha_completado, Transaccion.fecha_creacion)
+        ).all()
+        if filas:
+            if hacia == 'completed':
+                # El UPDATE por lote no pasa por el hook de sesión de revenue.py
+                acumular(db.session.connection(), filas)
+            metrics.transicion(desde, hacia)
+            return True
+    return False
 
-@app.route('/payment-callback/<transaction_id>')
+
+@rutas.route('/payment-callback/<transaction_id>')
 def payment_callback(transaction_id):
     """Callback después de la autorización del usuario en Open Payments"""
     try:
@@ -500,60 +924,64 @@ def payment_callback(transaction_id):
             flash('Error: No se recibió referencia de interacción', 'error')
             return redirect(url_for('dashboard'))
         
-        # Verificar que la transacción exista en la sesión
-        transaction_key = f'transaction_{transaction_id}'
-        if transaction_key not in session:
+        # El pago debe seguir en curso y pertenecer a este navegador o usuario
+        pago = payment_state.obtener(transaction_id)
+        if not pago or (pago.session_token != payment_state.token_de_sesion(crear=False)
+                        and pago.sender_id != session.get('user_id')):
             flash('Error: Transacción no encontrada', 'error')
             return redirect(url_for('dashboard'))
         
-        transaction_info = session[transaction_key]
+        sala_id = pago.sala_id
         
-        # Completar el pago con los datos guardados
+        # Completar el pago con los datos del grant que guardó el despachador de outbox
         try:
-            import requests
-            response = requests.post(f'{PAYMENTS_SERVICE_URL}/complete-payment/{transaction_id}',
-                                   json={
-                                       'interact_ref': interact_ref,
-                                       'continueUri': transaction_info.get('continueUri'),
-                                       'continueToken': transaction_info.get('continueToken')
-                                   },
-                                   timeout=30)
+            response = payments_client.complete_payment(transaction_id, {
+                'interact_ref': interact_ref,
+                'continueUri': pago.continue_uri,
+                'continueToken': pago.continue_token
+            })
             
             if response.status_code == 200:
                 result = response.json()
                 if result.get('success'):
                     # Actualizar el estado de la transacción en la base de datos
-                    transaccion = Transaccion.query.filter_by(transaction_id=transaction_id).first()
-                    if transaccion:
-                        transaccion.status = 'completed'
-                        transaccion.payment_id = result.get('paymentId')
-                        transaccion.fecha_completado = datetime.now()
-                        try:
-                            db.session.commit()
-                        except Exception as e:
-                            db.session.rollback()
-                            print(f"Error actualizando transacción: {e}")
+                    # (si el reconciliador ya la completó, no se vuelve a sumar)
+                    cambio = cerrar_transaccion(transaction_id, 'completed', payment_id=result.get('paymentId'),
+                                                fecha_completado=datetime.utcnow())
                     
-                    # Limpiar la sesión
-                    session.pop(transaction_key, None)
+                    # El pago ya no está en curso
+                    payment_state.eliminar(transaction_id)
+                    try:
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        current_app.logger.exception('Error actualizando transacción %s', transaction_id)
+                    else:
+                        if cambio:
+                            payment_events.notificar([transaction_id])
                     
                     flash(f'Pago completado exitosamente! ID: {result["paymentId"]}', 'success')
-                    return redirect(url_for('ver_sala', codigo=Sala.query.get(transaction_info['sala_id']).codigo))
+                    return redirect(url_for('ver_sala', codigo=db.session.get(Sala, sala_id).codigo))
                 else:
-                    # Marcar transacción como fallida
-                    transaccion = Transaccion.query.filter_by(transaction_id=transaction_id).first()
-                    if transaccion:
-                        transaccion.status = 'failed'
-                        transaccion.error_message = result.get('error', 'Error desconocido')
+                    # Marcar transacción como fallida (salvo que ya tenga un estado final)
+                    error = result.get('error', 'Error desconocido')
+                    if cerrar_transaccion(transaction_id, 'failed', error_message=error):
                         try:
                             db.session.commit()
                         except:
                             db.session.rollback()
+                        else:
+                            payment_events.notificar([transaction_id])
                     
                     flash(f'Error completando el pago: {result.get("error")}', 'error')
             else:
                 flash('Error comunicándose con el servicio de pagos', 'error')
                 
+        except PaymentsServiceBusy:
+            # Sin redirigir: recargar esta misma URL reintenta el callback con el mismo interact_ref
+            return 'El servicio de pagos está ocupado. Recarga esta página en unos segundos.', 503, {
+                'Retry-After': '5',
+            }
         except requests.RequestException as e:
             flash(f'Error de conexión: {str(e)}', 'error')
             
@@ -563,62 +991,137 @@ def payment_callback(transaction_id):
     return redirect(url_for('dashboard'))
 
 
-@app.route('/payment-status/<transaction_id>')
+@rutas.route('/payment-status/<transaction_id>')
 @login_required
 def payment_status(transaction_id):
     """Obtener estado de una transacción"""
     try:
-        import requests
-        response = requests.get(f'{PAYMENTS_SERVICE_URL}/transaction-status/{transaction_id}',
-                              timeout=10)
+        response = payments_client.transaction_status(transaction_id)
         
         if response.status_code == 200:
             return jsonify(response.json())
         else:
             return jsonify({'success': False, 'error': 'Transacción no encontrada'}), 404
             
+    except PaymentsServiceUnavailable as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '5'}
     except requests.RequestException as e:
         return jsonify({'success': False, 'error': f'Error de conexión: {str(e)}'}), 500
 
 
+@rutas.route('/transacciones/<transaction_id>')
+@login_required
+def estado_transaccion(transaction_id):
+    """Estado local de una transacción del usuario.
+
+    Respaldo de los eventos SSE: responde con ETag, así el polling con
+    If-None-Match recibe un 304 vacío mientras el estado no cambie.
+    """
+    transaccion = Transaccion.query.filter_by(transaction_id=transaction_id, sender_id=session['user_id']).first()
+    
+    if not transaccion:
+        return jsonify({'success': False, 'error': 'Transacción no encontrada'}), 404
+    
+    response = jsonify(estados_publicos([transaccion])[transaction_id])
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@rutas.route('/transacciones/<transaction_id>/eventos')
+@login_required
+def eventos_transaccion(transaction_id):
+    """Stream SSE con los cambios de estado de una transacción del usuario"""
+    transaccion = Transaccion.query.filter_by(transaction_id=transaction_id, sender_id=session['user_id']).first()
+    
+    if not transaccion:
+        return jsonify({'success': False, 'error': 'Transacción no encontrada'}), 404
+    
+    # Cada stream ocupa un hilo del worker: pasado el límite, el navegador sigue por polling
+    if not payment_events.reservar_stream():
+        return jsonify({'success': False, 'error': 'Demasiadas conexiones de pagos abiertas'}), 503, {
+            'Retry-After': '30'}
+    
+    try:
+        estado = estados_publicos([transaccion])[transaction_id]
+    except Exception:
+        payment_events.liberar_stream()
+        raise
+    # Liberar la conexión a la base antes de quedarse esperando eventos
+    db.session.remove()
+    
+    response = Response(payment_events.stream(transaction_id, estado), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.call_on_close(payment_events.liberar_stream)
+    return response
+
+
 # ========== RUTAS DE API Y ADMINISTRACIÓN ==========
 
-@app.route('/static/admin/')
+@rutas.route('/static/admin/')
 def api_status():
     """Endpoint de estado de la API"""
     data = {
         "status": "ok",
-        "messange": "El servidor de la API está funcionando"
+        "messange": "El servidor de la API está funcionando",
+        "identity_cache": user_cache.stats(),
+        "payments_client": payments_client.stats(),
+        "password_hasher": password_hasher.stats(),
+        "reconciler": transaction_reconciler.stats(),
+        "payment_events": payment_events.stats(),
+        "idempotency_cache": idempotency_cache.stats(),
+        "compression": response_compressor.stats(),
+        "chat": chat_hub.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "request_log": request_log.stats(),
+        "db_router": db_router.stats()
     }
     return jsonify(data)
 
 
-@app.route('/payments-service/health')
+@rutas.route('/metrics')
+def metricas():
+    """Métricas en formato de Prometheus; suma todos los workers si METRICS_DIR está configurado"""
+    return Response(metrics.exposicion(), mimetype='text/plain; version=0.0.4')
+
+
+@rutas.route('/payments-service/health')
 def payments_health():
     """Verificar estado del servicio de pagos"""
-    try:
-        import requests
-        response = requests.get(f'{PAYMENTS_SERVICE_URL}/health', timeout=5)
-        return jsonify(response.json())
-    except:
+    status_code, body = payments_client.health()
+    if status_code != 200:
         return jsonify({'status': 'error', 'message': 'Servicio de pagos no disponible'}), 503
+    return jsonify(body)
 
 
-@app.route('/mis-transacciones')
+@rutas.route('/mis-transacciones')
 @login_required
+@db_router.solo_lectura
 def mis_transacciones():
-    """Ver historial de transacciones del usuario"""
+    """Ver historial de transacciones del usuario, paginado por cursor y con filtro opcional de estado"""
     user_id = session.get('user_id')
-    transacciones = Transaccion.query.filter_by(sender_id=user_id).order_by(Transaccion.fecha_creacion.desc()).all()
+    query = Transaccion.query.filter_by(sender_id=user_id)
+    
+    status = request.args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+    
+    transacciones, siguiente_cursor = keyset_page(query, Transaccion.fecha_creacion, Transaccion.id,
+                                                  request.args.get('cursor'),
+                                                  parse_limit(request.args.get('limit')))
     
     return jsonify({
         'success': True,
-        'transacciones': [t.to_dict() for t in transacciones]
+        'transacciones': [t.to_dict() for t in transacciones],
+        'next_cursor': siguiente_cursor
     })
 
 
-@app.route('/usuarios')
+@rutas.route('/usuarios')
 @login_required
+@db_router.solo_lectura
 def listar_usuarios():
     """Vista antigua de listado de usuarios (para debugging)"""
     usuarios = Usuarios.query.all()
@@ -629,6 +1132,8 @@ def listar_usuarios():
 # ========== EJECUCIÓN DE LA APLICACIÓN ==========
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Servidor de desarrollo; en producción usar gunicorn (ver gunicorn.conf.py)
+    app = create_app()
+    app.run(debug=app.config['DEBUG'], port=5000)
 
 
@@ -0,0 +1,158 @@
+"""Benchmark: mensajes/s y conexiones por proceso del chat de salas.
+
+Arma la app con el perfil de pruebas sobre una base SQLite temporal, abre
+`--conexiones` streams SSE repartidos entre `--salas` salas (un hilo por
+conexión, como un worker gthread) y publica `--mensajes` mensajes desde
+`--publicadores` hilos. Reporta mensajes publicados/s, entregas/s (un
+mensaje entregado a cada suscriptor de su sala), latencia de entrega p50/p99,
+entregas perdidas (un suscriptor lento al que el buffer circular de su sala
+ya no le guarda los mensajes) y lotes escritos en la base. Como referencia mide también publicar con un
+INSERT + commit por mensaje, lo que haría una ruta sin el hub.
+
+Uso:
+    python benchmarks/bench_chat.py [--salas 10] [--conexiones 50 200 500] [--mensajes 5000]
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('APP_ENV', 'testing')
+
+from load_test import percentile
+
+from app import create_app
+from db import db
+from models import MensajeSala, Sala, Usuarios
+from sala_chat import SalaChatHub
+
+Autor = namedtuple('Autor', ['id', 'name', 'lastanme'])
+
+
+def poblar(salas):
+    vendedor = Usuarios(name='Vendedor', lastanme='Prueba', lastname2='X', email='v@ejemplo.com', password='x')
+    db.session.add(vendedor)
+    db.session.flush()
+    creadas = [Sala(codigo=f'{40000000 + i}', nombre_producto=f'Producto {i}', precio=10, condicion='Nuevo',
+                    creador_id=vendedor.id) for i in range(salas)]
+    db.session.add_all(creadas)
+    db.session.commit()
+    return Autor(vendedor.id, vendedor.name, vendedor.lastanme), [sala.id for sala in creadas]
+
+
+def medir(app, hub, autor, sala_ids, conexiones, mensajes, publicadores):
+    esperados = {sala_id: 0 for sala_id in sala_ids}
+    for i in range(mensajes):
+        esperados[sala_ids[i % len(sala_ids)]] += 1
+
+    latencias, entregas = [], [0]
+    lock = threading.Lock()
+    listos = threading.Barrier(conexiones + 1)
+    terminado = threading.Event()
+
+    def suscriptor(i):
+        sala_id = sala_ids[i % len(sala_ids)]
+        with app.app_context():
+            sala = hub.abrir(sala_id)
+        stream = hub.stream(sala)
+        next(stream)  # historial vacío: la suscripción ya está registrada
+        listos.wait()
+        propias, recibidos = [], 0
+        for pedazo in stream:
+            if pedazo.startswith(': ping') and terminado.is_set():
+                break  # el resto se perdió en el buffer circular
+            ahora = time.perf_counter()
+            for linea in pedazo.split('\n'):
+                if linea.startswith('data: '):
+                    # El texto del mensaje es el instante en que se publicó
+                    recibidos += 1
+                    propias.append(ahora - float(json.loads(linea[6:])['texto']))
+            if recibidos >= esperados[sala_id]:
+                break
+        stream.close()
+        with lock:
+            latencias.extend(propias)
+            entregas[0] += recibidos
+
+    def publicador(j):
+        with app.app_context():
+            for i in range(j, mensajes, publicadores):
+                hub.publicar(sala_ids[i % len(sala_ids)], autor, repr(time.perf_counter()))
+
+    hilos = [threading.Thread(target=suscriptor, args=(i,)) for i in range(conexiones)]
+    for hilo in hilos:
+        hilo.start()
+    listos.wait()
+    print(f'  {hub.stats()["connections"]} conexiones abiertas, {threading.active_count()} hilos, '
+          f'RSS máx {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB')
+
+    inicio = time.perf_counter()
+    escritores = [threading.Thread(target=publicador, args=(j,)) for j in range(publicadores)]
+    for hilo in escritores:
+        hilo.start()
+    for hilo in escritores:
+        hilo.join()
+    publicacion = time.perf_counter() - inicio
+    terminado.set()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    hub.flush()
+
+    latencias.sort()
+    perdidas = sum(esperados[sala_ids[i % len(sala_ids)]] for i in range(conexiones)) - entregas[0]
+    return (mensajes / publicacion, entregas[0] / total, percentile(latencias, 50), percentile(latencias, 99),
+            perdidas, hub.stats()['batches'])
+
+
+def medir_insert_directo(app, autor, sala_ids, mensajes):
+    with app.app_context():
+        inicio = time.perf_counter()
+        for i in range(mensajes):
+            db.session.add(MensajeSala(uid=uuid.uuid4().hex, sala_id=sala_ids[i % len(sala_ids)],
+                                       usuario_id=autor.id, texto=f'Mensaje {i}', fecha_envio=datetime.utcnow()))
+            db.session.commit()
+        return mensajes / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--salas', type=int, default=10)
+    parser.add_argument('--conexiones', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--mensajes', type=int, default=5000)
+    parser.add_argument('--publicadores', type=int, default=8)
+    args = parser.parse_args()
+
+    base = tempfile.mktemp(suffix='.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{base}', 'SQL_INSTRUMENTATION': False,
+                      'CHAT_POLL_INTERVAL': 0, 'CHAT_HEARTBEAT': 0.2})
+    with app.app_context():
+        db.create_all()
+        autor, sala_ids = poblar(args.salas)
+
+    print(f'{args.mensajes} mensajes en {args.salas} salas, {args.publicadores} publicadores')
+    for conexiones in args.conexiones:
+        hub = SalaChatHub()
+        hub.init_app(app)
+        print(f'{conexiones} conexiones:')
+        publicados, entregas, p50, p99, perdidas, lotes = medir(app, hub, autor, sala_ids, conexiones,
+                                                                args.mensajes, args.publicadores)
+        print(f'  publicados/s {publicados:>8.0f}   entregas/s {entregas:>8.0f}   '
+              f'entrega p50 {p50:.2f} ms  p99 {p99:.2f} ms   perdidas {perdidas}   lotes escritos {lotes}')
+
+    directo = medir_insert_directo(app, autor, sala_ids, min(args.mensajes, 1000))
+    print(f'INSERT + commit por mensaje: {directo:.0f} mensajes/s')
+    os.remove(base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark: CPU de la compresión de respuestas contra bytes ahorrados, por ruta.
+
+Arma la app con el perfil de pruebas sobre una base SQLite temporal con un
+vendedor, salas, compradores y transacciones, y pide `--requests` veces cada
+ruta (principal, ver_sala, mis_salas, dashboard y mis-transacciones) con
+`Accept-Encoding: gzip` para cada nivel de `--niveles`. Reporta por ruta los
+bytes sin comprimir y comprimidos, el ahorro y los milisegundos de CPU por
+respuesta. Los niveles se miden con el LRU desactivado (costo real de
+comprimir); una última pasada con el LRU activo muestra cuántas respuestas
+idénticas se sirven sin volver a comprimir.
+
+Uso:
+    python benchmarks/bench_compression.py [--requests 200] [--niveles 1 6 9]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('APP_ENV', 'testing')
+
+from werkzeug.security import generate_password_hash
+
+from app import create_app
+from compression import response_compressor
+from db import db
+from models import MiembroSala, Sala, Transaccion, Usuarios
+
+
+def poblar(salas, compradores, transacciones):
+    hash_ = generate_password_hash('temporal123', method='pbkdf2:sha256:1000')
+    usuarios = [Usuarios(name=f'Usuario {i}', lastanme='Pérez', lastname2='López', email=f'u{i}@ejemplo.com',
+                         password=hash_, wallet_link=f'https://wallet.example/u{i}')
+                for i in range(compradores + 1)]
+    db.session.add_all(usuarios)
+    db.session.flush()
+    vendedor = usuarios[0]
+
+    creadas = [Sala(codigo=f'{10000000 + i}', nombre_producto=f'Producto de prueba {i}',
+                    descripcion='Bicicleta de montaña en buen estado, rodada 29, con cambios revisados. ' * 3,
+                    precio=100 + i, condicion='Usado' if i % 2 else 'Nuevo', creador_id=vendedor.id)
+               for i in range(salas)]
+    db.session.add_all(creadas)
+    db.session.flush()
+
+    db.session.add_all(MiembroSala(sala_id=creadas[0].id, usuario_id=u.id, rol='comprador') for u in usuarios[1:])
+    ahora = datetime.utcnow()
+    db.session.add_all(Transaccion(transaction_id=str(uuid.uuid4()), sala_id=creadas[i % salas].id,
+                                   sender_id=vendedor.id, receiver_wallet='https://wallet.example/u1',
+                                   amount=10 + i, status='completed', fecha_creacion=ahora - timedelta(minutes=i),
+                                   fecha_completado=ahora - timedelta(minutes=i))
+                       for i in range(transacciones))
+    db.session.commit()
+    return vendedor.id, creadas[0].codigo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--niveles', type=int, nargs='+', default=[1, 6, 9])
+    parser.add_argument('--salas', type=int, default=30)
+    parser.add_argument('--compradores', type=int, default=40)
+    parser.add_argument('--transacciones', type=int, default=50)
+    args = parser.parse_args()
+
+    base = tempfile.mktemp(suffix='.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{base}', 'SQL_INSTRUMENTATION': False})
+    with app.app_context():
+        db.create_all()
+        vendedor_id, codigo = poblar(args.salas, args.compradores, args.transacciones)
+
+    # endpoint -> URL
+    rutas = {'inicio': '/', 'ver_sala': f'/sala/{codigo}', 'mis_salas': '/mis-salas',
+             'dashboard': '/dashboard', 'mis_transacciones': '/mis-transacciones?limit=50'}
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = vendedor_id
+
+    cache_size = response_compressor.cache_size
+    pasadas = [(nivel, 0) for nivel in args.niveles] + [(response_compressor.level, cache_size)]
+
+    print(f'{args.requests} requests por ruta y pasada, gzip')
+    print(f'{"nivel":>5}{"LRU":>5}  {"ruta":<18}{"bytes":>9}{"gzip":>9}{"ahorro":>8}{"CPU ms/resp":>13}'
+          f'{"µs/KB ahorrado":>16}{"hits":>6}')
+    for nivel, lru in pasadas:
+        response_compressor.level = nivel
+        response_compressor.cache_size = lru
+        response_compressor._cache.clear()
+        response_compressor.reset_stats()
+        for ruta in rutas.values():
+            for _ in range(args.requests):
+                respuesta = cliente.get(ruta, headers={'Accept-Encoding': 'gzip'})
+                assert respuesta.status_code == 200, (ruta, respuesta.status_code)
+
+        por_ruta = response_compressor.stats()['routes']
+        for nombre in rutas:
+            datos = por_ruta.get(nombre)
+            prefijo = f'{nivel:>5}{"sí" if lru else "no":>5}  {nombre:<18}'
+            if not datos:
+                print(f'{prefijo}{"(sin comprimir: menor que min_size)":>30}')
+                continue
+            n = datos['responses']
+            ahorrado = datos['bytes_in'] - datos['bytes_out']
+            costo = datos['cpu_ms'] * 1000 / (ahorrado / 1024) if ahorrado > 0 else 0.0
+            print(f'{prefijo}{datos["bytes_in"] // n:>9}{datos["bytes_out"] // n:>9}'
+                  f'{ahorrado / datos["bytes_in"]:>8.0%}{datos["cpu_ms"] / n:>13.3f}{costo:>16.2f}'
+                  f'{datos["cache_hits"] / n:>6.0%}')
+    os.remove(base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark: throughput de login según el número de workers de hashing.
+
+Simula `--hilos` workers web verificando contraseñas a la vez (lo que hace
+`login`) contra un hash scrypt con los parámetros por defecto. Con
+`workers=0` la verificación corre en el propio hilo, como antes; con N > 0
+pasa por el pool de procesos de `password_hashing`. Además de logins/s se
+mide cuánto tarda una tarea corta de CPU en los hilos web durante la ráfaga,
+que es lo que sienten las demás rutas.
+
+Uso:
+    python benchmarks/bench_password_hashing.py [--logins 200] [--hilos 16] [--workers 0 1 2 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from password_hashing import PasswordHasher, PasswordHasherBusy
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    if not valores:
+        return 0.0
+    return valores[max(0, min(len(valores) - 1, round(p / 100 * len(valores)) - 1))] * 1000
+
+
+def tarea_corta():
+    """Algo parecido a renderizar una página pequeña"""
+    return sum(i * i for i in range(20000))
+
+
+def medir(workers, logins, hilos, max_pending):
+    hasher = PasswordHasher(workers=workers, max_pending=max_pending, timeout=60)
+    pwhash = generate_password_hash('temporal123', method=hasher.method)
+    if workers:
+        hasher.verify(pwhash, 'temporal123')  # arrancar los procesos fuera de la medición
+
+    latencias, rechazados = [], [0]
+    otras, terminado = [], threading.Event()
+
+    def login(_):
+        inicio = time.perf_counter()
+        try:
+            hasher.verify(pwhash, 'temporal123')
+        except PasswordHasherBusy:
+            rechazados[0] += 1
+            return
+        latencias.append(time.perf_counter() - inicio)
+
+    def otra_ruta():
+        while not terminado.is_set():
+            inicio = time.perf_counter()
+            tarea_corta()
+            otras.append(time.perf_counter() - inicio)
+            time.sleep(0.01)
+
+    vecino = threading.Thread(target=otra_ruta)
+    vecino.start()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        list(pool.map(login, range(logins)))
+    duracion = time.perf_counter() - inicio
+    terminado.set()
+    vecino.join()
+    hasher.shutdown()
+    return len(latencias) / duracion, percentil(latencias, 50), percentil(latencias, 95), rechazados[0], percentil(otras, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--hilos', type=int, default=16, help='workers web concurrentes')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='cola máxima del pool (por defecto sin límite práctico)')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, {args.hilos} hilos web, {args.logins} logins')
+    print(f'{"workers":>8}{"logins/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"503":>6}{"otra ruta p95 ms":>18}')
+    for workers in args.workers:
+        max_pending = args.max_pending or args.logins
+        rps, p50, p95, rechazados, otra = medir(workers, args.logins, args.hilos, max_pending)
+        print(f'{workers:>8}{rps:>10.1f}{p50:>9.1f}{p95:>9.1f}{rechazados:>6}{otra:>18.1f}')
+
+
+if __name__ == '__main__':
+    main()
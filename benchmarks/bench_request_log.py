@@ -0,0 +1,95 @@
+"""Benchmark: costo en el request del log estructurado contra escribir en línea.
+
+Arma la app con el perfil de pruebas sobre una base SQLite temporal y pide
+`--requests` veces la página de login desde `--hilos` hilos en tres
+variantes: sin log de requests, con el log por cola (lo que corre en
+producción) y con el mismo RotatingFileHandler escribiendo dentro del
+request. Reporta requests/s, p50/p99 por request y líneas escritas o
+descartadas por la cola.
+
+Uso:
+    python benchmarks/bench_request_log.py [--requests 5000] [--hilos 8]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('APP_ENV', 'testing')
+
+from load_test import percentile
+
+from app import create_app
+from db import db
+from request_log import request_log
+
+
+def medir(app, requests, hilos):
+    latencias = []
+    lock = threading.Lock()
+
+    def cliente(n):
+        c = app.test_client()
+        propias = []
+        for _ in range(n):
+            inicio = time.perf_counter()
+            respuesta = c.get('/login')
+            propias.append(time.perf_counter() - inicio)
+            assert respuesta.status_code == 200, respuesta.status_code
+        with lock:
+            latencias.extend(propias)
+
+    trabajadores = [threading.Thread(target=cliente, args=(requests // hilos,)) for _ in range(hilos)]
+    inicio = time.perf_counter()
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return len(latencias) / total, percentile(latencias, 50), percentile(latencias, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--hilos', type=int, default=8)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    base = os.path.join(carpeta, 'bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{base}', 'REQUEST_LOG_ENABLED': True,
+                      'REQUEST_LOG_PATH': os.path.join(carpeta, 'requests.jsonl')})
+    with app.app_context():
+        db.create_all()
+
+    print(f'{args.requests} requests a /login desde {args.hilos} hilos')
+    for nombre in ('sin log', 'cola + hilo escritor', 'escritura en línea'):
+        request_log.enabled = nombre != 'sin log'
+        medir(app, args.hilos * 20, args.hilos)  # calentar
+        request_log.flush()
+        antes = request_log.stats()
+        if nombre == 'escritura en línea':
+            # Mismo archivo y formato, pero el request espera el write(): sin hilo escritor
+            request_log._asegurar_escritor()
+            request_log._listener.stop()
+            request_log._handler = request_log._listener.handlers[0]
+        rps, p50, p99 = medir(app, args.requests, args.hilos)
+        if nombre == 'escritura en línea':
+            request_log._handler.close()
+            request_log._handler = request_log._listener = request_log._pid = None
+        request_log.flush()
+        stats = request_log.stats()
+        print(f'  {nombre:<22} {rps:>8.0f} req/s   p50 {p50:.2f} ms  p99 {p99:.2f} ms   '
+              f'líneas {stats["written"] - antes["written"]}   descartadas {stats["dropped"] - antes["dropped"]}')
+
+    shutil.rmtree(carpeta)
+
+
+if __name__ == '__main__':
+    main()
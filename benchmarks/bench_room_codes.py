@@ -0,0 +1,91 @@
+"""Benchmark: asignación de códigos de sala con la tabla cada vez más llena.
+
+Compara el ciclo anterior de `Sala.generar_codigo` (código aleatorio + SELECT
+hasta encontrar uno libre) con `RoomCodeAllocator` (contador reservado por
+bloques + permutación con llave). Para poder llenar la tabla en segundos se
+usa un dominio reducido de `--digits` dígitos en SQLite; el número esperado
+de SELECT del ciclo anterior solo depende del porcentaje de llenado, 1/(1-f).
+
+Uso:
+    python benchmarks/bench_room_codes.py [--digits 6] [--asignaciones 2000]
+"""
+import argparse
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, MetaData, String, Table, create_engine, insert, select, update
+
+from models import Secuencia
+from room_codes import RoomCodeAllocator
+
+metadata = MetaData()
+salas_bench = Table('salas_bench', metadata, Column('codigo', String, primary_key=True))
+
+
+def llenar(engine, dominio, digits, fill):
+    """Deja la tabla con `fill` del dominio ocupado por códigos aleatorios"""
+    with engine.begin() as conn:
+        conn.execute(salas_bench.delete())
+        ocupados = random.sample(range(dominio), int(dominio * fill))
+        for i in range(0, len(ocupados), 50000):
+            conn.execute(insert(salas_bench), [{'codigo': str(c).zfill(digits)} for c in ocupados[i:i + 50000]])
+
+
+def ciclo_anterior(engine, digits, asignaciones):
+    """Copia del ciclo original: un SELECT por intento"""
+    consultas = 0
+    with engine.connect() as conn:
+        for _ in range(asignaciones):
+            while True:
+                codigo = ''.join([str(secrets.randbelow(10)) for _ in range(digits)])
+                consultas += 1
+                if conn.execute(select(salas_bench.c.codigo).where(salas_bench.c.codigo == codigo)).first() is None:
+                    break
+    return consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--digits', type=int, default=6)
+    parser.add_argument('--asignaciones', type=int, default=2000)
+    parser.add_argument('--block-size', type=int, default=100)
+    args = parser.parse_args()
+
+    dominio = 10 ** args.digits
+    engine = create_engine(f'sqlite:///{tempfile.mktemp(suffix=".db")}')
+    metadata.create_all(engine)
+    Secuencia.__table__.create(engine)
+
+    print(f'dominio 10^{args.digits}, {args.asignaciones} asignaciones por nivel')
+    print(f'{"llenado":>8}{"anterior/s":>13}{"SELECT/código":>15}{"nuevo/s":>12}{"UPDATE/código":>15}')
+    for fill in (0.0, 0.5, 0.9, 0.99):
+        llenar(engine, dominio, args.digits, fill)
+
+        inicio = time.perf_counter()
+        consultas = ciclo_anterior(engine, args.digits, args.asignaciones)
+        anterior = args.asignaciones / (time.perf_counter() - inicio)
+
+        # El contador arranca donde estaría si él hubiera asignado ese llenado
+        with engine.begin() as conn:
+            conn.execute(Secuencia.__table__.delete())
+            conn.execute(insert(Secuencia).values(nombre=RoomCodeAllocator.SEQUENCE_NAME,
+                                                  valor=int(dominio * fill)))
+        allocator = RoomCodeAllocator('benchmark', digits=args.digits,
+                                      block_size=args.block_size, engine=engine)
+        inicio = time.perf_counter()
+        codigos = {allocator.allocate() for _ in range(args.asignaciones)}
+        nuevo = args.asignaciones / (time.perf_counter() - inicio)
+        assert len(codigos) == args.asignaciones
+
+        print(f'{fill:>8.0%}{anterior:>13.0f}{consultas / args.asignaciones:>15.2f}'
+              f'{nuevo:>12.0f}{1 / args.block_size:>15.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark: servidor de desarrollo contra gunicorn con el perfil de producción.
+
+Arranca cada servidor como subproceso sobre una base SQLite temporal y lanza
+`--clientes` hilos pidiendo `--rutas` durante `--segundos`. Reporta req/s y
+latencias p50/p99. "dev" es lo que hacía `python app.py` (un proceso, debug y
+reloader); "gunicorn" usa gunicorn.conf.py con `--workers` y `--threads`.
+
+Uso:
+    python benchmarks/bench_serving.py [--segundos 10] [--clientes 32] [--workers 4]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import percentile
+
+
+def esperar(url, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'El servidor no respondió en {url}')
+
+
+def medir(base_url, rutas, clientes, segundos):
+    latencias, errores = [], [0]
+    lock = threading.Lock()
+    fin = time.monotonic() + segundos
+
+    def cliente(i):
+        http = requests.Session()
+        propias = []
+        while time.monotonic() < fin:
+            ruta = rutas[len(propias) % len(rutas)]
+            inicio = time.perf_counter()
+            try:
+                ok = http.get(base_url + ruta, timeout=30).status_code < 500
+            except requests.RequestException:
+                ok = False
+            propias.append(time.perf_counter() - inicio)
+            if not ok:
+                with lock:
+                    errores[0] += 1
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    latencias.sort()
+    return len(latencias) / segundos, percentile(latencias, 50), percentile(latencias, 99), errores[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--clientes', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rutas', nargs='+', default=['/', '/login', '/signup'])
+    args = parser.parse_args()
+
+    base = tempfile.mktemp(suffix='.db')
+    entorno = dict(os.environ, DATABASE_URL=f'sqlite:///{base}', SECRET_KEY='benchmark',
+                   SESSION_COOKIE_SECURE='0', GUNICORN_ACCESSLOG='/dev/null',
+                   GUNICORN_PIDFILE=tempfile.mktemp(suffix='.pid'))
+    subprocess.run([sys.executable, '-c', "from app import create_app; from db import db\n"
+                    "app = create_app('production')\nwith app.app_context(): db.create_all()"],
+                   cwd=RAIZ, env=entorno, check=True)
+
+    servidores = {
+        'dev': [sys.executable, '-c', "from app import create_app\n"
+                "create_app('development').run(debug=True, port=5101)"],
+        f'gunicorn {args.workers}x{args.threads}': [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:5102',
+            '--workers', str(args.workers), '--threads', str(args.threads)],
+    }
+    puertos = {'dev': 5101}
+
+    print(f'{args.clientes} clientes, {args.segundos:.0f} s, rutas {" ".join(args.rutas)}')
+    print(f'{"servidor":<18}{"req/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"errores":>9}')
+    for nombre, comando in servidores.items():
+        url = f'http://127.0.0.1:{puertos.get(nombre, 5102)}'
+        proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            esperar(url + '/')
+            rps, p50, p99, errores = medir(url, args.rutas, args.clientes, args.segundos)
+            print(f'{nombre:<18}{rps:>9.1f}{p50:>9.1f}{p99:>9.1f}{errores:>9}')
+        finally:
+            # Al grupo completo: el reloader de desarrollo deja un proceso hijo
+            os.killpg(proceso.pid, 15)
+            proceso.wait()
+
+
+if __name__ == '__main__':
+    main()
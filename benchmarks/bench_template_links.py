@@ -0,0 +1,103 @@
+"""Benchmark: render + reescritura de links por template, antes y después.
+
+Antes: el template se renderiza sin reescribir y luego se aplica el antiguo
+middleware `fix_html_links` (12 `url_for` + 12 `str.replace` sobre el body).
+Después: la reescritura ya está compilada dentro del template.
+
+Uso:
+    python benchmarks/bench_template_links.py [--iteraciones N]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import url_for
+from jinja2 import Environment
+
+from app import app
+from forms import UserSignupForm, UserLoginForm
+
+
+def legacy_fix_html_links(data):
+    """Copia del antiguo middleware `fix_html_links` que corría por respuesta"""
+    replacements = {
+        'href="index.html"': f'href="{url_for("dashboard")}"',
+        "href='index.html'": f"href='{url_for('dashboard')}'",
+        'href="crear-sala.html"': f'href="{url_for("crear_sala")}"',
+        "href='crear-sala.html'": f"href='{url_for('crear_sala')}'",
+        'href="compartir-sala.html"': f'href="{url_for("compartir_sala")}"',
+        "href='compartir-sala.html'": f"href='{url_for('compartir_sala')}'",
+        'href="signup.html"': f'href="{url_for("signup")}"',
+        "href='signup.html'": f"href='{url_for('signup')}'",
+        'href="login.html"': f'href="{url_for("login")}"',
+        "href='login.html'": f"href='{url_for('login')}'",
+        'href="principal.html"': f'href="{url_for("inicio")}"',
+        "href='principal.html'": f"href='{url_for('inicio')}'",
+    }
+    for old, new in replacements.items():
+        data = data.replace(old, new)
+    # El middleware re-codificaba el body con response.set_data
+    return data.encode('utf-8')
+
+
+def contexto_de_prueba():
+    """Datos falsos suficientes para renderizar cada template sin base de datos"""
+    usuario = SimpleNamespace(id=1, name='Regina', lastanme='Diaz', lastname2='Vazquez',
+                              email='rege@gmail.com', wallet_link='$ilp.interledger-test.dev/aliciadev')
+    sala = SimpleNamespace(id=1, codigo='12345678', nombre_producto='Bicicleta',
+                           descripcion='Bicicleta de montaña ' * 10, precio=1500.0,
+                           condicion='Usado', activa=True, fecha_creacion=datetime(2025, 11, 9),
+                           get_link=lambda: 'http://127.0.0.1:5000/sala/12345678')
+    miembros = [usuario] * 20
+    return {
+        'principal.html': {},
+        'login.html': {'formulario': UserLoginForm(meta={'csrf': False})},
+        'signup.html': {'formulario': UserSignupForm(meta={'csrf': False})},
+        'user_view.html': {'user': usuario},
+        'crear-sala.html': {},
+        'compartir-sala.html': {'sala': sala},
+        'mis-salas.html': {'salas': [sala] * 20},
+        'ver-sala.html': {'sala': sala, 'creador': usuario, 'es_creador': False,
+                          'ya_unido': False, 'miembros': miembros, 'total_miembros': 25,
+                          'current_user': usuario},
+        'index.html': {'total': 20, 'datos': [usuario] * 20},
+    }
+
+
+def medir(funcion, iteraciones):
+    funcion()  # calentar caché de templates
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        funcion()
+    return (time.perf_counter() - inicio) / iteraciones * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iteraciones', type=int, default=500)
+    args = parser.parse_args()
+
+    # Entorno sin la extensión, equivalente al que usaba el middleware
+    entorno_anterior = Environment(loader=app.jinja_loader, autoescape=True)
+    entorno_anterior.globals.update(app.jinja_env.globals)
+    entorno_anterior.filters.update(app.jinja_env.filters)
+
+    with app.test_request_context('/'):
+        print(f'{"template":<22}{"antes (us)":>12}{"después (us)":>14}{"mejora":>9}')
+        for nombre, contexto in contexto_de_prueba().items():
+            app.update_template_context(contexto)
+            anterior = entorno_anterior.get_template(nombre)
+            actual = app.jinja_env.get_template(nombre)
+
+            antes = medir(lambda: legacy_fix_html_links(anterior.render(contexto)), args.iteraciones)
+            despues = medir(lambda: actual.render(contexto).encode('utf-8'), args.iteraciones)
+            print(f'{nombre:<22}{antes:>12.1f}{despues:>14.1f}{antes / despues:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
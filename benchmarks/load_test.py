@@ -0,0 +1,178 @@
+"""Prueba de carga de punta a punta sobre una instancia de Flask en ejecución.
+
+Cada usuario virtual registra un vendedor y un comprador y recorre el flujo
+completo: signup -> crear_sala -> unirse_sala -> initiate_payment ->
+(espera del link de autorización) -> payment_callback. Al final se reporta
+throughput y latencia p50/p95/p99 por ruta.
+
+Ejemplo con el simulador de pagos:
+    python benchmarks/payments_simulator.py --port 3001 &
+    python app.py &
+    python benchmarks/load_test.py --users 50 --iterations 4
+"""
+import argparse
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+CODIGO_RE = re.compile(r'id="code-input" value="(\d{8})"')
+SALA_ID_RE = re.compile(r'const SALA_ID = (\d+);')
+
+
+class FlowError(Exception):
+    pass
+
+
+class LatencyRecorder:
+    """Latencias por ruta, compartidas entre todos los usuarios virtuales"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, elapsed, ok=True):
+        with self._lock:
+            self.samples[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, duration):
+        print(f'\n{"ruta":<20}{"n":>7}{"err":>6}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        for route, values in self.samples.items():
+            values = sorted(values)
+            print(f'{route:<20}{len(values):>7}{self.errors[route]:>6}{len(values) / duration:>9.1f}'
+                  f'{percentile(values, 50):>9.1f}{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}')
+
+
+def percentile(sorted_values, p):
+    """Percentil por rango más cercano, en milisegundos"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index] * 1000
+
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, status_timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.status_timeout = status_timeout
+
+    def _call(self, http, route, method, path, expected, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        inicio = time.perf_counter()
+        try:
+            response = http.request(method, f'{self.base_url}{path}', timeout=60, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(route, time.perf_counter() - inicio, ok=False)
+            raise FlowError(f'{route}: {e}')
+        ok = response.status_code in expected
+        self.recorder.record(route, time.perf_counter() - inicio, ok=ok)
+        if not ok:
+            raise FlowError(f'{route}: HTTP {response.status_code}')
+        return response
+
+    def signup(self, http, rol):
+        pagina = http.get(f'{self.base_url}/signup', timeout=30).text
+        match = CSRF_RE.search(pagina)
+        sufijo = uuid.uuid4().hex[:12]
+        self._call(http, 'signup', 'POST', '/signup', {302}, data={
+            'csrf_token': match.group(1) if match else '',
+            'name': f'{rol}{sufijo}',
+            'lastanme': 'Carga',
+            'lastname2': 'Prueba',
+            'email': f'{rol}-{sufijo}@example.com',
+            'password': 'temporal123',
+            'confirm_password': 'temporal123',
+            'wallet_link': '$ilp.interledger-test.dev/aliciadev' if rol == 'vendedor' else '',
+        })
+
+    def run_flow(self):
+        vendedor, comprador = requests.Session(), requests.Session()
+        self.signup(vendedor, 'vendedor')
+        self.signup(comprador, 'comprador')
+
+        self._call(vendedor, 'crear_sala', 'POST', '/crear-sala', {302}, data={
+            'nombre-producto': 'Producto de prueba',
+            'precio-producto': '25.00',
+            'condicion-producto': 'Nuevo',
+            'descripcion-producto': 'Sala creada por la prueba de carga',
+        })
+        compartir = vendedor.get(f'{self.base_url}/compartir-sala', timeout=30).text
+        match = CODIGO_RE.search(compartir)
+        if not match:
+            raise FlowError('crear_sala: no se encontró el código de la sala')
+        codigo = match.group(1)
+
+        self._call(comprador, 'unirse_sala', 'POST', f'/sala/{codigo}/unirse', {302})
+        pagina_sala = self._call(comprador, 'ver_sala', 'GET', f'/sala/{codigo}', {200}).text
+        sala_id = int(SALA_ID_RE.search(pagina_sala).group(1))
+
+        pago = self._call(comprador, 'initiate_payment', 'POST', '/initiate-payment', {200, 202}, json={
+            'receiverWallet': '$ilp.interledger-test.dev/aliciadev',
+            'amount': 25.00,
+            'currency': 'USD',
+            'salaId': sala_id,
+        }).json()
+
+        interaction_url = pago.get('interactionUrl')
+        if not interaction_url and pago.get('statusUrl'):
+            limite = time.monotonic() + self.status_timeout
+            while time.monotonic() < limite:
+                estado = self._call(comprador, 'estado_transaccion', 'GET', pago['statusUrl'], {200}).json()
+                if estado['transaccion']['status'] == 'failed':
+                    raise FlowError(f'initiate_payment: {estado["transaccion"]["error_message"]}')
+                interaction_url = estado.get('interactionUrl')
+                if interaction_url:
+                    break
+                time.sleep(0.25)
+        if not interaction_url:
+            raise FlowError('initiate_payment: no llegó el link de autorización')
+
+        # El simulador apunta el link directamente al callback de Flask
+        path = interaction_url[interaction_url.index('/payment-callback/'):]
+        self._call(comprador, 'payment_callback', 'GET', path, {302})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=20, help='usuarios virtuales concurrentes')
+    parser.add_argument('--iterations', type=int, default=5, help='flujos completos por usuario')
+    parser.add_argument('--status-timeout', type=float, default=30,
+                        help='segundos máximos esperando el link de autorización')
+    args = parser.parse_args()
+
+    recorder = LatencyRecorder()
+    fallidos = []
+
+    def usuario_virtual(_):
+        usuario = VirtualUser(args.base_url, recorder, args.status_timeout)
+        for _ in range(args.iterations):
+            try:
+                usuario.run_flow()
+            except FlowError as e:
+                fallidos.append(str(e))
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(usuario_virtual, range(args.users)))
+    duracion = time.perf_counter() - inicio
+
+    total = args.users * args.iterations
+    print(f'{total - len(fallidos)}/{total} flujos completos en {duracion:.1f} s '
+          f'({(total - len(fallidos)) / duracion:.1f} flujos/s)')
+    recorder.report(duracion)
+    for error in sorted(set(fallidos))[:10]:
+        print(f'  error: {error}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Simulador local del servicio de pagos (mismo contrato que static/admin/payments-service.js).
+
+Responde /health, /initiate-payment, /complete-payment/<id> y
+/transaction-status/<id> sin Node.js ni la testnet de Interledger, con
+latencia, tasa de errores y tasa de timeouts configurables.
+
+El `interactionUrl` devuelto apunta directo a /payment-callback/<id> de Flask
+con un `interact_ref`, como si el usuario ya hubiera autorizado el pago.
+
+Uso:
+    python benchmarks/payments_simulator.py --port 3001 --latency-ms 150 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SimulatorConfig:
+    def __init__(self, latency_ms=100, jitter_ms=50, error_rate=0.0, timeout_rate=0.0,
+                 timeout_s=35, flask_url='http://127.0.0.1:5000'):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.flask_url = flask_url
+
+
+class PaymentsSimulator(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, SimulatorHandler)
+        self.config = config
+        self.pending = {}  # transactionId -> datos del pago, como pendingTransactions en Node
+        self.lock = threading.Lock()
+        self.requests_served = 0
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    server: PaymentsSimulator
+
+    def log_message(self, format, *args):
+        pass
+
+    # ===== Comportamiento configurable =====
+
+    def _simular_red(self):
+        """Aplica latencia y decide si esta petición falla. Devuelve False si ya respondió"""
+        config = self.server.config
+        with self.server.lock:
+            self.server.requests_served += 1
+
+        if random.random() < config.timeout_rate:
+            time.sleep(config.timeout_s)
+            return False
+
+        latencia = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        time.sleep(latencia)
+
+        if random.random() < config.error_rate:
+            self._json(500, {'success': False, 'error': 'Error simulado del servicio de pagos'})
+            return False
+        return True
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    # ===== Endpoints =====
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self._json(200, {'status': 'ok', 'service': 'open-payments-simulator', 'client_ready': True})
+
+        if self.path.startswith('/transaction-status/'):
+            if not self._simular_red():
+                return
+            transaction_id = self.path.split('/')[2]
+            with self.server.lock:
+                transaction = self.server.pending.get(transaction_id)
+            if not transaction:
+                return self._json(404, {'success': False, 'error': 'Transacción no encontrada'})
+            return self._json(200, {
+                'success': True,
+                'transactionId': transaction_id,
+                'status': 'pending',
+                'amount': transaction['amount'],
+                'currency': transaction['currency'],
+                'timestamp': transaction['timestamp'],
+            })
+
+        self._json(404, {'success': False, 'error': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        body = self._body()
+
+        if self.path == '/initiate-payment':
+            if not self._simular_red():
+                return
+            transaction_id = body.get('transactionId') or str(uuid.uuid4())
+            amount = body.get('amount', 0)
+            currency = body.get('currency', 'USD')
+            valor = str(round(float(amount) * 100))
+            with self.server.lock:
+                self.server.pending[transaction_id] = {
+                    'amount': amount,
+                    'currency': currency,
+                    'timestamp': datetime.now().isoformat(),
+                }
+            interact_ref = uuid.uuid4().hex
+            return self._json(200, {
+                'success': True,
+                'transactionId': transaction_id,
+                'interactionUrl': f'{self.server.config.flask_url}/payment-callback/{transaction_id}?interact_ref={interact_ref}',
+                'continueUri': f'http://{self.headers.get("Host")}/continue/{transaction_id}',
+                'continueToken': uuid.uuid4().hex,
+                'quote': {
+                    'debitAmount': {'value': valor, 'assetCode': currency, 'assetScale': 2},
+                    'receiveAmount': {'value': valor, 'assetCode': currency, 'assetScale': 2},
+                    'exchangeRate': 1,
+                },
+            })
+
+        if self.path.startswith('/complete-payment/'):
+            if not self._simular_red():
+                return
+            transaction_id = self.path.split('/')[2]
+            with self.server.lock:
+                transaction = self.server.pending.pop(transaction_id, None)
+            if not transaction:
+                return self._json(404, {'success': False, 'error': 'Transacción no encontrada'})
+            monto = {'value': str(round(float(transaction['amount']) * 100)),
+                     'assetCode': transaction['currency'], 'assetScale': 2}
+            return self._json(200, {
+                'success': True,
+                'paymentId': f'https://ilp.simulator.local/outgoing-payments/{uuid.uuid4()}',
+                'status': 'completed',
+                'sentAmount': monto,
+                'receivedAmount': monto,
+            })
+
+        self._json(404, {'success': False, 'error': 'Ruta no encontrada'})
+
+
+def start_simulator(host='127.0.0.1', port=3001, config=None):
+    """Arranca el simulador en un hilo y devuelve el servidor (usar .shutdown() para pararlo)"""
+    server = PaymentsSimulator((host, port), config or SimulatorConfig())
+    threading.Thread(target=server.serve_forever, name='payments-simulator', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3001)
+    parser.add_argument('--latency-ms', type=float, default=100, help='latencia media por llamada')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='desviación estándar de la latencia')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fracción de respuestas 500')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fracción de llamadas que no responden a tiempo')
+    parser.add_argument('--timeout-s', type=float, default=35, help='cuánto se cuelga una llamada con timeout')
+    parser.add_argument('--flask-url', default='http://127.0.0.1:5000', help='base de los links de callback')
+    args = parser.parse_args()
+
+    config = SimulatorConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                             args.timeout_rate, args.timeout_s, args.flask_url)
+    server = PaymentsSimulator((args.host, args.port), config)
+    print(f'Simulador de pagos en http://{args.host}:{args.port} '
+          f'(latencia {args.latency_ms}±{args.jitter_ms} ms, errores {args.error_rate:.0%}, '
+          f'timeouts {args.timeout_rate:.0%})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
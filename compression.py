@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete `brotli` solo se responde con gzip
+    brotli = None
+
+MIMETYPES_COMPRIMIBLES = (
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript', 'text/event-stream',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def comprimir(self, datos):
+        # Z_SYNC_FLUSH: cada pedazo de un stream llega al navegador sin esperar al siguiente
+        return self._c.compress(datos) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self):
+        return self._c.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self._c = brotli.Compressor(quality=level)
+
+    def comprimir(self, datos):
+        return self._c.process(datos) + self._c.flush()
+
+    def terminar(self):
+        return self._c.finish()
+
+
+class ResponseCompressor:
+    """Comprime con gzip (o brotli si está instalado) las respuestas de texto.
+
+    Se aplica en `after_request` a las respuestas cuyo mimetype está en
+    `mimetypes`, que el navegador acepta comprimidas y que no traen ya un
+    Content-Encoding (los assets de `static_assets` van precomprimidos). Las
+    respuestas completas menores que `min_size` bytes se dejan tal cual; las
+    de streaming (SSE) se comprimen pedazo a pedazo con flush, así cada evento
+    sale en cuanto se genera.
+
+    Las respuestas byte a byte idénticas (p. ej. la página principal sin
+    sesión) se comprimen una sola vez: un LRU de `cache_size` entradas guarda
+    el resultado por hash del contenido. `stats()` lleva por ruta los bytes
+    antes y después y el tiempo de CPU usado en comprimir.
+    """
+
+    def __init__(self, level=6, brotli_level=4, min_size=500, cache_size=128, cache_max_body=256 * 1024,
+                 mimetypes=MIMETYPES_COMPRIMIBLES):
+        self.level = level
+        self.brotli_level = brotli_level
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self.cache_max_body = cache_max_body
+        self.mimetypes = mimetypes
+        self.enabled = True
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'responses': 0, 'bytes_in': 0, 'bytes_out': 0,
+                                           'cpu_ms': 0.0, 'cache_hits': 0})
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('COMPRESS_ENABLED', self.enabled)
+        self.level = config.setdefault('COMPRESS_LEVEL', self.level)
+        self.brotli_level = config.setdefault('COMPRESS_BROTLI_LEVEL', self.brotli_level)
+        self.min_size = config.setdefault('COMPRESS_MIN_SIZE', self.min_size)
+        self.cache_size = config.setdefault('COMPRESS_CACHE_SIZE', self.cache_size)
+        self.cache_max_body = config.setdefault('COMPRESS_CACHE_MAX_BODY', self.cache_max_body)
+        self.mimetypes = tuple(config.setdefault('COMPRESS_MIMETYPES', self.mimetypes))
+        app.extensions['response_compressor'] = self
+        app.after_request(self._comprimir_respuesta)
+
+    # ===== Hook del request =====
+
+    def _comprimir_respuesta(self, response):
+        if (not self.enabled or request.method == 'HEAD' or response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or response.mimetype not in self.mimetypes
+                or response.cache_control.no_transform):
+            return response
+
+        # La representación depende de Accept-Encoding aunque esta vez no se comprima
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+        if encoding is None:
+            return response
+
+        ruta = request.endpoint or '-'
+        if response.is_streamed:
+            response.response = self._comprimir_stream(response.response, encoding, ruta)
+            response.headers.pop('Content-Length', None)
+        else:
+            datos = response.get_data()
+            if len(datos) < self.min_size:
+                return response
+            response.set_data(self._comprimir_cuerpo(datos, encoding, ruta))
+
+        response.headers['Content-Encoding'] = encoding
+        # El ETag fuerte describe los bytes sin comprimir; débil sigue sirviendo para If-None-Match
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
+
+    # ===== Compresión =====
+
+    def _compresor(self, encoding):
+        if encoding == 'br':
+            return _Brotli(self.brotli_level)
+        return _Gzip(self.level)
+
+    def _comprimir_cuerpo(self, datos, encoding, ruta):
+        clave = None
+        if self.cache_size and len(datos) <= self.cache_max_body:
+            clave = (encoding, hashlib.blake2b(datos, digest_size=16).digest())
+            with self._lock:
+                comprimido = self._cache.get(clave)
+                if comprimido is not None:
+                    self._cache.move_to_end(clave)
+                    self._sumar(ruta, len(datos), len(comprimido), 0.0, cache_hits=1)
+                    return comprimido
+
+        inicio = time.thread_time()
+        compresor = self._compresor(encoding)
+        comprimido = compresor.comprimir(datos) + compresor.terminar()
+        cpu = time.thread_time() - inicio
+
+        with self._lock:
+            if clave is not None:
+                self._cache[clave] = comprimido
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            self._sumar(ruta, len(datos), len(comprimido), cpu)
+        return comprimido
+
+    def _comprimir_stream(self, iterable, encoding, ruta):
+        compresor = self._compresor(encoding)
+        entrada = salida = 0
+        cpu = 0.0
+        try:
+            for pedazo in iterable:
+                if isinstance(pedazo, str):
+                    pedazo = pedazo.encode('utf-8')
+                inicio = time.thread_time()
+                comprimido = compresor.comprimir(pedazo)
+                cpu += time.thread_time() - inicio
+                entrada += len(pedazo)
+                salida += len(comprimido)
+                yield comprimido
+            final = compresor.terminar()
+            salida += len(final)
+            yield final
+        finally:
+            # Cerrar el generador original para que libere su suscripción
+            cerrar = getattr(iterable, 'close', None)
+            if cerrar is not None:
+                cerrar()
+            with self._lock:
+                self._sumar(ruta, entrada, salida, cpu)
+
+    # ===== Métricas =====
+
+    def _sumar(self, ruta, bytes_in, bytes_out, cpu, cache_hits=0):
+        # Llamar con self._lock tomado
+        stats = self._stats[ruta]
+        stats['responses'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+        stats['cpu_ms'] += cpu * 1000
+        stats['cache_hits'] += cache_hits
+
+    def stats(self):
+        with self._lock:
+            rutas = {ruta: dict(datos, cpu_ms=round(datos['cpu_ms'], 2)) for ruta, datos in self._stats.items()}
+            return {'level': self.level, 'min_size': self.min_size, 'brotli': brotli is not None,
+                    'cache_entries': len(self._cache), 'routes': rutas}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+response_compressor = ResponseCompressor()
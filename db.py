@@ -1,4 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 
+from db_routing import RoutingSession
+
 #Crear el objeto de la base de datos de tipo SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+# (la sesión manda las lecturas de las rutas de solo lectura a las réplicas, ver db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
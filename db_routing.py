@@ -0,0 +1,172 @@
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+SESSION_KEY = 'db_primario_hasta'
+
+
+def opciones_engine(url, config):
+    """Argumentos de create_engine para `url` según la configuración DB_* de la app.
+
+    SQLite en memoria usa StaticPool (lo pone Flask-SQLAlchemy), que no
+    acepta tamaño de pool; el statement timeout solo se aplica en PostgreSQL,
+    como parámetro de la conexión.
+    """
+    url = make_url(url)
+    opciones = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return opciones
+
+    opciones.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+    )
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT']:
+        opciones['connect_args'] = {'options': f'-c statement_timeout={int(config["DB_STATEMENT_TIMEOUT"])}'}
+    return opciones
+
+
+class RoutingSession(Session):
+    """Sesión que manda los SELECT de las rutas de solo lectura a una réplica.
+
+    Todo lo demás (escrituras, SELECT ... FOR UPDATE, lo que corre durante un
+    flush, hilos de fondo sin request) va al primario. Después de escribir en
+    la sesión, el resto del request también lee del primario.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('escribio'):
+            replica = db_router.replica_del_request()
+            if replica is not None and _es_lectura(clause):
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _es_lectura(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+
+class DBRouter:
+    """Opciones del pool de conexiones y ruteo de lecturas a réplicas.
+
+    `init_app` (antes de `db.init_app`) arma SQLALCHEMY_ENGINE_OPTIONS desde
+    las claves DB_* y registra cada URL de SQLALCHEMY_REPLICA_URLS como un bind
+    `replica_<n>`. Las vistas marcadas con `solo_lectura` (o el código dentro
+    de `leyendo()`) hacen sus SELECT en una réplica elegida al azar por request.
+
+    Lee lo que escribe: cuando un request confirma escrituras, la cookie de
+    sesión guarda hasta cuándo ese navegador lee del primario
+    (DB_REPLICA_STICKY_SECONDS, más que el retraso esperado de las réplicas).
+    """
+
+    def __init__(self, sticky_seconds=10):
+        self.sticky_seconds = sticky_seconds
+        self.replicas = ()
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('DB_POOL_SIZE', 10)
+        config.setdefault('DB_MAX_OVERFLOW', 20)
+        config.setdefault('DB_POOL_RECYCLE', 1800)
+        config.setdefault('DB_POOL_TIMEOUT', 10)
+        config.setdefault('DB_POOL_PRE_PING', True)
+        config.setdefault('DB_STATEMENT_TIMEOUT', 0)  # milisegundos, 0 = sin límite
+        self.sticky_seconds = config.setdefault('DB_REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        urls = config.setdefault('SQLALCHEMY_REPLICA_URLS', ())
+
+        # Lo que ya traiga SQLALCHEMY_ENGINE_OPTIONS tiene prioridad
+        opciones = opciones_engine(config['SQLALCHEMY_DATABASE_URI'], config)
+        opciones.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones
+
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        self.replicas = tuple(f'replica_{i}' for i in range(len(urls)))
+        for clave, url in zip(self.replicas, urls):
+            binds.setdefault(clave, dict(opciones_engine(url, config), url=url))
+        config['SQLALCHEMY_BINDS'] = binds
+
+        app.extensions['db_router'] = self
+        app.after_request(self._recordar_escritura)
+
+    # ===== Rutas de solo lectura =====
+
+    def solo_lectura(self, f):
+        """Decorador: los SELECT de la vista van a una réplica (si hay y el usuario no escribió hace poco)"""
+        @wraps(f)
+        def envoltura(*args, **kwargs):
+            with self.leyendo():
+                return f(*args, **kwargs)
+        return envoltura
+
+    @contextmanager
+    def leyendo(self, solo_lectura=True):
+        anterior = g.get('db_solo_lectura', False)
+        g.db_solo_lectura = solo_lectura
+        try:
+            yield
+        finally:
+            g.db_solo_lectura = anterior
+
+    def en_primario(self):
+        """Contexto que lee del primario aunque la vista sea de solo lectura"""
+        return self.leyendo(solo_lectura=False)
+
+    def replica_del_request(self):
+        """Engine de réplica para el SELECT actual o None para usar el primario"""
+        if not self.replicas or not has_request_context() or not g.get('db_solo_lectura'):
+            return None
+        if g.get('db_escritura'):
+            return None  # este request ya confirmó escrituras
+        if 'db_replica' not in g:
+            # Una sola réplica por request, para que sus lecturas sean consistentes entre sí
+            reciente = session.get(SESSION_KEY, 0) > time.time()
+            g.db_replica = None if reciente else random.choice(self.replicas)
+        if g.db_replica is None:
+            return None
+        return current_app.extensions['sqlalchemy'].engines[g.db_replica]
+
+    # ===== Lee lo que escribe =====
+
+    def _recordar_escritura(self, response):
+        if self.replicas and g.get('db_escritura'):
+            session[SESSION_KEY] = time.time() + self.sticky_seconds
+        return response
+
+    def stats(self):
+        return {'replicas': len(self.replicas), 'sticky_seconds': self.sticky_seconds}
+
+
+db_router = DBRouter()
+
+
+# ===== Escrituras de la sesión =====
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _anotar_flush(session, flush_context):
+    session.info['escribio'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _anotar_dml(orm_execute_state):
+    # INSERT/UPDATE/DELETE por lote con session.execute no pasan por el flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['escribio'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _confirmar_escritura(session):
+    if session.info.pop('escribio', False) and has_request_context():
+        g.db_escritura = True
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _descartar_escritura(session):
+    session.info.pop('escribio', None)
@@ -0,0 +1,60 @@
+"""Perfil de producción para servir la app con gunicorn.
+
+    gunicorn -c gunicorn.conf.py
+
+Carga `create_app('production')` una sola vez en el proceso maestro
+(preload_app) y hace fork de los workers, así la importación y la
+configuración se comparten y cada worker arranca al instante. Cada worker es
+gthread: varios hilos por proceso, necesarios para los streams SSE y las
+esperas al servicio de pagos.
+
+Reinicio sin cortar requests:
+    kill -HUP  $(cat gunicorn.pid)   # workers nuevos con la misma app, los viejos terminan sus requests
+    kill -USR2 $(cat gunicorn.pid)   # maestro nuevo con el código actualizado; luego QUIT al viejo
+"""
+import multiprocessing
+import os
+
+wsgi_app = "app:create_app('production')"
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+
+# Tiempo para que los requests en curso terminen al reiniciar o detener
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+
+# Reciclar workers de a poco para acotar el crecimiento de memoria
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.environ.get('GUNICORN_PIDFILE', 'gunicorn.pid')
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-')
+
+
+def post_fork(server, worker):
+    # El pool de conexiones del maestro no se puede compartir entre procesos:
+    # cada worker abre las suyas (close=False deja intactas las del maestro)
+    from db import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def when_ready(server):
+    # Las fotos de una ejecución anterior sumarían dos veces (ver metrics.py)
+    from metrics import metrics
+
+    metrics.limpiar_directorio()
+
+
+def child_exit(server, worker):
+    # Los contadores del worker que terminó pasan a muertos.json para que no bajen
+    from metrics import metrics
+
+    metrics.marcar_proceso_muerto(worker.pid)
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyKeyReused(Exception):
+    """La misma Idempotency-Key se usó con otros datos"""
+
+
+class IdempotencyTimeout(Exception):
+    """El primer request con la misma clave no terminó a tiempo"""
+
+
+class _Entrada:
+    __slots__ = ('huella', 'listo', 'resultado', 'expira_en')
+
+    def __init__(self, huella):
+        self.huella = huella
+        self.listo = threading.Event()
+        self.resultado = None
+        self.expira_en = None  # None mientras el primer request sigue en curso
+
+
+class IdempotencyCache:
+    """Respuestas recientes por clave de idempotencia, con LRU y TTL.
+
+    El primer request con una clave ejecuta la operación; los duplicados que
+    llegan mientras tanto esperan a que termine y reciben la misma respuesta,
+    sin hacer su propia llamada. Solo se guardan las respuestas exitosas
+    (`guardar(resultado)`); si la operación falla la clave queda libre para
+    reintentar. Es una caché por proceso: entre procesos la garantía la da la
+    restricción única en la base.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, wait_timeout=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.replays = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.max_entries = config.setdefault('IDEMPOTENCY_CACHE_SIZE', self.max_entries)
+        self.ttl = config.setdefault('IDEMPOTENCY_TTL', self.ttl)
+        self.wait_timeout = config.setdefault('IDEMPOTENCY_WAIT_TIMEOUT', self.wait_timeout)
+        app.extensions['idempotency_cache'] = self
+
+    def ejecutar_una_vez(self, clave, huella, operacion, guardar=lambda resultado: True):
+        """Devuelve (resultado, repetido). `huella` identifica los datos del request"""
+        entrada, primero = self._reservar(clave, huella)
+
+        if not primero:
+            if entrada.huella != huella:
+                raise IdempotencyKeyReused()
+            if not entrada.listo.wait(self.wait_timeout):
+                raise IdempotencyTimeout()
+            if entrada.resultado is None:
+                # El primero terminó con una excepción: este request lo intenta de nuevo
+                return self.ejecutar_una_vez(clave, huella, operacion, guardar)
+            with self._lock:
+                self.replays += 1
+            return entrada.resultado, True
+
+        try:
+            entrada.resultado = operacion()
+        except BaseException:
+            self._liberar(clave, entrada)
+            raise
+
+        if guardar(entrada.resultado):
+            with self._lock:
+                entrada.expira_en = time.monotonic() + self.ttl
+            entrada.listo.set()
+        else:
+            self._liberar(clave, entrada)
+        return entrada.resultado, False
+
+    def _reservar(self, clave, huella):
+        with self._lock:
+            entrada = self._entries.get(clave)
+            if entrada is not None and (entrada.expira_en is None or entrada.expira_en > time.monotonic()):
+                self._entries.move_to_end(clave)
+                return entrada, False
+
+            entrada = self._entries[clave] = _Entrada(huella)
+            while len(self._entries) > self.max_entries:
+                # Nunca expulsar una entrada en curso: sus duplicados la están esperando
+                antigua, vieja = next(iter(self._entries.items()))
+                if vieja.expira_en is None:
+                    self._entries.move_to_end(antigua)
+                    if antigua == clave:
+                        break
+                    continue
+                del self._entries[antigua]
+            return entrada, True
+
+    def _liberar(self, clave, entrada):
+        """Quita la clave sin guardar el resultado; quien espere recibe el mismo resultado o error"""
+        with self._lock:
+            if self._entries.get(clave) is entrada:
+                del self._entries[clave]
+        entrada.listo.set()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'replays': self.replays}
+
+
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,127 @@
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+from flask import g, session
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+
+from db import db
+from db_routing import db_router
+from models import Usuarios
+
+# Datos del usuario que usan las vistas y templates (sin el hash de la contraseña)
+UsuarioResumen = namedtuple('UsuarioResumen', ['id', 'name', 'lastanme', 'lastname2', 'email', 'wallet_link'])
+
+_COLUMNAS_RESUMEN = [getattr(Usuarios, campo) for campo in UsuarioResumen._fields]
+
+
+class UserSummaryCache:
+    """Caché LRU con TTL de resúmenes de usuario, compartida entre requests del proceso.
+
+    Es por proceso: cada worker de gunicorn tiene la suya y los eventos de
+    invalidación solo llegan a la del proceso que escribió. Tampoco ve los
+    UPDATE/DELETE por lote (`update(Usuarios)`) ni cambios hechos fuera de la
+    app, así que en los demás casos un dato viejo dura hasta el TTL: mantenerlo
+    corto (IDENTITY_CACHE_TTL).
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expira_en, resumen)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Devuelve el resumen guardado o None si no existe o ya expiró"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, resumen):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, resumen)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores de aciertos para monitorear la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+user_cache = UserSummaryCache()
+
+
+def init_identity(app):
+    """Configura la caché de usuarios con los valores de la app"""
+    user_cache.max_entries = app.config.setdefault('IDENTITY_CACHE_SIZE', 1024)
+    user_cache.ttl = app.config.setdefault('IDENTITY_CACHE_TTL', 30)  # segundos
+
+
+def load_user_summary(user_id):
+    """Obtiene el resumen del usuario desde la caché o con una sola consulta por PK"""
+    resumen = user_cache.get(user_id)
+    if resumen is not None:
+        return resumen
+
+    # Siempre del primario: lo que se lee aquí queda en la caché del proceso para
+    # todos los requests, y una fila atrasada de una réplica duraría todo el TTL
+    with db_router.en_primario():
+        row = db.session.execute(select(*_COLUMNAS_RESUMEN).where(Usuarios.id == user_id)).first()
+    if row is None:
+        return None
+
+    resumen = UsuarioResumen(*row)
+    user_cache.put(user_id, resumen)
+    return resumen
+
+
+def get_current_user():
+    """Usuario de la sesión actual, cargado una sola vez por request"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user_summary(user_id) if user_id is not None else None
+    return g.current_user
+
+
+# ===== Invalidación cuando cambia un registro de Usuarios =====
+
+@event.listens_for(Usuarios, 'after_update')
+@event.listens_for(Usuarios, 'after_delete')
+def _marcar_usuario_modificado(mapper, connection, target):
+    # Invalidar de inmediato y de nuevo al hacer commit, por si otro request
+    # volvió a cargar la versión anterior mientras la transacción seguía abierta
+    user_cache.invalidate(target.id)
+    object_session(target).info.setdefault('usuarios_modificados', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _invalidar_usuarios_modificados(session):
+    for user_id in session.info.pop('usuarios_modificados', ()):
+        user_cache.invalidate(user_id)
@@ -0,0 +1,351 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+from sqlalchemy import event, inspect
+
+from db import db
+from models import Transaccion
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_POR_DEFECTO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# nombre -> (tipo, ayuda)
+METRICAS = {
+    'shifting_http_requests_total': ('counter', 'Requests atendidos por ruta, método y status'),
+    'shifting_http_request_duration_seconds': ('histogram', 'Duración de los requests por ruta (hasta el primer byte)'),
+    'shifting_transaccion_transitions_total': ('counter', 'Cambios de estado de Transaccion (from="none" al crearla)'),
+    'shifting_payments_requests_total': ('counter', 'Llamadas al servicio de pagos por endpoint y resultado'),
+    'shifting_payments_request_duration_seconds': ('histogram', 'Latencia de las llamadas al servicio de pagos'),
+    'shifting_db_pool_size': ('gauge', 'Tamaño configurado del pool de conexiones'),
+    'shifting_db_pool_checked_out': ('gauge', 'Conexiones del pool en uso'),
+    'shifting_db_pool_overflow': ('gauge', 'Conexiones abiertas por encima del tamaño del pool'),
+}
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Metrics:
+    """Contadores e histogramas en formato Prometheus, por ruta, base y servicio de pagos.
+
+    Sin locks en el camino del request: cada hilo suma en su propio diccionario
+    (solo ese hilo escribe en él) y `/metrics` suma los de todos los hilos; los
+    de hilos que ya terminaron se pliegan en uno base al leer.
+
+    Con varios procesos (workers de gunicorn) y `directorio` configurado, cada
+    proceso escribe cada `flush_interval` segundos una foto de sus valores en
+    `<directorio>/<pid>.json` y `/metrics` suma las de todos, así cualquier
+    worker que atienda el scrape devuelve el total. Cuando un worker termina,
+    el maestro pliega sus contadores en `muertos.json` (ver gunicorn.conf.py)
+    para que no bajen; sus gauges se descartan. Los gauges del pool llevan la
+    etiqueta `pid` porque cada proceso tiene su propio pool.
+    """
+
+    def __init__(self, buckets=BUCKETS_POR_DEFECTO, directorio=None, flush_interval=5):
+        self.buckets = tuple(buckets)
+        self.directorio = directorio
+        self.flush_interval = flush_interval
+        self.enabled = True
+        self.app = None
+        self._local = threading.local()
+        self._shards = []  # (hilo, diccionario)
+        self._base = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._detener = threading.Event()
+        os.register_at_fork(after_in_child=self._reiniciar)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('METRICS_ENABLED', self.enabled)
+        self.directorio = config.setdefault('METRICS_DIR', self.directorio)
+        self.flush_interval = config.setdefault('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        self.buckets = tuple(config.setdefault('METRICS_BUCKETS', self.buckets))
+        self.app = app
+        app.extensions['metrics'] = self
+
+        if not self.enabled:
+            return
+
+        app.before_request(self._iniciar_request)
+        app.after_request(self._terminar_request)
+
+    def _reiniciar(self):
+        # Tras el fork el hijo empieza en cero: lo heredado ya lo cuenta el padre
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    # ===== Registro =====
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            self._asegurar_hilo()
+        return shard
+
+    def contar(self, nombre, etiquetas=(), valor=1):
+        if not self.enabled:
+            return
+        shard = self._shard()
+        clave = (nombre, etiquetas)
+        celda = shard.get(clave)
+        if celda is None:
+            celda = shard[clave] = [0.0]
+        celda[0] += valor
+
+    def observar(self, nombre, etiquetas, valor):
+        """Histograma: un contador por bucket (no acumulado), uno para +Inf y la suma al final"""
+        if not self.enabled:
+            return
+        shard = self._shard()
+        clave = (nombre, etiquetas)
+        celda = shard.get(clave)
+        if celda is None:
+            celda = shard[clave] = [0.0] * (len(self.buckets) + 2)
+        celda[bisect_left(self.buckets, valor)] += 1
+        celda[-1] += valor
+
+    def transicion(self, desde, hacia, cantidad=1):
+        """Cambio de estado de Transaccion hecho con UPDATE/INSERT por lote (ya confirmado)"""
+        if cantidad:
+            self.contar('shifting_transaccion_transitions_total',
+                        (('from', desde or 'none'), ('to', hacia)), cantidad)
+
+    def llamada_pagos(self, endpoint, segundos, resultado):
+        """Una llamada al servicio de pagos: resultado 'ok', 'error' o 'rejected' (sin llamar)"""
+        self.contar('shifting_payments_requests_total', (('endpoint', endpoint), ('outcome', resultado)))
+        if resultado != 'rejected':
+            self.observar('shifting_payments_request_duration_seconds', (('endpoint', endpoint),), segundos)
+
+    # ===== Hooks del request =====
+
+    def _iniciar_request(self):
+        g.metrics_inicio = time.perf_counter()
+
+    def _terminar_request(self, response):
+        inicio = g.get('metrics_inicio')
+        if inicio is None:
+            return response
+        ruta = request.endpoint or 'sin_ruta'
+        self.contar('shifting_http_requests_total',
+                    (('route', ruta), ('method', request.method), ('status', str(response.status_code))))
+        self.observar('shifting_http_request_duration_seconds', (('route', ruta), ('method', request.method)),
+                      time.perf_counter() - inicio)
+        return response
+
+    # ===== Lectura =====
+
+    def _valores_locales(self):
+        """Suma de todos los hilos de este proceso"""
+        with self._lock:
+            vivos = []
+            for hilo, shard in self._shards:
+                if hilo.is_alive():
+                    vivos.append((hilo, shard))
+                else:
+                    self._sumar(self._base, shard.items())
+            self._shards = vivos
+            total = {}
+            self._sumar(total, self._base.items())
+            shards = [shard for _, shard in vivos]
+        for shard in shards:
+            # list() copia el dict de una vez; los otros hilos pueden seguir sumando
+            self._sumar(total, list(shard.items()))
+        return total
+
+    @staticmethod
+    def _sumar(destino, items):
+        for clave, celda in items:
+            actual = destino.get(clave)
+            if actual is None:
+                destino[clave] = list(celda)
+            else:
+                for i, valor in enumerate(celda):
+                    actual[i] += valor
+
+    def _gauges_pool(self):
+        gauges = {}
+        pid = str(os.getpid())
+        for nombre_engine, engine in db.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, 'checkedout'):
+                continue  # StaticPool / NullPool no llevan la cuenta
+            etiquetas = (('engine', nombre_engine or 'default'), ('pid', pid))
+            gauges[('shifting_db_pool_checked_out', etiquetas)] = [float(pool.checkedout())]
+            if hasattr(pool, 'size'):
+                gauges[('shifting_db_pool_size', etiquetas)] = [float(pool.size())]
+            if hasattr(pool, 'overflow'):
+                gauges[('shifting_db_pool_overflow', etiquetas)] = [float(max(pool.overflow(), 0))]
+        return gauges
+
+    def _foto(self):
+        valores = self._valores_locales()
+        valores.update(self._gauges_pool())
+        return valores
+
+    # ===== Varios procesos =====
+
+    def _asegurar_hilo(self):
+        # Un hilo por proceso: no sobrevive al fork de gunicorn
+        if self.directorio is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while not self._detener.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('No se pudieron escribir las métricas del proceso')
+
+    def flush(self):
+        """Escribe la foto de este proceso en el directorio compartido"""
+        if self.directorio is None:
+            return
+        # db.engines necesita la app; el hilo de fondo no tiene contexto propio
+        with self.app.app_context():
+            self._escribir(os.path.join(self.directorio, f'{os.getpid()}.json'), self._foto())
+
+    @staticmethod
+    def _escribir(path, valores):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporal = f'{path}.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump([[nombre, etiquetas, celda] for (nombre, etiquetas), celda in valores.items()], archivo)
+        os.replace(temporal, path)  # atómico: quien lee nunca ve un archivo a medias
+
+    @staticmethod
+    def _leer(path):
+        try:
+            with open(path) as archivo:
+                filas = json.load(archivo)
+        except (OSError, ValueError):
+            return {}
+        return {(nombre, tuple(tuple(par) for par in etiquetas)): celda for nombre, etiquetas, celda in filas}
+
+    def marcar_proceso_muerto(self, pid):
+        """Pliega los contadores de un worker que terminó en muertos.json (lo llama el maestro)"""
+        if self.directorio is None:
+            return
+        path = os.path.join(self.directorio, f'{pid}.json')
+        valores = self._leer(path)
+        if valores:
+            muertos_path = os.path.join(self.directorio, 'muertos.json')
+            muertos = self._leer(muertos_path)
+            self._sumar(muertos, [(clave, celda) for clave, celda in valores.items()
+                                  if METRICAS.get(clave[0], ('gauge',))[0] != 'gauge'])
+            self._escribir(muertos_path, muertos)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def limpiar_directorio(self):
+        """Borra las fotos de una ejecución anterior (lo llama el maestro al arrancar)"""
+        if self.directorio is None or not os.path.isdir(self.directorio):
+            return
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.json') or nombre.endswith('.tmp'):
+                os.remove(os.path.join(self.directorio, nombre))
+
+    # ===== Exposición =====
+
+    def exposicion(self):
+        """Texto en formato de exposición de Prometheus (text/plain; version=0.0.4)"""
+        total = {}
+        if self.directorio is not None and os.path.isdir(self.directorio):
+            propio = f'{os.getpid()}.json'
+            for nombre in os.listdir(self.directorio):
+                if nombre.endswith('.json') and nombre != propio:
+                    self._sumar(total, self._leer(os.path.join(self.directorio, nombre)).items())
+        self._sumar(total, self._foto().items())
+
+        por_metrica = {}
+        for (nombre, etiquetas), celda in total.items():
+            if nombre in METRICAS:
+                por_metrica.setdefault(nombre, []).append((etiquetas, celda))
+
+        lineas = []
+        for nombre, (tipo, ayuda) in METRICAS.items():
+            series = sorted(por_metrica.get(nombre, ()), key=lambda serie: serie[0])
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            for etiquetas, celda in series:
+                if tipo != 'histogram':
+                    lineas.append(f'{nombre}{_etiquetas_texto(etiquetas)} {_numero(celda[0])}')
+                    continue
+                acumulado = 0
+                for limite, cuenta in zip(self.buckets + (float('inf'),), celda[:-1]):
+                    acumulado += cuenta
+                    lineas.append(f'{nombre}_bucket{_etiquetas_texto(etiquetas, [("le", _numero(limite))])} '
+                                  f'{_numero(acumulado)}')
+                lineas.append(f'{nombre}_sum{_etiquetas_texto(etiquetas)} {_numero(celda[-1])}')
+                lineas.append(f'{nombre}_count{_etiquetas_texto(etiquetas)} {_numero(acumulado)}')
+        return '\n'.join(lineas) + '\n'
+
+
+metrics = Metrics()
+
+
+# ===== Transiciones de Transaccion hechas con el ORM =====
+# Se cuentan al confirmar: un flush que termina en rollback no suma
+
+@event.listens_for(db.session, 'after_flush')
+def _anotar_transiciones(session, flush_context):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Transaccion):
+            continue
+        if obj in session.new:
+            session.info.setdefault('transiciones', []).append((None, obj.status))
+            continue
+        historial = inspect(obj).attrs.status.history
+        if historial.has_changes():
+            # Sin valor anterior si el objeto estaba expirado cuando se cambió el estado
+            desde = historial.deleted[0] if historial.deleted else 'unknown'
+            session.info.setdefault('transiciones', []).append((desde, obj.status))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _contar_transiciones(session):
+    for desde, hacia in session.info.pop('transiciones', ()):
+        metrics.transicion(desde, hacia)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_transiciones(session):
+    session.info.pop('transiciones', None)
@@ -0,0 +1,43 @@
+"""Agregar tabla outbox_pagos para iniciar pagos en segundo plano
+
+Revision ID: 19574fb7ba0b
+Revises: bfd9ec577e06
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '19574fb7ba0b'
+down_revision = 'bfd9ec577e06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_pagos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.String(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('resultado', sa.Text(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transacciones.transaction_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('transaction_id')
+    )
+    with op.batch_alter_table('outbox_pagos', schema=None) as batch_op:
+        batch_op.create_index('ix_outbox_pagos_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('outbox_pagos', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbox_pagos_status_next_attempt')
+
+    op.drop_table('outbox_pagos')
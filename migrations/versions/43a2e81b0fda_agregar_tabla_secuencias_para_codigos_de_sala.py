@@ -0,0 +1,31 @@
+"""Agregar tabla secuencias para generar códigos de sala
+
+Revision ID: 43a2e81b0fda
+Revises: 64c69f76dc7f
+Create Date: 2026-10-18 12:25:53.660914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43a2e81b0fda'
+down_revision = '64c69f76dc7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    secuencias = op.create_table('secuencias',
+    sa.Column('nombre', sa.String(), nullable=False),
+    sa.Column('valor', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('nombre')
+    )
+
+    # Contador inicial del generador de códigos de sala (room_codes.py)
+    op.bulk_insert(secuencias, [{'nombre': 'salas_codigo', 'valor': 0}])
+
+
+def downgrade():
+    op.drop_table('secuencias')
@@ -0,0 +1,28 @@
+"""Agregar fecha_verificacion e índice por estado a transacciones para el reconciliador
+
+Revision ID: 5e8b2d07c4a1
+Revises: a7c3e9d41b26
+Create Date: 2026-10-18 13:48:05.227914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b2d07c4a1'
+down_revision = 'a7c3e9d41b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transacciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fecha_verificacion', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_transacciones_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transacciones', schema=None) as batch_op:
+        batch_op.drop_index('ix_transacciones_status_id')
+        batch_op.drop_column('fecha_verificacion')
@@ -0,0 +1,31 @@
+"""Agregar índices compuestos para paginar mis salas y mis transacciones
+
+Revision ID: 64c69f76dc7f
+Revises: 19574fb7ba0b
+Create Date: 2026-10-18 11:40:07.218345
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '64c69f76dc7f'
+down_revision = '19574fb7ba0b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_salas_creador_activa_fecha', 'salas',
+                    ['creador_id', 'activa', sa.text('fecha_creacion DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_transacciones_sender_fecha', 'transacciones',
+                    ['sender_id', sa.text('fecha_creacion DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_transacciones_sender_status_fecha', 'transacciones',
+                    ['sender_id', 'status', sa.text('fecha_creacion DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_transacciones_sender_status_fecha', table_name='transacciones')
+    op.drop_index('ix_transacciones_sender_fecha', table_name='transacciones')
+    op.drop_index('ix_salas_creador_activa_fecha', table_name='salas')
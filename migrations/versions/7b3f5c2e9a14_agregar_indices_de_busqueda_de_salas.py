@@ -0,0 +1,62 @@
+"""Agregar índices de búsqueda de texto completo sobre salas
+
+Revision ID: 7b3f5c2e9a14
+Revises: e4d1b8a93f07
+Create Date: 2026-10-18 16:20:41.517902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f5c2e9a14'
+down_revision = 'e4d1b8a93f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_salas_activa_fecha', 'salas',
+                    ['activa', sa.text('fecha_creacion DESC'), sa.text('id DESC')], unique=False)
+
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute("ALTER TABLE salas ADD COLUMN busqueda tsvector GENERATED ALWAYS AS ("
+                   "setweight(to_tsvector('spanish', coalesce(nombre_producto, '')), 'A') || "
+                   "setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')) STORED")
+        op.execute('CREATE INDEX ix_salas_busqueda ON salas USING gin (busqueda)')
+        op.execute('CREATE INDEX ix_salas_nombre_trgm ON salas USING gin (nombre_producto gin_trgm_ops)')
+    elif dialecto == 'sqlite':
+        # Tabla FTS5 de contenido externo mantenida con triggers. Ojo: batch_alter_table
+        # sobre salas recrea la tabla y borra los triggers; hay que volver a crearlos.
+        op.execute("CREATE VIRTUAL TABLE salas_fts USING fts5(nombre_producto, descripcion, content='salas', "
+                   "content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        op.execute('CREATE TRIGGER salas_fts_ai AFTER INSERT ON salas BEGIN '
+                   'INSERT INTO salas_fts(rowid, nombre_producto, descripcion) '
+                   'VALUES (new.id, new.nombre_producto, new.descripcion); END')
+        op.execute('CREATE TRIGGER salas_fts_ad AFTER DELETE ON salas BEGIN '
+                   "INSERT INTO salas_fts(salas_fts, rowid, nombre_producto, descripcion) "
+                   "VALUES ('delete', old.id, old.nombre_producto, old.descripcion); END")
+        op.execute('CREATE TRIGGER salas_fts_au AFTER UPDATE OF nombre_producto, descripcion ON salas BEGIN '
+                   "INSERT INTO salas_fts(salas_fts, rowid, nombre_producto, descripcion) "
+                   "VALUES ('delete', old.id, old.nombre_producto, old.descripcion); "
+                   'INSERT INTO salas_fts(rowid, nombre_producto, descripcion) '
+                   'VALUES (new.id, new.nombre_producto, new.descripcion); END')
+        op.execute("INSERT INTO salas_fts(salas_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_salas_nombre_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_salas_busqueda')
+        op.execute('ALTER TABLE salas DROP COLUMN IF EXISTS busqueda')
+    elif dialecto == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS salas_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS salas_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS salas_fts_ai')
+        op.execute('DROP TABLE IF EXISTS salas_fts')
+
+    op.drop_index('ix_salas_activa_fecha', table_name='salas')
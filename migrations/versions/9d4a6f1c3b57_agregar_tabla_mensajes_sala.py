@@ -0,0 +1,40 @@
+"""Agregar tabla mensajes_sala para el chat de cada sala
+
+Revision ID: 9d4a6f1c3b57
+Revises: 7b3f5c2e9a14
+Create Date: 2026-10-18 17:05:19.604233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4a6f1c3b57'
+down_revision = '7b3f5c2e9a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mensajes_sala',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('uid', sa.String(), nullable=False),
+    sa.Column('sala_id', sa.Integer(), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('texto', sa.Text(), nullable=False),
+    sa.Column('fecha_envio', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['sala_id'], ['salas.id'], ),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('uid')
+    )
+    with op.batch_alter_table('mensajes_sala', schema=None) as batch_op:
+        batch_op.create_index('ix_mensajes_sala_sala_id', ['sala_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mensajes_sala', schema=None) as batch_op:
+        batch_op.drop_index('ix_mensajes_sala_sala_id')
+
+    op.drop_table('mensajes_sala')
@@ -0,0 +1,35 @@
+"""Agregar tabla ingresos_vendedor_diarios con el acumulado de ventas
+
+Revision ID: a7c3e9d41b26
+Revises: 43a2e81b0fda
+Create Date: 2026-10-18 13:10:42.518377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9d41b26'
+down_revision = '43a2e81b0fda'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingresos_vendedor_diarios',
+    sa.Column('vendedor_id', sa.Integer(), nullable=False),
+    sa.Column('sala_id', sa.Integer(), nullable=False),
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('pagos', sa.Integer(), nullable=False),
+    sa.Column('total_minor', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['sala_id'], ['salas.id'], ),
+    sa.ForeignKeyConstraint(['vendedor_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('vendedor_id', 'sala_id', 'dia', 'currency')
+    )
+    # Llenar con `flask recalcular-ingresos` después de migrar
+
+
+def downgrade():
+    op.drop_table('ingresos_vendedor_diarios')
@@ -0,0 +1,34 @@
+"""Agregar tabla rate_limit_buckets para el rate limiting compartido
+
+Revision ID: b6e0d3a7f218
+Revises: 9d4a6f1c3b57
+Create Date: 2026-10-18 17:48:33.120954
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e0d3a7f218'
+down_revision = '9d4a6f1c3b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_limit_buckets',
+    sa.Column('clave', sa.String(), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('actualizado', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('clave')
+    )
+    with op.batch_alter_table('rate_limit_buckets', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_rate_limit_buckets_actualizado'), ['actualizado'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rate_limit_buckets', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_rate_limit_buckets_actualizado'))
+
+    op.drop_table('rate_limit_buckets')
@@ -0,0 +1,46 @@
+"""Agregar tabla pagos_en_curso para sacar el estado de pago de la cookie
+
+Revision ID: c19f4a6e8d52
+Revises: 5e8b2d07c4a1
+Create Date: 2026-10-18 14:21:37.904415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c19f4a6e8d52'
+down_revision = '5e8b2d07c4a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('pagos_en_curso',
+    sa.Column('transaction_id', sa.String(), nullable=False),
+    sa.Column('session_token', sa.String(), nullable=False),
+    sa.Column('sala_id', sa.Integer(), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('receiver_wallet', sa.String(), nullable=False),
+    sa.Column('continue_uri', sa.String(), nullable=True),
+    sa.Column('continue_token', sa.String(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+    sa.Column('expira_en', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['sala_id'], ['salas.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['usuarios.id'], ),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transacciones.transaction_id'], ),
+    sa.PrimaryKeyConstraint('transaction_id')
+    )
+    with op.batch_alter_table('pagos_en_curso', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_pagos_en_curso_expira_en'), ['expira_en'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pagos_en_curso_session_token'), ['session_token'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pagos_en_curso', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pagos_en_curso_session_token'))
+        batch_op.drop_index(batch_op.f('ix_pagos_en_curso_expira_en'))
+
+    op.drop_table('pagos_en_curso')
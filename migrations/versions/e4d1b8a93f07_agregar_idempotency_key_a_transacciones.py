@@ -0,0 +1,28 @@
+"""Agregar idempotency_key a transacciones con restricción única por usuario
+
+Revision ID: e4d1b8a93f07
+Revises: c19f4a6e8d52
+Create Date: 2026-10-18 14:55:12.338190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4d1b8a93f07'
+down_revision = 'c19f4a6e8d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transacciones', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(), nullable=True))
+        batch_op.create_unique_constraint('uq_transacciones_sender_idempotency', ['sender_id', 'idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('transacciones', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_transacciones_sender_idempotency', type_='unique')
+        batch_op.drop_column('idempotency_key')
@@ -1,9 +1,8 @@
 from db import db
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-import secrets
+from password_hashing import password_hasher
+from datetime import datetime, date
 
 # Modelo de datos
 
@@ -20,12 +19,19 @@ class Usuarios(db.Model):
     wallet_link: Mapped[Optional[str]] = mapped_column(nullable=True)
     
     def set_password(self, password):
-        """Hashea y guarda la contraseña"""
-        self.password = generate_password_hash(password)
+        """Hashea y guarda la contraseña (en el pool de password_hashing)"""
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica si la contraseña es correcta"""
-        return check_password_hash(self.password, password)
+        """Verifica si la contraseña es correcta.
+
+        Si el hash guardado usa parámetros distintos a PASSWORD_HASH_METHOD se
+        reemplaza por uno nuevo; queda pendiente de commit en la sesión.
+        """
+        correcta, nuevo_hash = password_hasher.verify(self.password, password)
+        if nuevo_hash:
+            self.password = nuevo_hash
+        return correcta
     
     # metodo str para devolver los metodos de la class
     def __str__(self):
@@ -64,21 +70,39 @@ class Sala(db.Model):
     
     @staticmethod
     def generar_codigo():
-        """Genera un código único de 8 dígitos"""
-        while True:
-            codigo = ''.join([str(secrets.randbelow(10)) for _ in range(8)])
-            # Verificar que no exista
-            if not Sala.query.filter_by(codigo=codigo).first():
-                return codigo
+        """Genera un código único de 8 dígitos sin consultar la tabla (ver room_codes.py)"""
+        from room_codes import room_code_allocator
+        return room_code_allocator.allocate()
     
     def get_link(self):
         """Retorna el link completo para compartir"""
         return f"http://127.0.0.1:5000/sala/{self.codigo}"
     
+    def to_dict(self):
+        """Datos públicos de la sala para JSON (búsqueda)"""
+        return {
+            'codigo': self.codigo,
+            'nombre_producto': self.nombre_producto,
+            'descripcion': self.descripcion,
+            'precio': self.precio,
+            'condicion': self.condicion,
+            'activa': self.activa,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'link': self.get_link()
+        }
+    
     def __str__(self):
         return f'Sala {self.codigo} - {self.nombre_producto} (${self.precio})'
 
 
+# Índice para listar las salas activas de un creador paginando por (fecha, id)
+db.Index('ix_salas_creador_activa_fecha', Sala.creador_id, Sala.activa,
+         Sala.fecha_creacion.desc(), Sala.id.desc())
+
+# Índice para el listado general de salas (búsqueda sin texto), más recientes primero
+db.Index('ix_salas_activa_fecha', Sala.activa, Sala.fecha_creacion.desc(), Sala.id.desc())
+
+
 class MiembroSala(db.Model):
     """Modelo para registrar usuarios que se unen a salas"""
     __tablename__ = 'miembros_sala'
@@ -117,22 +141,30 @@ class Transaccion(db.Model):
     amount: Mapped[float] = mapped_column()
     currency: Mapped[str] = mapped_column(default='USD')
     
-    # Estados posibles: 'initiated', 'pending', 'completed', 'failed', 'cancelled'
+    # Estados posibles: 'initiated', 'pending', 'completed', 'failed', 'cancelled', 'expired'
     status: Mapped[str] = mapped_column(default='initiated')
     
     # Metadatos
     fecha_creacion: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     fecha_completado: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    fecha_verificacion: Mapped[Optional[datetime]] = mapped_column(nullable=True)  # Última consulta del reconciliador
     
     # Detalles técnicos de Open Payments
     quote_id: Mapped[Optional[str]] = mapped_column(nullable=True)
     interaction_url: Mapped[Optional[str]] = mapped_column(nullable=True)
     error_message: Mapped[Optional[str]] = mapped_column(nullable=True)
     
+    # Clave de idempotencia del request que la creó (única por usuario)
+    idempotency_key: Mapped[Optional[str]] = mapped_column(nullable=True)
+    
     # Relaciones para facilitar consultas
     sala = relationship("Sala", backref="transacciones")
     sender = relationship("Usuarios", backref="transacciones_enviadas")
     
+    __table_args__ = (
+        db.UniqueConstraint('sender_id', 'idempotency_key', name='uq_transacciones_sender_idempotency'),
+    )
+    
     def __str__(self):
         return f'Transacción {self.transaction_id} - ${self.amount} {self.currency} ({self.status})'
     
@@ -151,5 +183,142 @@ class Transaccion(db.Model):
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
             'fecha_completado': self.fecha_completado.isoformat() if self.fecha_completado else None,
             'quote_id': self.quote_id,
+            'interaction_url': self.interaction_url,
             'error_message': self.error_message
         }
+
+
+# Índices para el historial de transacciones paginado (con y sin filtro de estado)
+db.Index('ix_transacciones_sender_fecha', Transaccion.sender_id,
+         Transaccion.fecha_creacion.desc(), Transaccion.id.desc())
+db.Index('ix_transacciones_sender_status_fecha', Transaccion.sender_id, Transaccion.status,
+         Transaccion.fecha_creacion.desc(), Transaccion.id.desc())
+# Índice para que el reconciliador recorra las no finales por páginas de id
+db.Index('ix_transacciones_status_id', Transaccion.status, Transaccion.id)
+
+
+class IngresoVendedor(db.Model):
+    """Acumulado de pagos completados por vendedor, sala, día y moneda.
+
+    Se actualiza en el mismo commit que pasa una Transaccion a 'completed'
+    (ver revenue.py), así los totales del vendedor no necesitan recorrer
+    `transacciones`. Los montos van en unidades menores (centavos) para no
+    sumar floats.
+    """
+    __tablename__ = 'ingresos_vendedor_diarios'
+    
+    vendedor_id: Mapped[int] = mapped_column(db.ForeignKey('usuarios.id'), primary_key=True)
+    sala_id: Mapped[int] = mapped_column(db.ForeignKey('salas.id'), primary_key=True)
+    dia: Mapped[date] = mapped_column(primary_key=True)
+    currency: Mapped[str] = mapped_column(primary_key=True)
+    
+    pagos: Mapped[int] = mapped_column(default=0)
+    total_minor: Mapped[int] = mapped_column(db.BigInteger, default=0)
+    
+    def __str__(self):
+        return f'Vendedor {self.vendedor_id} sala {self.sala_id} {self.dia}: {self.pagos} pagos, {self.total_minor} {self.currency}'
+
+
+class PagoEnCurso(db.Model):
+    """Estado de un pago entre initiate_payment y payment_callback.
+
+    Antes vivía en la cookie de sesión; ahora la sesión solo guarda un token
+    opaco (`session_token`) y cualquier worker puede terminar el callback.
+    Las filas vencen en `expira_en` (ver payment_state.py).
+    """
+    __tablename__ = 'pagos_en_curso'
+    
+    transaction_id: Mapped[str] = mapped_column(db.ForeignKey('transacciones.transaction_id'), primary_key=True)
+    session_token: Mapped[str] = mapped_column(index=True)
+    sala_id: Mapped[int] = mapped_column(db.ForeignKey('salas.id'))
+    sender_id: Mapped[int] = mapped_column(db.ForeignKey('usuarios.id'))
+    amount: Mapped[float] = mapped_column()
+    receiver_wallet: Mapped[str] = mapped_column()
+    
+    # Datos del grant que devuelve el servicio de pagos (los escribe la outbox)
+    continue_uri: Mapped[Optional[str]] = mapped_column(nullable=True)
+    continue_token: Mapped[Optional[str]] = mapped_column(nullable=True)
+    
+    fecha_creacion: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    expira_en: Mapped[datetime] = mapped_column(index=True)
+    
+    def __str__(self):
+        return f'Pago en curso {self.transaction_id} (vence {self.expira_en})'
+
+
+class OutboxPago(db.Model):
+    """Outbox de llamadas pendientes al servicio de pagos.
+
+    Se escribe en el mismo commit que la Transaccion y lo procesa el
+    despachador en segundo plano (ver outbox.py).
+    """
+    __tablename__ = 'outbox_pagos'
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    transaction_id: Mapped[str] = mapped_column(db.ForeignKey('transacciones.transaction_id'), unique=True)
+    payload: Mapped[str] = mapped_column(db.Text)  # JSON enviado a /initiate-payment
+    
+    # Estados posibles: 'pending', 'processing', 'sent', 'dead'
+    status: Mapped[str] = mapped_column(default='pending')
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    locked_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(nullable=True)
+    resultado: Mapped[Optional[str]] = mapped_column(db.Text, nullable=True)  # JSON de la respuesta exitosa
+    
+    fecha_creacion: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_outbox_pagos_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    def __str__(self):
+        return f'Outbox {self.transaction_id} ({self.status}, intentos: {self.attempts})'
+
+
+class Secuencia(db.Model):
+    """Contadores con nombre de los que se reservan bloques de valores (ver room_codes.py)"""
+    __tablename__ = 'secuencias'
+    
+    nombre: Mapped[str] = mapped_column(primary_key=True)
+    valor: Mapped[int] = mapped_column(db.BigInteger, default=0)
+    
+    def __str__(self):
+        return f'Secuencia {self.nombre} = {self.valor}'
+
+
+class MensajeSala(db.Model):
+    """Mensaje del chat de una sala entre vendedor y compradores.
+
+    Los escribe por lotes el hub de chat (ver sala_chat.py); `uid` se asigna
+    al publicar, antes de tener id en la base, y sirve para no repetir un
+    mensaje al leer los de otros procesos.
+    """
+    __tablename__ = 'mensajes_sala'
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    uid: Mapped[str] = mapped_column(unique=True)
+    sala_id: Mapped[int] = mapped_column(db.ForeignKey('salas.id'))
+    usuario_id: Mapped[int] = mapped_column(db.ForeignKey('usuarios.id'))
+    texto: Mapped[str] = mapped_column(db.Text)
+    fecha_envio: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Últimos mensajes de una sala y los nuevos desde cierto id
+        db.Index('ix_mensajes_sala_sala_id', 'sala_id', 'id'),
+    )
+    
+    def __str__(self):
+        return f'Mensaje {self.uid} en sala {self.sala_id} de {self.usuario_id}'
+
+
+class RateLimitBucket(db.Model):
+    """Token bucket compartido entre procesos para el rate limiting (ver rate_limit.py)"""
+    __tablename__ = 'rate_limit_buckets'
+    
+    clave: Mapped[str] = mapped_column(primary_key=True)  # 'regla:ip o usuario'
+    tokens: Mapped[float] = mapped_column()
+    actualizado: Mapped[float] = mapped_column(index=True)  # epoch en segundos
+    
+    def __str__(self):
+        return f'Bucket {self.clave}: {self.tokens:.2f} tokens'
@@ -0,0 +1,240 @@
+import json
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import insert, select, update, or_, and_
+
+from db import db
+from metrics import metrics
+from models import OutboxPago, Transaccion
+from payments_client import payments_client, PaymentsServiceBusy, PaymentsServiceUnavailable
+from payment_events import payment_events
+from payment_state import payment_state
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_pago(transaccion, payment_data):
+    """Agrega a la sesión la entrada de outbox de una transacción nueva.
+
+    No hace commit: la entrada debe guardarse en el mismo commit que la
+    Transaccion para que ninguna de las dos quede sin la otra.
+    """
+    entrada = OutboxPago(
+        transaction_id=transaccion.transaction_id,
+        payload=json.dumps(payment_data),
+    )
+    db.session.add(entrada)
+    return entrada
+
+
+def encolar_lote(pagos):
+    """Inserta en un solo INSERT las entradas de outbox de varios pagos (sin commit)"""
+    db.session.execute(insert(OutboxPago), [
+        {'transaction_id': payment_data['transactionId'], 'payload': json.dumps(payment_data)}
+        for payment_data in pagos
+    ])
+
+
+class OutboxDispatcher:
+    """Pool de hilos que vacía la outbox y llama al servicio de pagos.
+
+    Cada hilo reclama entradas con un UPDATE condicional, así varios hilos o
+    procesos pueden compartir la misma tabla sin procesar dos veces una entrada.
+    Los errores de conexión y 5xx se reintentan con backoff exponencial; al
+    agotar los intentos (o ante un 4xx) la entrada pasa a 'dead' y la
+    Transaccion a 'failed'. Los rechazos del propio cliente (circuito abierto
+    o sin cupo) solo posponen la entrada, sin gastar intentos.
+    """
+
+    def __init__(self, concurrency=4, max_attempts=5, backoff_base=2, backoff_max=300,
+                 poll_interval=2, visibility_timeout=120):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.app = None
+        self.enabled = True
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.concurrency = config.setdefault('OUTBOX_CONCURRENCY', self.concurrency)
+        self.max_attempts = config.setdefault('OUTBOX_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff_base = config.setdefault('OUTBOX_BACKOFF_BASE', self.backoff_base)
+        self.backoff_max = config.setdefault('OUTBOX_BACKOFF_MAX', self.backoff_max)
+        self.poll_interval = config.setdefault('OUTBOX_POLL_INTERVAL', self.poll_interval)
+        self.visibility_timeout = config.setdefault('OUTBOX_VISIBILITY_TIMEOUT', self.visibility_timeout)
+        self.enabled = config.setdefault('OUTBOX_ENABLED', self.enabled)
+        self.app = app
+        app.extensions['outbox_dispatcher'] = self
+
+    # ===== Ciclo de vida =====
+
+    def ensure_started(self):
+        """Arranca los hilos la primera vez que se necesita (es barato llamarlo en cada request)"""
+        if self._threads or not self.enabled:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.concurrency):
+                hilo = threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+                hilo.start()
+                self._threads.append(hilo)
+
+    def notify(self):
+        """Despierta a los hilos tras encolar un pago nuevo"""
+        self.ensure_started()
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for hilo in self._threads:
+            hilo.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    procesadas = self.drain_once()
+            except Exception:
+                logger.exception('Error en el despachador de outbox')
+                procesadas = 0
+            if not procesadas:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    # ===== Procesamiento =====
+
+    def drain_once(self, limit=10):
+        """Reclama y procesa hasta `limit` entradas listas. Devuelve cuántas procesó"""
+        procesadas = 0
+        while procesadas < limit:
+            entrada_id = self._reclamar()
+            if entrada_id is None:
+                break
+            self._procesar(entrada_id)
+            procesadas += 1
+        return procesadas
+
+    def _reclamar(self):
+        ahora = datetime.utcnow()
+        vencidas = ahora - timedelta(seconds=self.visibility_timeout)
+        lista = or_(
+            and_(OutboxPago.status == 'pending', OutboxPago.next_attempt_at <= ahora),
+            # Entradas de un hilo o proceso que murió a mitad del envío
+            and_(OutboxPago.status == 'processing', OutboxPago.locked_at < vencidas),
+        )
+        candidatos = db.session.execute(
+            select(OutboxPago.id).where(lista).order_by(OutboxPago.next_attempt_at).limit(self.concurrency)
+        ).scalars().all()
+
+        for entrada_id in candidatos:
+            resultado = db.session.execute(
+                update(OutboxPago)
+                .where(OutboxPago.id == entrada_id, lista)
+                .values(status='processing', locked_at=ahora, attempts=OutboxPago.attempts + 1)
+            )
+            db.session.commit()
+            if resultado.rowcount == 1:
+                return entrada_id
+        return None
+
+    def _procesar(self, entrada_id):
+        entrada = db.session.get(OutboxPago, entrada_id)
+        payment_data = json.loads(entrada.payload)
+
+        try:
+            response = payments_client.initiate_payment(payment_data)
+        except PaymentsServiceBusy as e:
+            # Rechazo local: no llegó al servicio, no cuenta como intento
+            self._posponer(entrada, payments_client.queue_timeout, str(e))
+            return
+        except PaymentsServiceUnavailable as e:
+            # Circuito abierto: esperar a que el breaker deje pasar la prueba
+            self._posponer(entrada, payments_client.breaker.reset_timeout, str(e))
+            return
+        except requests.RequestException as e:
+            self._reintentar(entrada, f'Error de conexión: {e}')
+            return
+
+        try:
+            result = response.json()
+        except ValueError:
+            result = {}
+
+        if response.status_code == 200 and result.get('success'):
+            self._marcar_enviada(entrada, result)
+        elif 400 <= response.status_code < 500:
+            self._descartar(entrada, result.get('error') or f'HTTP {response.status_code}')
+        else:
+            self._reintentar(entrada, result.get('error') or f'HTTP {response.status_code}')
+
+    def _marcar_enviada(self, entrada, result):
+        entrada.status = 'sent'
+        entrada.locked_at = None
+        entrada.last_error = None
+        entrada.resultado = json.dumps({
+            'interactionUrl': result.get('interactionUrl'),
+            'quote': result.get('quote'),
+        })
+        # Los datos para completar el pago van al estado del pago en curso
+        payment_state.registrar_grant(entrada.transaction_id, result.get('continueUri'), result.get('continueToken'))
+        actualizadas = db.session.execute(
+            update(Transaccion)
+            .where(Transaccion.transaction_id == entrada.transaction_id, Transaccion.status == 'initiated')
+            .values(status='pending', interaction_url=result.get('interactionUrl'))
+        ).rowcount
+        db.session.commit()
+        metrics.transicion('initiated', 'pending', actualizadas)
+        payment_events.notificar([entrada.transaction_id])
+
+    def _reintentar(self, entrada, error):
+        if entrada.attempts >= self.max_attempts:
+            self._descartar(entrada, error)
+            return
+        espera = min(self.backoff_max, self.backoff_base ** entrada.attempts)
+        entrada.status = 'pending'
+        entrada.locked_at = None
+        entrada.last_error = error
+        entrada.next_attempt_at = datetime.utcnow() + timedelta(seconds=espera * random.uniform(0.5, 1.0))
+        db.session.commit()
+
+    def _posponer(self, entrada, espera, motivo):
+        """Devuelve la entrada a la cola sin gastar un intento (el reclamo ya lo sumó)"""
+        entrada.status = 'pending'
+        entrada.locked_at = None
+        entrada.attempts = max(entrada.attempts - 1, 0)
+        entrada.last_error = motivo
+        entrada.next_attempt_at = datetime.utcnow() + timedelta(seconds=espera * random.uniform(1.0, 1.2))
+        db.session.commit()
+
+    def _descartar(self, entrada, error):
+        """Dead-letter: no se reintenta más y la transacción queda fallida"""
+        logger.warning('Outbox %s descartada tras %s intentos: %s', entrada.transaction_id, entrada.attempts, error)
+        entrada.status = 'dead'
+        entrada.locked_at = None
+        entrada.last_error = error
+        actualizadas = db.session.execute(
+            update(Transaccion)
+            .where(Transaccion.transaction_id == entrada.transaction_id, Transaccion.status == 'initiated')
+            .values(status='failed', error_message=error)
+        ).rowcount
+        db.session.commit()
+        metrics.transicion('initiated', 'failed', actualizadas)
+        payment_events.notificar([entrada.transaction_id])
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(fecha, id):
+    """Cursor opaco con la posición (fecha_creacion, id) del último elemento de la página"""
+    raw = f'{fecha.isoformat()}|{id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Devuelve (fecha, id) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        fecha, id = raw.split('|')
+        return datetime.fromisoformat(fecha), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def encode_score_cursor(score, id):
+    """Cursor opaco con la posición (puntaje, id) para páginas ordenadas por relevancia"""
+    raw = f'{score!r}|{id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_score_cursor(cursor):
+    """Devuelve (puntaje, id) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        score, id = raw.split('|')
+        return float(score), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def parse_limit(value, default=20, maximum=100):
+    """Tamaño de página pedido en la URL, acotado entre 1 y `maximum`"""
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(query, fecha_col, id_col, cursor, limit):
+    """Página ordenada por (fecha DESC, id DESC) usando paginación por cursor.
+
+    En lugar de OFFSET se filtra por la posición del último elemento visto, así
+    la consulta usa el índice y cuesta lo mismo en la primera página que en la
+    última. Devuelve (elementos, siguiente_cursor); el cursor es None al final.
+    """
+    posicion = decode_cursor(cursor)
+    if posicion is not None:
+        fecha, id = posicion
+        query = query.filter(or_(fecha_col < fecha, and_(fecha_col == fecha, id_col < id)))
+
+    # Pedir uno de más para saber si hay otra página sin hacer COUNT
+    elementos = query.order_by(fecha_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(elementos) <= limit:
+        return elementos, None
+
+    elementos = elementos[:limit]
+    ultimo = elementos[-1]
+    return elementos, encode_cursor(getattr(ultimo, fecha_col.key), getattr(ultimo, id_col.key))
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """La cola de hashing está llena: el request se rechaza con 503 en lugar de esperar"""
+
+
+def parametros_de_hash(pwhash):
+    """Parte del hash con el método y sus parámetros, p. ej. 'scrypt:32768:8:1'"""
+    return pwhash.split('$', 1)[0]
+
+
+def _hashear(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verificar(pwhash, password, method):
+    """Verifica y, si el hash usa otros parámetros, devuelve también el hash nuevo.
+
+    Se hace en la misma llamada al worker para no pagar otro viaje por el rehash.
+    """
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if parametros_de_hash(pwhash) != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    """Hashing y verificación de contraseñas fuera de los workers web.
+
+    scrypt consume decenas de milisegundos de CPU y memoria por llamada; una
+    ráfaga de logins dejaba a los workers de Flask sin CPU para el resto de
+    rutas. Las llamadas se mandan a un pool de procesos acotado y, si ya hay
+    `max_pending` en cola, se rechazan enseguida con `PasswordHasherBusy`
+    (503 + Retry-After) en vez de acumular latencia. Con `workers=0` todo se
+    ejecuta en el mismo proceso, útil en pruebas.
+
+    `workers` y `max_pending` son por proceso web: con gunicorn hay un pool
+    por worker, así que el total es `workers` × GUNICORN_WORKERS procesos de
+    scrypt (32 MiB cada uno con N=32768). Por eso el valor por defecto es
+    chico; el perfil de producción reparte los CPU entre los workers.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', workers=2, max_pending=None, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending or max(self.workers * 4, 1)
+        self.timeout = timeout
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.method = config.setdefault('PASSWORD_HASH_METHOD', self.method)
+        self.workers = config.setdefault('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = config.setdefault('PASSWORD_HASH_MAX_PENDING', max(self.workers * 4, 1))
+        self.timeout = config.setdefault('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._cupos = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['password_hasher'] = self
+        app.register_error_handler(PasswordHasherBusy, self._respuesta_ocupado)
+
+    def _respuesta_ocupado(self, error):
+        return 'Demasiados inicios de sesión en este momento. Intenta de nuevo en unos segundos.', 503, {
+            'Retry-After': '1',
+        }
+
+    def hash(self, password):
+        self._contar('hashed')
+        return self._ejecutar(_hashear, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Devuelve (correcta, hash_nuevo); hash_nuevo solo si hay que rehashear"""
+        self._contar('verified')
+        correcta, nuevo = self._ejecutar(_verificar, pwhash, password, self.method)
+        if nuevo:
+            self._contar('rehashed')
+        return correcta, nuevo
+
+    def _ejecutar(self, funcion, *args):
+        if not self.workers:
+            return funcion(*args)
+
+        if not self._cupos.acquire(blocking=False):
+            self._contar('rejected')
+            raise PasswordHasherBusy()
+        try:
+            futuro = self._executor().submit(funcion, *args)
+        except BaseException:
+            self._cupos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupos.release())
+
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            futuro.cancel()
+            self._contar('rejected')
+            raise PasswordHasherBusy()
+
+    def _executor(self):
+        # Un pool por proceso: si el servidor hace fork después de crearlo se abre otro
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # spawn: el proceso web ya tiene hilos (outbox) y fork con hilos no es seguro
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _contar(self, clave):
+        with self._stats_lock:
+            self._stats[clave] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data.update(method=self.method, workers=self.workers, max_pending=self.max_pending)
+        return data
+
+
+password_hasher = PasswordHasher()
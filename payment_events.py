@@ -0,0 +1,246 @@
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import event, select
+
+from db import db
+from models import OutboxPago, Transaccion
+from reconciler import transaction_reconciler
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_FINALES = {'completed', 'failed', 'cancelled', 'expired'}
+
+
+def estados_publicos(transacciones):
+    """Estado que ven el comprador y la página de la sala, por transaction_id.
+
+    Igual al que devuelve `estado_transaccion`; para las 'pending' agrega el
+    link de autorización y la cotización guardados por la outbox, con una sola
+    consulta para todas.
+    """
+    pendientes = [t.transaction_id for t in transacciones if t.status == 'pending']
+    resultados = {}
+    if pendientes:
+        resultados = dict(db.session.execute(
+            select(OutboxPago.transaction_id, OutboxPago.resultado).where(OutboxPago.transaction_id.in_(pendientes))
+        ).all())
+
+    estados = {}
+    for transaccion in transacciones:
+        data = {'success': True, 'transaccion': transaccion.to_dict()}
+        if transaccion.status == 'pending':
+            resultado = json.loads(resultados.get(transaccion.transaction_id) or '{}')
+            data['interactionUrl'] = resultado.get('interactionUrl')
+            data['quote'] = resultado.get('quote')
+        estados[transaccion.transaction_id] = data
+    return estados
+
+
+class _Canal:
+    """Último estado conocido de una transacción y quién lo está esperando"""
+
+    __slots__ = ('estado', 'version', 'suscriptores', 'ultima_consulta')
+
+    def __init__(self, estado):
+        self.estado = estado
+        self.version = 1
+        self.suscriptores = 0
+        self.ultima_consulta = time.monotonic()  # último chequeo con el servicio de pagos
+
+
+class PaymentEventsHub:
+    """Reparte cambios de estado de transacciones a los streams SSE del proceso.
+
+    Un solo hilo vigila las transacciones que tienen al menos un suscriptor:
+    cada `poll_interval` segundos relee todas en una consulta (así ve también
+    los UPDATE por lote y los cambios hechos en otros procesos) y cada
+    `upstream_interval` segundos consulta al servicio de pagos las que siguen
+    'pending', una vez por transacción sin importar cuántas pestañas la sigan.
+    Los cambios hechos con el ORM en este proceso (p. ej. `payment_callback`)
+    se publican al hacer commit, sin esperar al siguiente ciclo.
+
+    Cada stream ocupa un hilo de gunicorn mientras está abierto, así que el
+    proceso acepta como mucho `max_streams` a la vez (reservar_stream); el
+    resto recibe 503 y el navegador sigue con el polling de estado_transaccion.
+    """
+
+    def __init__(self, poll_interval=2, upstream_interval=15, heartbeat=15, max_stream=600, max_streams=4):
+        self.poll_interval = poll_interval
+        self.upstream_interval = upstream_interval
+        self.heartbeat = heartbeat
+        self.max_stream = max_stream
+        self.max_streams = max_streams
+        self.app = None
+        self._canales = {}
+        self._lock = threading.Lock()
+        self._cambio = threading.Condition(self._lock)
+        self._despertar = threading.Event()
+        self._thread = None
+        self._streams = 0
+        self._rechazados = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.poll_interval = config.setdefault('PAYMENT_EVENTS_POLL_INTERVAL', self.poll_interval)
+        self.upstream_interval = config.setdefault('PAYMENT_EVENTS_UPSTREAM_INTERVAL', self.upstream_interval)
+        self.heartbeat = config.setdefault('PAYMENT_EVENTS_HEARTBEAT', self.heartbeat)
+        self.max_stream = config.setdefault('PAYMENT_EVENTS_MAX_STREAM', self.max_stream)
+        self.max_streams = config.setdefault('PAYMENT_EVENTS_MAX_STREAMS', self.max_streams)
+        self.app = app
+        app.extensions['payment_events'] = self
+
+    # ===== Publicación =====
+
+    def notificar(self, transaction_ids):
+        """Pide releer ya estas transacciones (tras un UPDATE por lote, por ejemplo)"""
+        with self._lock:
+            if not any(transaction_id in self._canales for transaction_id in transaction_ids):
+                return
+        self._despertar.set()
+
+    def _publicar(self, estados):
+        with self._lock:
+            for transaction_id, estado in estados.items():
+                canal = self._canales.get(transaction_id)
+                if canal is not None and canal.estado != estado:
+                    canal.estado = estado
+                    canal.version += 1
+            self._cambio.notify_all()
+
+    # ===== Suscripción =====
+
+    def reservar_stream(self):
+        """Toma un lugar para un stream; False si ya hay `max_streams` abiertos en el proceso.
+
+        Quien lo toma lo devuelve con `liberar_stream` al cerrar la respuesta,
+        aunque el generador nunca haya empezado.
+        """
+        with self._lock:
+            if self._streams >= self.max_streams:
+                self._rechazados += 1
+                return False
+            self._streams += 1
+            return True
+
+    def liberar_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def stream(self, transaction_id, estado_inicial):
+        """Generador de eventos SSE para una transacción.
+
+        Envía el estado actual y luego cada cambio; cierra al llegar a un
+        estado final o tras `max_stream` segundos (EventSource reconecta solo).
+        Entre cambios manda un comentario cada `heartbeat` segundos para que
+        los proxies no corten la conexión.
+        """
+        with self._lock:
+            canal = self._canales.get(transaction_id)
+            if canal is None:
+                canal = self._canales[transaction_id] = _Canal(estado_inicial)
+            canal.suscriptores += 1
+        self._asegurar_hilo()
+
+        try:
+            version = 0
+            limite = time.monotonic() + self.max_stream
+            while time.monotonic() < limite:
+                with self._lock:
+                    if canal.version == version:
+                        self._cambio.wait(self.heartbeat)
+                    nueva_version, estado = canal.version, canal.estado
+
+                if nueva_version == version:
+                    yield ': ping\n\n'
+                    continue
+
+                version = nueva_version
+                yield f'id: {version}\nevent: estado\ndata: {json.dumps(estado)}\n\n'
+                if estado['transaccion']['status'] in ESTADOS_FINALES:
+                    break
+        finally:
+            with self._lock:
+                canal.suscriptores -= 1
+                if canal.suscriptores == 0:
+                    self._canales.pop(transaction_id, None)
+
+    # ===== Hilo vigilante =====
+
+    def _asegurar_hilo(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='payment-events', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._despertar.wait(self.poll_interval)
+            self._despertar.clear()
+            with self._lock:
+                vigiladas = list(self._canales)
+            if not vigiladas:
+                continue
+            try:
+                with self.app.app_context():
+                    self._revisar(vigiladas)
+            except Exception:
+                logger.exception('Error revisando transacciones con suscriptores')
+
+    def _revisar(self, transaction_ids):
+        transacciones = Transaccion.query.filter(Transaccion.transaction_id.in_(transaction_ids)).all()
+        estados = estados_publicos(transacciones)
+        db.session.commit()
+        self._publicar(estados)
+
+        # Un chequeo con el servicio de pagos por transacción, compartido por todos sus suscriptores
+        ahora = time.monotonic()
+        consultar = []
+        with self._lock:
+            for transaction_id, estado in estados.items():
+                canal = self._canales.get(transaction_id)
+                if (canal is not None and estado['transaccion']['status'] == 'pending'
+                        and ahora - canal.ultima_consulta >= self.upstream_interval):
+                    canal.ultima_consulta = ahora
+                    consultar.append(transaction_id)
+        if consultar:
+            resultados = transaction_reconciler.verificar(consultar)
+            if resultados.get('completed') or resultados.get('failed'):
+                self._despertar.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'transactions': len(self._canales),
+                'subscribers': sum(canal.suscriptores for canal in self._canales.values()),
+                'streams': self._streams,
+                'streams_rejected': self._rechazados,
+            }
+
+
+payment_events = PaymentEventsHub()
+
+
+# ===== Cambios hechos con el ORM en este proceso =====
+
+@event.listens_for(db.session, 'after_flush')
+def _anotar_transacciones_modificadas(session, flush_context):
+    ids = {obj.transaction_id for obj in list(session.new) + list(session.dirty) if isinstance(obj, Transaccion)}
+    if ids:
+        session.info.setdefault('transacciones_modificadas', set()).update(ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publicar_transacciones_modificadas(session):
+    ids = session.info.pop('transacciones_modificadas', None)
+    if ids:
+        payment_events.notificar(ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_transacciones_modificadas(session):
+    session.info.pop('transacciones_modificadas', None)
@@ -0,0 +1,76 @@
+import secrets
+from datetime import datetime, timedelta
+
+from flask import session
+from sqlalchemy import delete, insert, select, update
+
+from db import db
+from models import PagoEnCurso
+
+SESSION_KEY = 'pagos'
+
+
+class PaymentStateStore:
+    """Estado de los pagos en curso guardado en la base, con vencimiento.
+
+    La cookie de sesión solo lleva un token opaco por navegador; los datos de
+    cada pago (sala, monto, wallet y el grant para completar) quedan en
+    `pagos_en_curso` con clave `transaction_id`. Las filas vencidas se ignoran
+    al leer y se borran por lotes con `purgar_expirados`.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+
+    def init_app(self, app):
+        self.ttl = app.config.setdefault('PAYMENT_STATE_TTL', self.ttl)
+        app.extensions['payment_state'] = self
+
+    def token_de_sesion(self, crear=True):
+        """Token opaco del navegador actual; se crea la primera vez que inicia un pago"""
+        token = session.get(SESSION_KEY)
+        if token is None and crear:
+            token = session[SESSION_KEY] = secrets.token_urlsafe(16)
+        return token
+
+    def guardar(self, pagos):
+        """Agrega a la sesión de base de datos el estado de uno o varios pagos (sin commit).
+
+        `pagos` son dicts con transaction_id, sala_id, sender_id, amount y
+        receiver_wallet. Se guarda en el mismo commit que las transacciones.
+        """
+        token = self.token_de_sesion()
+        expira_en = datetime.utcnow() + timedelta(seconds=self.ttl)
+        db.session.execute(insert(PagoEnCurso), [
+            dict(pago, session_token=token, expira_en=expira_en) for pago in pagos
+        ])
+
+    def obtener(self, transaction_id):
+        """Estado vigente del pago o None si no existe o ya venció"""
+        return db.session.execute(
+            select(PagoEnCurso).where(PagoEnCurso.transaction_id == transaction_id,
+                                      PagoEnCurso.expira_en > datetime.utcnow())
+        ).scalar()
+
+    def registrar_grant(self, transaction_id, continue_uri, continue_token):
+        """Guarda los datos para completar el pago (sin commit)"""
+        db.session.execute(
+            update(PagoEnCurso)
+            .where(PagoEnCurso.transaction_id == transaction_id)
+            .values(continue_uri=continue_uri, continue_token=continue_token)
+        )
+
+    def eliminar(self, transaction_id):
+        db.session.execute(delete(PagoEnCurso).where(PagoEnCurso.transaction_id == transaction_id))
+
+    def purgar_expirados(self, limite=1000):
+        """Borra hasta `limite` filas vencidas y devuelve cuántas borró"""
+        vencidas = select(PagoEnCurso.transaction_id).where(
+            PagoEnCurso.expira_en <= datetime.utcnow()
+        ).limit(limite).scalar_subquery()
+        resultado = db.session.execute(delete(PagoEnCurso).where(PagoEnCurso.transaction_id.in_(vencidas)))
+        db.session.commit()
+        return resultado.rowcount
+
+
+payment_state = PaymentStateStore()
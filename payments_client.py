@@ -0,0 +1,223 @@
+import threading
+import time
+
+import requests
+from flask import has_request_context
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+from request_log import request_payments_time
+
+
+class PaymentsServiceUnavailable(requests.RequestException):
+    """El circuito está abierto: no se intenta llamar al servicio de pagos"""
+
+
+class PaymentsServiceBusy(PaymentsServiceUnavailable):
+    """Ya hay `max_concurrency` llamadas en curso y no se liberó un cupo a tiempo"""
+
+
+class CircuitBreaker:
+    """Circuito simple: se abre tras N fallas seguidas y deja pasar una prueba al expirar"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow_request(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            # Half-open: solo una petición de prueba a la vez
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class PaymentsClient:
+    """Cliente compartido para el servicio de pagos (Node.js, puerto 3001).
+
+    Reutiliza conexiones con keep-alive, separa timeouts de conexión y lectura,
+    corta las llamadas mientras el servicio falla y lleva contadores de latencia
+    por endpoint. Como máximo `max_concurrency` llamadas a la vez por proceso
+    (requests, outbox y reconciliador juntos); la siguiente espera un cupo
+    hasta `queue_timeout` segundos y si no lo consigue falla con
+    `PaymentsServiceBusy`, así un servicio lento no acapara todos los hilos.
+    """
+
+    # Respuestas que indican que el servicio no está sano (no errores de negocio)
+    UNHEALTHY_STATUS = {502, 503, 504}
+
+    def __init__(self, base_url='http://localhost:3001', connect_timeout=2, read_timeout=30,
+                 pool_size=10, failure_threshold=5, reset_timeout=30, health_ttl=5, max_concurrency=16,
+                 queue_timeout=2):
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.health_ttl = health_ttl
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._cupos = threading.BoundedSemaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._health = None  # (expira_en, status_code, body)
+        self._health_lock = threading.Lock()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Lee la configuración del cliente desde la app"""
+        config = app.config
+        self.base_url = config.setdefault('PAYMENTS_SERVICE_URL', self.base_url)
+        self.connect_timeout = config.setdefault('PAYMENTS_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = config.setdefault('PAYMENTS_READ_TIMEOUT', self.read_timeout)
+        self.pool_size = config.setdefault('PAYMENTS_POOL_SIZE', self.pool_size)
+        self.health_ttl = config.setdefault('PAYMENTS_HEALTH_TTL', self.health_ttl)
+        self.breaker.failure_threshold = config.setdefault('PAYMENTS_BREAKER_THRESHOLD', self.breaker.failure_threshold)
+        self.breaker.reset_timeout = config.setdefault('PAYMENTS_BREAKER_RESET', self.breaker.reset_timeout)
+        self.max_concurrency = config.setdefault('PAYMENTS_MAX_CONCURRENCY', self.max_concurrency)
+        self.queue_timeout = config.setdefault('PAYMENTS_QUEUE_TIMEOUT', self.queue_timeout)
+        self._cupos = threading.BoundedSemaphore(self.max_concurrency)
+        app.extensions['payments_client'] = self
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    # ===== Endpoints del servicio de pagos =====
+
+    def initiate_payment(self, payment_data):
+        return self._request('initiate-payment', 'POST', '/initiate-payment', json=payment_data)
+
+    def complete_payment(self, transaction_id, data):
+        return self._request('complete-payment', 'POST', f'/complete-payment/{transaction_id}', json=data)
+
+    def transaction_status(self, transaction_id):
+        return self._request('transaction-status', 'GET', f'/transaction-status/{transaction_id}',
+                             read_timeout=10)
+
+    def health(self):
+        """Estado del servicio, cacheado durante `health_ttl` segundos.
+
+        Devuelve (status_code, body). Si el circuito está abierto responde 503
+        sin llamar al servicio.
+        """
+        with self._health_lock:
+            if self._health is not None and self._health[0] > time.monotonic():
+                return self._health[1], self._health[2]
+
+        try:
+            response = self._request('health', 'GET', '/health', read_timeout=5)
+            result = (response.status_code, response.json())
+        except (requests.RequestException, ValueError):
+            result = (503, {'status': 'error', 'message': 'Servicio de pagos no disponible'})
+
+        with self._health_lock:
+            self._health = (time.monotonic() + self.health_ttl, *result)
+        return result
+
+    # ===== Internos =====
+
+    def _request(self, endpoint, method, path, read_timeout=None, **kwargs):
+        # Con el circuito abierto se rechaza sin esperar cupo
+        if self.breaker.state == 'open':
+            self._record(endpoint, 0.0, error=True, rejected=True)
+            raise PaymentsServiceUnavailable('Servicio de pagos no disponible (circuito abierto)')
+
+        # El cupo antes de allow_request, para no gastar la llamada de prueba del circuito semiabierto
+        if not self._cupos.acquire(timeout=self.queue_timeout):
+            self._record(endpoint, 0.0, error=True, rejected=True)
+            raise PaymentsServiceBusy('Servicio de pagos ocupado (demasiadas llamadas en curso)')
+
+        if not self.breaker.allow_request():
+            self._cupos.release()
+            self._record(endpoint, 0.0, error=True, rejected=True)
+            raise PaymentsServiceUnavailable('Servicio de pagos no disponible (circuito abierto)')
+
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        inicio = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=timeout, **kwargs)
+        except BaseException:
+            # Cualquier excepción (no solo de requests) libera la prueba del circuito semiabierto
+            self.breaker.record_failure()
+            self._record(endpoint, time.perf_counter() - inicio, error=True)
+            raise
+        finally:
+            self._cupos.release()
+
+        unhealthy = response.status_code in self.UNHEALTHY_STATUS
+        if unhealthy:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._record(endpoint, time.perf_counter() - inicio, error=unhealthy or response.status_code >= 500)
+        return response
+
+    def _record(self, endpoint, elapsed, error=False, rejected=False):
+        if has_request_context():
+            request_payments_time(elapsed)
+        metrics.llamada_pagos(endpoint, elapsed, 'rejected' if rejected else 'error' if error else 'ok')
+        with self._stats_lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {
+                    'calls': 0, 'errors': 0, 'rejected': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                }
+            if rejected:
+                stats['rejected'] += 1
+                return
+            elapsed_ms = elapsed * 1000
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def stats(self):
+        """Contadores de latencia por endpoint y estado del circuito"""
+        with self._stats_lock:
+            endpoints = {
+                endpoint: dict(values, avg_ms=round(values['total_ms'] / values['calls'], 2) if values['calls'] else 0.0)
+                for endpoint, values in self._stats.items()
+            }
+        return {'circuit': self.breaker.state, 'max_concurrency': self.max_concurrency, 'endpoints': endpoints}
+
+
+payments_client = PaymentsClient()
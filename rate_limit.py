@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request, session
+from sqlalchemy import delete, func, select
+
+from db import db
+from models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+# Regla -> (capacidad, segundos para rellenarla completa)
+LIMITES_POR_DEFECTO = {
+    'login_ip': (20, 60),
+    'login_usuario': (5, 60),
+    'signup_ip': (5, 300),
+    'pago_ip': (30, 60),
+    'pago_usuario': (20, 60),
+}
+
+
+class RateLimitExceeded(Exception):
+    """Se acabaron los tokens del bucket; `retry_after` en segundos"""
+
+    def __init__(self, regla, retry_after):
+        super().__init__(regla)
+        self.regla = regla
+        self.retry_after = retry_after
+
+
+def por_ip():
+    return request.remote_addr or '-'
+
+
+def por_usuario():
+    return session.get('user_id')
+
+
+def _rellenar(tokens, actualizado, ahora, capacidad, periodo):
+    return min(capacidad, tokens + (ahora - actualizado) * capacidad / periodo)
+
+
+def _espera(tokens, costo, capacidad, periodo):
+    """Segundos hasta tener `costo` tokens, redondeado hacia arriba para Retry-After"""
+    faltan = costo - tokens
+    return max(1, int(faltan * periodo / capacidad + 0.999))
+
+
+class RateLimiter:
+    """Token buckets por IP y por usuario para las rutas caras.
+
+    Cada regla tiene una capacidad (ráfaga permitida) que se rellena en
+    `periodo` segundos. El bucket de este proceso se revisa primero, en
+    memoria: si ya está vacío se rechaza sin tocar la base, así una ráfaga
+    cuesta un diccionario y un 429. Con `backend='database'` los requests que
+    pasan ese primer filtro consumen además del bucket compartido en la tabla
+    `rate_limit_buckets`, con un solo upsert condicional; así el límite vale
+    para todos los workers. Si la base falla se deja pasar (fail open) con el
+    resultado local.
+
+    Los rechazos responden 429 con Retry-After (JSON si el request era JSON).
+    """
+
+    def __init__(self, limites=None, backend='local', max_keys=100000, purge_interval=300):
+        self.limites = dict(limites or LIMITES_POR_DEFECTO)
+        self.backend = backend
+        self.max_keys = max_keys
+        self.purge_interval = purge_interval
+        self.enabled = True
+        self._buckets = OrderedDict()  # (regla, clave) -> [tokens, actualizado]
+        self._lock = threading.Lock()
+        self._ultima_purga = time.monotonic()
+        self._stats = {'allowed': 0, 'rejected': 0, 'backend_errors': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('RATE_LIMIT_ENABLED', self.enabled)
+        self.backend = config.setdefault('RATE_LIMIT_BACKEND', self.backend)
+        self.max_keys = config.setdefault('RATE_LIMIT_MAX_KEYS', self.max_keys)
+        self.purge_interval = config.setdefault('RATE_LIMIT_PURGE_INTERVAL', self.purge_interval)
+        self.limites.update(config.setdefault('RATE_LIMITS', {}))
+        app.extensions['rate_limiter'] = self
+        app.register_error_handler(RateLimitExceeded, self._respuesta_limitada)
+
+    def _respuesta_limitada(self, error):
+        headers = {'Retry-After': str(error.retry_after)}
+        mensaje = 'Demasiados intentos. Intenta de nuevo en unos segundos.'
+        if request.is_json:
+            return jsonify({'success': False, 'error': mensaje}), 429, headers
+        return mensaje, 429, headers
+
+    # ===== API =====
+
+    def consumir(self, regla, clave, costo=1):
+        """Consume `costo` tokens o lanza RateLimitExceeded"""
+        if not self.enabled or clave is None:
+            return
+        capacidad, periodo = self.limites[regla]
+
+        espera = self._consumir_local(regla, clave, costo, capacidad, periodo)
+        if espera is None and self.backend == 'database':
+            espera = self._consumir_compartido(f'{regla}:{clave}', costo, capacidad, periodo)
+
+        with self._lock:
+            self._stats['rejected' if espera else 'allowed'] += 1
+        if espera:
+            raise RateLimitExceeded(regla, espera)
+
+    def limit(self, regla, clave=por_ip, methods=('POST',)):
+        """Decorador: consume de `regla` con la clave que devuelve `clave()` en los métodos dados"""
+        def decorador(f):
+            @wraps(f)
+            def envoltura(*args, **kwargs):
+                if request.method in methods:
+                    self.consumir(regla, clave())
+                return f(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    # ===== Bucket en memoria =====
+
+    def _consumir_local(self, regla, clave, costo, capacidad, periodo):
+        ahora = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get((regla, clave))
+            if bucket is None:
+                bucket = self._buckets[(regla, clave)] = [float(capacidad), ahora]
+                # Un bucket expulsado vuelve lleno, igual que uno inactivo hace tiempo
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end((regla, clave))
+                bucket[0] = _rellenar(bucket[0], bucket[1], ahora, capacidad, periodo)
+                bucket[1] = ahora
+
+            if bucket[0] < costo:
+                return _espera(bucket[0], costo, capacidad, periodo)
+            bucket[0] -= costo
+            return None
+
+    # ===== Bucket compartido en la base =====
+
+    def _consumir_compartido(self, clave, costo, capacidad, periodo):
+        ahora = time.time()
+        try:
+            # Conexión propia: no mezclar con la transacción del request
+            with db.engine.begin() as conn:
+                espera = self._upsert(conn, clave, costo, capacidad, periodo, ahora)
+                if time.monotonic() - self._ultima_purga >= self.purge_interval:
+                    self._ultima_purga = time.monotonic()
+                    self._purgar(conn, ahora)
+                return espera
+        except Exception:
+            logger.exception('Rate limit compartido no disponible; se usa solo el límite local')
+            with self._lock:
+                self._stats['backend_errors'] += 1
+            return None
+
+    def _upsert(self, conn, clave, costo, capacidad, periodo, ahora):
+        tabla = RateLimitBucket.__table__
+        dialecto = conn.dialect.name
+        if dialecto not in ('postgresql', 'sqlite'):
+            return self._consumir_con_bloqueo(conn, clave, costo, capacidad, periodo, ahora)
+
+        if dialecto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+            minimo = func.least
+        else:
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+            minimo = func.min  # con dos argumentos es el min escalar de SQLite
+
+        rellenado = minimo(capacidad, tabla.c.tokens + (ahora - tabla.c.actualizado) * (capacidad / periodo))
+        stmt = insert_dialecto(tabla).values(clave=clave, tokens=capacidad - costo, actualizado=ahora)
+        # El WHERE deja la fila intacta si no alcanza: sin fila en RETURNING es un rechazo
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['clave'],
+            set_={'tokens': rellenado - costo, 'actualizado': ahora},
+            where=rellenado >= costo,
+        ).returning(tabla.c.tokens)
+        if conn.execute(stmt).first() is not None:
+            return None
+
+        tokens, actualizado = conn.execute(
+            select(tabla.c.tokens, tabla.c.actualizado).where(tabla.c.clave == clave)).one()
+        return _espera(_rellenar(tokens, actualizado, ahora, capacidad, periodo), costo, capacidad, periodo)
+
+    def _consumir_con_bloqueo(self, conn, clave, costo, capacidad, periodo, ahora):
+        # Otros motores: leer con FOR UPDATE y escribir en la misma transacción
+        tabla = RateLimitBucket.__table__
+        fila = conn.execute(select(tabla.c.tokens, tabla.c.actualizado)
+                            .where(tabla.c.clave == clave).with_for_update()).first()
+        tokens = capacidad if fila is None else _rellenar(fila.tokens, fila.actualizado, ahora, capacidad, periodo)
+        if tokens < costo:
+            return _espera(tokens, costo, capacidad, periodo)
+        if fila is None:
+            conn.execute(tabla.insert().values(clave=clave, tokens=tokens - costo, actualizado=ahora))
+        else:
+            conn.execute(tabla.update().where(tabla.c.clave == clave)
+                         .values(tokens=tokens - costo, actualizado=ahora))
+        return None
+
+    def _purgar(self, conn, ahora):
+        """Borra los buckets que ya se habrían rellenado por completo: equivalen a no tener fila"""
+        periodo_maximo = max(periodo for _, periodo in self.limites.values())
+        conn.execute(delete(RateLimitBucket).where(RateLimitBucket.actualizado < ahora - periodo_maximo))
+
+    # ===== Métricas =====
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend=self.backend, keys=len(self._buckets))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,283 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import and_, func, or_, select, update
+
+from db import db
+from metrics import metrics
+from models import Transaccion
+from payment_state import payment_state
+from payments_client import payments_client
+from revenue import acumular
+
+logger = logging.getLogger(__name__)
+
+# Estados que el servicio de pagos puede reportar como definitivos
+ESTADOS_FINALES = {'completed', 'failed', 'cancelled'}
+
+
+class TransactionReconciler:
+    """Hilo que revisa periódicamente las transacciones que siguen 'pending'.
+
+    Hoy una transacción solo sale de 'pending' si el navegador del comprador
+    llega a `payment_callback`; los flujos abandonados se quedaban así para
+    siempre. En cada pasada:
+
+    1. Marca 'expired' con un solo UPDATE las no finales más viejas que
+       `expire_after` segundos y borra los estados de pago en curso vencidos.
+    2. Recorre por páginas (keyset sobre id) las 'pending' sin revisar en los
+       últimos `recheck_interval` segundos y consulta su estado en el servicio
+       de pagos con `concurrency` llamadas simultáneas como máximo. Cada
+       página se reclama antes de consultarla (FOR UPDATE SKIP LOCKED y
+       fecha_verificacion = ahora), así los workers de gunicorn, que corren
+       todos el reconciliador, se reparten las filas en lugar de repetirlas.
+    3. Aplica los cambios de cada página con UPDATEs por lote (condicionados a
+       que la fila siga 'pending') y suma al acumulado de ingresos, en el mismo
+       commit, solo las filas que cambió. `payment_callback` también cierra la
+       transacción con un UPDATE condicionado, así que ninguno pisa al otro ni
+       un pago se suma dos veces.
+
+    Los contadores de `stats()` incluyen el backlog (transacciones no finales)
+    y el lag (segundos desde la última revisión de la más atrasada).
+    """
+
+    def __init__(self, interval=30, page_size=100, concurrency=8, stale_after=60,
+                 recheck_interval=300, expire_after=24 * 3600):
+        self.interval = interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.stale_after = stale_after
+        self.recheck_interval = recheck_interval
+        self.expire_after = expire_after
+        self.app = None
+        self.enabled = True
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'runs': 0, 'checked': 0, 'completed': 0, 'failed': 0, 'expired': 0, 'errors': 0, 'purged': 0,
+            'backlog': None, 'lag_seconds': None, 'last_run_at': None, 'last_run_ms': None,
+        }
+
+    def init_app(self, app):
+        config = app.config
+        self.interval = config.setdefault('RECONCILER_INTERVAL', self.interval)
+        self.page_size = config.setdefault('RECONCILER_PAGE_SIZE', self.page_size)
+        self.concurrency = config.setdefault('RECONCILER_CONCURRENCY', self.concurrency)
+        self.stale_after = config.setdefault('RECONCILER_STALE_AFTER', self.stale_after)
+        self.recheck_interval = config.setdefault('RECONCILER_RECHECK_INTERVAL', self.recheck_interval)
+        self.expire_after = config.setdefault('RECONCILER_EXPIRE_AFTER', self.expire_after)
+        self.enabled = config.setdefault('RECONCILER_ENABLED', self.enabled)
+        self.app = app
+        app.extensions['transaction_reconciler'] = self
+
+    # ===== Ciclo de vida =====
+
+    def ensure_started(self):
+        if self._thread is not None or not self.enabled:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='reconciler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception('Error en el reconciliador de transacciones')
+                self._sumar(errors=1)
+            self._stop.wait(self.interval)
+
+    # ===== Pasada =====
+
+    def run_once(self):
+        """Una pasada completa. Devuelve los contadores de esta pasada"""
+        inicio = time.perf_counter()
+        pasada = {'checked': 0, 'completed': 0, 'failed': 0, 'expired': self._expirar(), 'errors': 0,
+                  'purged': payment_state.purgar_expirados()}
+
+        ultimo_id = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='reconciler-http') as pool:
+            while not self._stop.is_set():
+                pagina, ultimo_id = self._reclamar_pagina(ultimo_id)
+                if ultimo_id is None:
+                    break
+                if not pagina:
+                    continue  # toda la página la reclamó otro proceso
+                resultados = list(pool.map(self._consultar, [transaction_id for _, transaction_id in pagina]))
+                for clave, valor in self._aplicar(resultados).items():
+                    pasada[clave] += valor
+
+        backlog, lag = self._medir_backlog()
+        self._sumar(runs=1, **pasada)
+        with self._stats_lock:
+            self._stats.update(backlog=backlog, lag_seconds=lag, last_run_at=datetime.utcnow().isoformat(),
+                               last_run_ms=round((time.perf_counter() - inicio) * 1000, 1))
+        return pasada
+
+    def verificar(self, transaction_ids):
+        """Consulta y aplica ahora el estado de transacciones concretas (fuera de la pasada)"""
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(transaction_ids)),
+                                thread_name_prefix='reconciler-http') as pool:
+            resultados = self._aplicar(list(pool.map(self._consultar, transaction_ids)))
+        self._sumar(**resultados)
+        return resultados
+
+    def _expirar(self):
+        limite = datetime.utcnow() - timedelta(seconds=self.expire_after)
+        # Un UPDATE por estado de origen para contar cada transición por separado
+        expiradas = {}
+        for estado in ('initiated', 'pending'):
+            expiradas[estado] = db.session.execute(
+                update(Transaccion)
+                .where(Transaccion.status == estado, Transaccion.fecha_creacion < limite)
+                .values(status='expired', error_message='Expirada sin confirmación del pago')
+            ).rowcount
+        db.session.commit()
+        for estado, cantidad in expiradas.items():
+            metrics.transicion(estado, 'expired', cantidad)
+        return sum(expiradas.values())
+
+    def _reclamar_pagina(self, ultimo_id):
+        """Reclama la siguiente página de 'pending' a revisar.
+
+        Devuelve ([(id, transaction_id), ...], último id visto) o ([], None)
+        cuando no quedan candidatas. Las filas reclamadas quedan con
+        fecha_verificacion = ahora y ningún otro proceso las toma hasta
+        `recheck_interval`; las que otro reclamó entre el SELECT y el UPDATE
+        se omiten.
+        """
+        ahora = datetime.utcnow()
+        por_revisar = and_(
+            Transaccion.status == 'pending',
+            Transaccion.fecha_creacion < ahora - timedelta(seconds=self.stale_after),
+            or_(Transaccion.fecha_verificacion.is_(None),
+                Transaccion.fecha_verificacion < ahora - timedelta(seconds=self.recheck_interval)),
+        )
+        # SKIP LOCKED en PostgreSQL; SQLite ignora FOR UPDATE y el UPDATE condicionado decide
+        candidatos = db.session.execute(
+            select(Transaccion.id)
+            .where(por_revisar, Transaccion.id > ultimo_id)
+            .order_by(Transaccion.id)
+            .limit(self.page_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not candidatos:
+            db.session.commit()
+            return [], None
+
+        pagina = db.session.execute(
+            update(Transaccion)
+            .where(Transaccion.id.in_(candidatos), por_revisar)
+            .values(fecha_verificacion=ahora)
+            .returning(Transaccion.id, Transaccion.transaction_id)
+        ).all()
+        db.session.commit()
+        return sorted(pagina), candidatos[-1]
+
+    def _consultar(self, transaction_id):
+        """(transaction_id, estado, error) según el servicio; estado None si no se pudo saber"""
+        try:
+            response = payments_client.transaction_status(transaction_id)
+        except requests.RequestException as e:
+            return transaction_id, None, str(e)
+        if response.status_code == 404:
+            # El servicio ya no la conoce; se deja para la expiración por edad
+            return transaction_id, None, None
+        if response.status_code != 200:
+            return transaction_id, None, f'HTTP {response.status_code}'
+        try:
+            body = response.json()
+        except ValueError:
+            return transaction_id, None, 'Respuesta inválida del servicio de pagos'
+        return transaction_id, body.get('status'), body.get('error')
+
+    def _aplicar(self, resultados):
+        """Aplica una página de resultados con UPDATEs por lote en un solo commit"""
+        ahora = datetime.utcnow()
+        completadas, fallidas, revisadas, errores = [], {}, [], 0
+        for transaction_id, estado, error in resultados:
+            if estado is None and error:
+                errores += 1
+                continue
+            revisadas.append(transaction_id)
+            if estado == 'completed':
+                completadas.append(transaction_id)
+            elif estado in ESTADOS_FINALES:
+                fallidas.setdefault((estado, error or 'Pago rechazado por el servicio de pagos'), []).append(transaction_id)
+
+        pendiente = Transaccion.status == 'pending'
+        total_fallidas = 0
+        if completadas:
+            filas = db.session.execute(
+                update(Transaccion)
+                .where(Transaccion.transaction_id.in_(completadas), pendiente)
+                .values(status='completed', fecha_completado=ahora)
+                .returning(Transaccion.sala_id, Transaccion.amount, Transaccion.currency,
+                           Transaccion.fecha_completado, Transaccion.fecha_creacion)
+            ).all()
+            # El UPDATE por lote no pasa por el hook de sesión de revenue.py
+            acumular(db.session.connection(), filas)
+            completadas = filas
+        por_estado = {}
+        for (estado, error), ids in fallidas.items():
+            cantidad = db.session.execute(
+                update(Transaccion)
+                .where(Transaccion.transaction_id.in_(ids), pendiente)
+                .values(status=estado, error_message=error)
+            ).rowcount
+            por_estado[estado] = por_estado.get(estado, 0) + cantidad
+            total_fallidas += cantidad
+        if revisadas:
+            db.session.execute(
+                update(Transaccion)
+                .where(Transaccion.transaction_id.in_(revisadas))
+                .values(fecha_verificacion=ahora)
+            )
+        db.session.commit()
+        metrics.transicion('pending', 'completed', len(completadas))
+        for estado, cantidad in por_estado.items():
+            metrics.transicion('pending', estado, cantidad)
+        return {'checked': len(revisadas), 'completed': len(completadas), 'failed': total_fallidas, 'errors': errores}
+
+    # ===== Métricas =====
+
+    def _medir_backlog(self):
+        backlog, mas_vieja = db.session.execute(
+            select(func.count(), func.min(func.coalesce(Transaccion.fecha_verificacion, Transaccion.fecha_creacion)))
+            .where(Transaccion.status.in_(('initiated', 'pending')))
+        ).one()
+        db.session.commit()
+        lag = (datetime.utcnow() - mas_vieja).total_seconds() if mas_vieja else 0.0
+        return backlog, round(max(lag, 0.0), 1)
+
+    def _sumar(self, **contadores):
+        with self._stats_lock:
+            for clave, valor in contadores.items():
+                self._stats[clave] += valor
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+transaction_reconciler = TransactionReconciler()
@@ -0,0 +1,187 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import g, request, session
+
+
+def request_payments_time(segundos):
+    """Suma tiempo de llamadas al servicio de pagos al request actual (lo llama PaymentsClient)"""
+    g.payments_time = g.get('payments_time', 0.0) + segundos
+
+
+class _FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro; el mensaje ya es el dict del request"""
+
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class _ColaSinBloqueo(QueueHandler):
+    """QueueHandler que descarta (y cuenta) cuando la cola está llena en lugar de esperar"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Sin formatear aquí: el JSON se arma en el hilo escritor, fuera del request
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class RequestLog:
+    """Log estructurado de requests en JSON lines.
+
+    Por request escribe una línea con ruta, método, status, duración, usuario,
+    tiempo y cantidad de consultas a la base (de sql_instrumentation) y tiempo
+    de llamadas al servicio de pagos. El request solo arma un dict y lo deja en
+    una cola acotada; un hilo de fondo (QueueListener) lo serializa y escribe
+    en un archivo que rota por tamaño. Si la cola se llena la línea se descarta
+    y se cuenta, nunca se espera.
+
+    `sample_rate` (0 a 1) elige qué fracción de requests se escribe; los
+    errores 5xx y los más lentos que `slow_ms` se escriben siempre. Cada
+    línea lleva la tasa con la que se muestreó para poder reponderar.
+
+    Con varios workers de gunicorn cada proceso rota su archivo por su
+    cuenta: usar `{pid}` en REQUEST_LOG_PATH para que no compartan archivo.
+    """
+
+    def __init__(self, path='logs/requests.jsonl', max_bytes=50 * 1024 * 1024, backups=5, sample_rate=1.0,
+                 slow_ms=500, queue_size=10000, excluir=('static',)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.queue_size = queue_size
+        self.excluir = excluir
+        self.enabled = True
+        self._handler = None
+        self._listener = None
+        self._pid = None
+        self._atexit = False
+        self._lock = threading.Lock()
+        self._escritos = 0
+        self._muestreo_descartados = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('REQUEST_LOG_ENABLED', self.enabled)
+        self.path = config.setdefault('REQUEST_LOG_PATH', self.path)
+        self.max_bytes = config.setdefault('REQUEST_LOG_MAX_BYTES', self.max_bytes)
+        self.backups = config.setdefault('REQUEST_LOG_BACKUPS', self.backups)
+        self.sample_rate = config.setdefault('REQUEST_LOG_SAMPLE_RATE', self.sample_rate)
+        self.slow_ms = config.setdefault('REQUEST_LOG_SLOW_MS', self.slow_ms)
+        self.queue_size = config.setdefault('REQUEST_LOG_QUEUE_SIZE', self.queue_size)
+        self.excluir = config.setdefault('REQUEST_LOG_EXCLUDE', self.excluir)
+        app.extensions['request_log'] = self
+
+        if not self.enabled:
+            return
+
+        app.before_request(self._iniciar_request)
+        app.after_request(self._terminar_request)
+
+    # ===== Hooks del request =====
+
+    def _iniciar_request(self):
+        g.request_log_inicio = time.perf_counter()
+
+    def _terminar_request(self, response):
+        inicio = g.get('request_log_inicio')
+        if not self.enabled or inicio is None or request.endpoint in self.excluir:
+            return response
+
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        # Muestreo antes de armar nada; errores y requests lentos siempre
+        if (self.sample_rate < 1.0 and response.status_code < 500 and duracion_ms < self.slow_ms
+                and random.random() >= self.sample_rate):
+            self._muestreo_descartados += 1
+            return response
+
+        sql = g.get('sql_stats')
+        registro = {
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'method': request.method,
+            'route': request.endpoint,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duracion_ms, 2),
+            # Solo si la vista ya leyó la sesión: leerla aquí agregaría Vary: Cookie
+            'user_id': session.get('user_id') if getattr(session, 'accessed', False) else None,
+            'db_ms': round(sql.total * 1000, 2) if sql is not None else None,
+            'db_queries': sql.count if sql is not None else None,
+            'payments_ms': round(g.get('payments_time', 0.0) * 1000, 2),
+            'sample_rate': self.sample_rate,
+        }
+        if response.is_streamed:
+            # En un stream (SSE) la duración es hasta el primer byte, no hasta que se cierra
+            registro['streamed'] = True
+
+        self._asegurar_escritor()
+        self._handler.handle(logging.makeLogRecord({'msg': registro, 'levelno': logging.INFO,
+                                                    'levelname': 'INFO', 'name': __name__}))
+        self._escritos += 1
+        return response
+
+    # ===== Escritor en segundo plano =====
+
+    def _asegurar_escritor(self):
+        # Se arranca en el primer request de cada proceso: los hilos no sobreviven al fork de gunicorn
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            path = self.path.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            archivo = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                          encoding='utf-8', delay=True)
+            archivo.setFormatter(_FormatoJSON())
+            self._handler = _ColaSinBloqueo(queue.Queue(self.queue_size))
+            self._listener = QueueListener(self._handler.queue, archivo)
+            self._listener.start()
+            if not self._atexit:
+                atexit.register(self.flush)
+                self._atexit = True
+            self._pid = os.getpid()
+
+    def flush(self):
+        """Espera a que el hilo escritor vacíe la cola y lo detiene (se vuelve a arrancar solo)"""
+        with self._lock:
+            if self._listener is None or self._pid != os.getpid():
+                return
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+            self._pid = None
+
+    # ===== Métricas =====
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'written': self._escritos,
+            'sampled_out': self._muestreo_descartados,
+            'dropped': self._handler.descartados if self._handler is not None else 0,
+            'queued': self._handler.queue.qsize() if self._handler is not None else 0,
+            'sample_rate': self.sample_rate,
+        }
+
+
+request_log = RequestLog()
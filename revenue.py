@@ -0,0 +1,162 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import click
+from sqlalchemy import case, delete, event, func, insert, inspect, select, text, update
+
+from db import db
+from models import IngresoVendedor, Sala, Transaccion
+
+# Decimales de cada moneda; las que no aparecen usan 2
+DECIMALES_MONEDA = {'JPY': 0, 'KRW': 0, 'CLP': 0, 'VND': 0, 'BHD': 3, 'KWD': 3, 'JOD': 3}
+
+_CLAVE = ('vendedor_id', 'sala_id', 'dia', 'currency')
+
+
+def a_unidades_menores(amount, currency):
+    """Convierte el monto float de Transaccion a un entero en unidades menores"""
+    decimales = DECIMALES_MONEDA.get((currency or 'USD').upper(), 2)
+    return int(Decimal(str(amount)).scaleb(decimales).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def desde_unidades_menores(total_minor, currency):
+    decimales = DECIMALES_MONEDA.get((currency or 'USD').upper(), 2)
+    return Decimal(total_minor).scaleb(-decimales)
+
+
+def _dia_completado(transaccion):
+    return (transaccion.fecha_completado or transaccion.fecha_creacion or datetime.utcnow()).date()
+
+
+def acumular(conn, transacciones):
+    """Suma al acumulado las transacciones dadas, dentro de la transacción de `conn`.
+
+    `transacciones` son objetos con sala_id, amount, currency y fechas (filas
+    ORM o de Core). Las filas se agrupan antes de escribir para que cada clave
+    reciba un solo upsert.
+    """
+    transacciones = list(transacciones)
+    if not transacciones:
+        return
+
+    sala_ids = {t.sala_id for t in transacciones}
+    vendedores = dict(conn.execute(select(Sala.id, Sala.creador_id).where(Sala.id.in_(sala_ids))).all())
+
+    acumulado = defaultdict(lambda: [0, 0])
+    for t in transacciones:
+        clave = (vendedores[t.sala_id], t.sala_id, _dia_completado(t), t.currency or 'USD')
+        acumulado[clave][0] += 1
+        acumulado[clave][1] += a_unidades_menores(t.amount, t.currency)
+
+    filas = [dict(zip(_CLAVE, clave), pagos=pagos, total_minor=total)
+             for clave, (pagos, total) in acumulado.items()]
+    _upsert(conn, filas)
+
+
+def _upsert(conn, filas):
+    tabla = IngresoVendedor.__table__
+    dialecto = conn.dialect.name
+
+    if dialecto in ('postgresql', 'sqlite'):
+        if dialecto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+        else:
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+        stmt = insert_dialecto(tabla)
+        stmt = stmt.on_conflict_do_update(index_elements=list(_CLAVE), set_={
+            'pagos': tabla.c.pagos + stmt.excluded.pagos,
+            'total_minor': tabla.c.total_minor + stmt.excluded.total_minor,
+        })
+        conn.execute(stmt, filas)
+        return
+
+    # Otros motores: UPDATE y, si no existía la fila, INSERT
+    for fila in filas:
+        resultado = conn.execute(
+            update(tabla)
+            .where(*[tabla.c[columna] == fila[columna] for columna in _CLAVE])
+            .values(pagos=tabla.c.pagos + fila['pagos'], total_minor=tabla.c.total_minor + fila['total_minor'])
+        )
+        if resultado.rowcount == 0:
+            conn.execute(insert(tabla), [fila])
+
+
+# ===== Actualización en el mismo commit que completa la transacción =====
+
+@event.listens_for(db.session, 'after_flush')
+def _acumular_completadas(session, flush_context):
+    # En after_flush el historial de atributos todavía tiene el estado anterior
+    completadas = []
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Transaccion) or obj.status != 'completed':
+            continue
+        historial = inspect(obj).attrs.status.history
+        if obj in session.new or (historial.has_changes() and 'completed' not in historial.deleted):
+            completadas.append(obj)
+
+    if completadas:
+        acumular(session.connection(), completadas)
+
+
+# ===== Consultas para el dashboard =====
+
+def totales_vendedor(vendedor_id, dias=30):
+    """Totales históricos y de los últimos `dias` por moneda, leyendo solo el acumulado"""
+    # Los días del acumulado son UTC (fecha_completado se guarda en UTC)
+    desde = datetime.utcnow().date() - timedelta(days=dias)
+    filas = db.session.execute(
+        select(
+            IngresoVendedor.currency,
+            func.sum(IngresoVendedor.pagos),
+            func.sum(IngresoVendedor.total_minor),
+            func.sum(case((IngresoVendedor.dia >= desde, IngresoVendedor.pagos), else_=0)),
+            func.sum(case((IngresoVendedor.dia >= desde, IngresoVendedor.total_minor), else_=0)),
+        )
+        .where(IngresoVendedor.vendedor_id == vendedor_id)
+        .group_by(IngresoVendedor.currency)
+        .order_by(IngresoVendedor.currency)
+    ).all()
+    return [{
+        'currency': currency,
+        'pagos': pagos,
+        'total': desde_unidades_menores(total, currency),
+        'pagos_recientes': pagos_recientes,
+        'total_reciente': desde_unidades_menores(total_reciente, currency),
+    } for currency, pagos, total, pagos_recientes, total_reciente in filas]
+
+
+# ===== Recalcular desde el historial =====
+
+def recalcular_ingresos(lote=1000):
+    """Reconstruye el acumulado completo a partir de las transacciones completadas.
+
+    Corre en una sola transacción; en PostgreSQL bloquea la tabla para que los
+    pagos que se completen mientras tanto esperen y se sumen después, en lugar
+    de perderse o contarse dos veces. Devuelve cuántas transacciones sumó.
+    """
+    total = 0
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text(f'LOCK TABLE {IngresoVendedor.__tablename__} IN EXCLUSIVE MODE'))
+        conn.execute(delete(IngresoVendedor))
+
+        filas = conn.execution_options(yield_per=lote).execute(
+            select(Transaccion.sala_id, Transaccion.amount, Transaccion.currency,
+                   Transaccion.fecha_completado, Transaccion.fecha_creacion)
+            .where(Transaccion.status == 'completed')
+        )
+        for particion in filas.partitions():
+            acumular(conn, particion)
+            total += len(particion)
+    return total
+
+
+def init_revenue(app):
+    """Registra el comando `flask recalcular-ingresos`"""
+
+    @app.cli.command('recalcular-ingresos')
+    @click.option('--lote', default=1000, show_default=True, help='Transacciones leídas por consulta.')
+    def recalcular_ingresos_command(lote):
+        """Reconstruye ingresos_vendedor_diarios desde las transacciones completadas."""
+        click.echo(f'{recalcular_ingresos(lote)} transacciones completadas acumuladas')
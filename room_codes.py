@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+import threading
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Secuencia
+
+
+class FeistelPermutation:
+    """Permutación con llave sobre los números de `digits` dígitos (0 .. 10**digits - 1).
+
+    Red Feistel balanceada sobre dos mitades de `digits / 2` dígitos con suma
+    modular, así que es biyectiva en el dominio exacto: dos entradas distintas
+    nunca dan el mismo código y sin la llave la salida no se puede predecir.
+    """
+
+    def __init__(self, key, digits=8, rounds=6):
+        if digits % 2:
+            raise ValueError('digits debe ser par')
+        self.key = key if isinstance(key, bytes) else str(key).encode('utf-8')
+        self.half = 10 ** (digits // 2)
+        self.domain = self.half * self.half
+        self.rounds = rounds
+
+    def _f(self, ronda, valor):
+        digest = hmac.new(self.key, f'{ronda}:{valor}'.encode('ascii'), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], 'big') % self.half
+
+    def encrypt(self, n):
+        izquierda, derecha = divmod(n, self.half)
+        for ronda in range(self.rounds):
+            izquierda, derecha = derecha, (izquierda + self._f(ronda, derecha)) % self.half
+        return izquierda * self.half + derecha
+
+    def decrypt(self, n):
+        izquierda, derecha = divmod(n, self.half)
+        for ronda in reversed(range(self.rounds)):
+            izquierda, derecha = (derecha - self._f(ronda, izquierda)) % self.half, izquierda
+        return izquierda * self.half + derecha
+
+
+class RoomCodeAllocator:
+    """Genera códigos de sala únicos de 8 dígitos sin consultar la tabla de salas.
+
+    Cada proceso reserva bloques de `block_size` valores de un contador en la
+    tabla `secuencias` (un UPDATE por bloque, en su propia transacción) y los
+    pasa por la permutación con llave. Como el contador nunca repite un valor
+    y la permutación es biyectiva, dos creadores no pueden recibir el mismo
+    código, ni siquiera en procesos distintos.
+    """
+
+    SEQUENCE_NAME = 'salas_codigo'
+
+    def __init__(self, key=None, digits=8, block_size=100, engine=None):
+        self.digits = digits
+        self.engine = engine  # None: usar el engine de `db` de la app actual
+        self.block_size = block_size
+        self.permutation = FeistelPermutation(key, digits) if key is not None else None
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        key = config.get('ROOM_CODE_KEY') or config['SECRET_KEY']
+        self.block_size = config.setdefault('ROOM_CODE_BLOCK_SIZE', self.block_size)
+        self.permutation = FeistelPermutation(key, self.digits)
+        app.extensions['room_code_allocator'] = self
+
+    def allocate(self):
+        """Siguiente código libre con el formato que valida `unirse_por_codigo`"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reservar_bloque()
+            valor = self._next
+            self._next += 1
+        return str(self.permutation.encrypt(valor)).zfill(self.digits)
+
+    def _reservar_bloque(self):
+        engine = self.engine or db.engine
+        # Conexión propia: la reserva se confirma aunque el request haga rollback
+        with engine.begin() as conn:
+            fin = conn.execute(
+                update(Secuencia)
+                .where(Secuencia.nombre == self.SEQUENCE_NAME)
+                .values(valor=Secuencia.valor + self.block_size)
+                .returning(Secuencia.valor)
+            ).scalar()
+
+        if fin is None:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(Secuencia).values(nombre=self.SEQUENCE_NAME, valor=self.block_size))
+                fin = self.block_size
+            except IntegrityError:
+                # Otro proceso creó el contador al mismo tiempo
+                return self._reservar_bloque()
+
+        if fin > self.permutation.domain:
+            raise RuntimeError('Se agotaron los códigos de sala disponibles')
+        return fin - self.block_size, fin
+
+
+room_code_allocator = RoomCodeAllocator()
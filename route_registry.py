@@ -0,0 +1,28 @@
+class RouteRegistry:
+    """Rutas y hooks declarados a nivel de módulo, aplicados a cada app de `create_app`.
+
+    Hace lo mismo que un Blueprint pero sin prefijo en los endpoints, así
+    `url_for('dashboard')` y los templates siguen funcionando sin cambios.
+    """
+
+    def __init__(self):
+        self._registros = []
+
+    def route(self, rule, **options):
+        def decorator(f):
+            endpoint = options.pop('endpoint', None) or f.__name__
+            self._registros.append(lambda app: app.add_url_rule(rule, endpoint, f, **options))
+            return f
+        return decorator
+
+    def before_request(self, f):
+        self._registros.append(lambda app: app.before_request(f))
+        return f
+
+    def context_processor(self, f):
+        self._registros.append(lambda app: app.context_processor(f))
+        return f
+
+    def init_app(self, app):
+        for registrar in self._registros:
+            registrar(app)
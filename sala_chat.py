@@ -0,0 +1,434 @@
+import atexit
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from sqlalchemy import event, exists, insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from db import db
+from models import MensajeSala, MiembroSala, Sala, Usuarios
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSaturado(Exception):
+    """Hay demasiados mensajes esperando ser escritos en la base"""
+
+
+def _evento(mensaje):
+    """Texto SSE del mensaje; se arma una vez y se reparte igual a todos los suscriptores"""
+    return f'id: {mensaje["uid"]}\nevent: mensaje\ndata: {json.dumps(mensaje)}\n\n'
+
+
+class _Mensaje:
+    __slots__ = ('seq', 'evento')
+
+    def __init__(self, seq, evento):
+        self.seq = seq
+        self.evento = evento
+
+
+class _SalaChat:
+    """Mensajes recientes de una sala en este proceso y quién los está esperando"""
+
+    __slots__ = ('id', 'mensajes', 'seq', 'suscriptores', 'cambio', 'marcas')
+
+    def __init__(self, sala_id, buffer_size, lock, ultimo_id):
+        self.id = sala_id
+        self.mensajes = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.suscriptores = 0
+        self.cambio = threading.Condition(lock)
+        # (instante, mayor id leído de la base) para releer con margen los commits tardíos
+        self.marcas = deque([(0.0, ultimo_id)])
+
+
+class SalaChatHub:
+    """Chat en tiempo real por sala sobre SSE.
+
+    Cada sala abierta en el proceso guarda sus últimos `buffer_size` mensajes
+    en memoria; un mensaje publicado se agrega ahí y despierta solo a los
+    streams de esa sala, que lo envían ya serializado. La escritura en
+    `mensajes_sala` no ocurre en el request: un hilo junta lo pendiente e
+    inserta por lotes cada `flush_interval` segundos (o antes si se juntan
+    `flush_batch`). Si la cola llega a `max_pending` se rechaza con 503. Un
+    lote que la base rechaza por una fila (IntegrityError, DataError) se
+    reintenta fila por fila y las rechazadas se descartan (`dropped`); ante
+    otros errores el lote vuelve a la cola.
+
+    Con varios workers, el mismo hilo relee cada `poll_interval` segundos los
+    mensajes nuevos de las salas con suscriptores, así llegan también los
+    publicados en otros procesos (los propios se reconocen por `uid`).
+
+    Quién puede leer y escribir (creador o miembro) se cachea `membership_ttl`
+    segundos; unirse o salir de una sala invalida la entrada en este proceso.
+
+    Cada stream ocupa un hilo de gunicorn mientras está abierto, así que el
+    proceso acepta como mucho `max_streams` a la vez (reservar_stream); el
+    resto recibe 503 y el navegador sigue por polling con `mensajes_desde`.
+    """
+
+    def __init__(self, buffer_size=100, flush_interval=0.5, flush_batch=500, max_pending=10000,
+                 poll_interval=1.0, heartbeat=15, max_stream=600, max_length=1000,
+                 membership_ttl=60, max_rooms=1000, max_streams=4):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.max_stream = max_stream
+        self.max_length = max_length
+        self.membership_ttl = membership_ttl
+        self.max_rooms = max_rooms
+        self.max_streams = max_streams
+        self.app = None
+        self._salas = OrderedDict()
+        self._pendientes = []
+        self._vistos = OrderedDict()  # uids ya repartidos en este proceso
+        self._accesos = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._thread = None
+        self._streams = 0
+        self._stats = {'published': 0, 'remote': 0, 'written': 0, 'batches': 0, 'write_errors': 0,
+                       'dropped': 0, 'rejected': 0, 'streams_rejected': 0, 'membership_hits': 0,
+                       'membership_misses': 0}
+
+    def init_app(self, app):
+        config = app.config
+        self.buffer_size = config.setdefault('CHAT_BUFFER_SIZE', self.buffer_size)
+        self.flush_interval = config.setdefault('CHAT_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_batch = config.setdefault('CHAT_FLUSH_BATCH', self.flush_batch)
+        self.max_pending = config.setdefault('CHAT_MAX_PENDING', self.max_pending)
+        self.poll_interval = config.setdefault('CHAT_POLL_INTERVAL', self.poll_interval)
+        self.heartbeat = config.setdefault('CHAT_HEARTBEAT', self.heartbeat)
+        self.max_stream = config.setdefault('CHAT_MAX_STREAM', self.max_stream)
+        self.max_length = config.setdefault('CHAT_MAX_LENGTH', self.max_length)
+        self.membership_ttl = config.setdefault('CHAT_MEMBERSHIP_TTL', self.membership_ttl)
+        self.max_rooms = config.setdefault('CHAT_MAX_ROOMS', self.max_rooms)
+        self.max_streams = config.setdefault('CHAT_MAX_STREAMS', self.max_streams)
+        self.app = app
+        app.extensions['sala_chat'] = self
+
+    # ===== Acceso =====
+
+    def sala_con_acceso(self, codigo, usuario_id):
+        """Id de la sala si el usuario es su creador o miembro; None si no existe o no tiene acceso"""
+        sala = self._cacheado(('sala', codigo), self.membership_ttl, lambda: db.session.execute(
+            select(Sala.id, Sala.creador_id).where(Sala.codigo == codigo)).first())
+        if sala is None:
+            return None
+        sala_id, creador_id = sala
+        if usuario_id == creador_id:
+            return sala_id
+
+        es_miembro = self._cacheado(('miembro', sala_id, usuario_id), self.membership_ttl, lambda: db.session.scalar(
+            select(exists().where(MiembroSala.sala_id == sala_id, MiembroSala.usuario_id == usuario_id))))
+        return sala_id if es_miembro else None
+
+    def _cacheado(self, clave, ttl, cargar):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._accesos.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._accesos.move_to_end(clave)
+                self._stats['membership_hits'] += 1
+                return entrada[1]
+            self._stats['membership_misses'] += 1
+
+        valor = cargar()
+        # Las respuestas negativas duran poco: quien se acaba de unir en otro proceso no espera el TTL
+        with self._lock:
+            self._accesos[clave] = (ahora + (ttl if valor else min(ttl, 5)), valor)
+            self._accesos.move_to_end(clave)
+            while len(self._accesos) > self.max_rooms * 50:
+                self._accesos.popitem(last=False)
+        return valor
+
+    def olvidar_miembro(self, sala_id, usuario_id):
+        with self._lock:
+            self._accesos.pop(('miembro', sala_id, usuario_id), None)
+
+    # ===== Salas abiertas =====
+
+    def abrir(self, sala_id):
+        """Sala en memoria, cargando de la base sus últimos mensajes si no estaba abierta"""
+        with self._lock:
+            sala = self._salas.get(sala_id)
+            if sala is not None:
+                self._salas.move_to_end(sala_id)
+                return sala
+
+        filas = db.session.execute(
+            select(MensajeSala.id, MensajeSala.uid, MensajeSala.usuario_id, MensajeSala.texto,
+                   MensajeSala.fecha_envio, Usuarios.name, Usuarios.lastanme)
+            .join(Usuarios, Usuarios.id == MensajeSala.usuario_id)
+            .where(MensajeSala.sala_id == sala_id)
+            .order_by(MensajeSala.id.desc())
+            .limit(self.buffer_size)
+        ).all()
+
+        with self._lock:
+            sala = self._salas.get(sala_id)
+            if sala is not None:
+                return sala
+            sala = self._salas[sala_id] = _SalaChat(sala_id, self.buffer_size, self._lock,
+                                                    filas[0].id if filas else 0)
+            for fila in reversed(filas):
+                self._agregar(sala, self._desde_fila(fila))
+            self._cerrar_sobrantes()
+            return sala
+
+    def _cerrar_sobrantes(self):
+        # Llamar con self._lock tomado; nunca se cierra una sala con streams abiertos
+        for sala_id in list(self._salas):
+            if len(self._salas) <= self.max_rooms:
+                return
+            if self._salas[sala_id].suscriptores == 0:
+                del self._salas[sala_id]
+
+    def _agregar(self, sala, mensaje):
+        # Llamar con self._lock tomado
+        self._vistos[mensaje['uid']] = None
+        while len(self._vistos) > max(self.max_pending, 50000):
+            self._vistos.popitem(last=False)
+        sala.seq += 1
+        sala.mensajes.append(_Mensaje(sala.seq, _evento(mensaje)))
+        sala.cambio.notify_all()
+
+    @staticmethod
+    def _desde_fila(fila):
+        return {'uid': fila.uid, 'usuario_id': fila.usuario_id, 'autor': f'{fila.name} {fila.lastanme}',
+                'texto': fila.texto, 'fecha': fila.fecha_envio.isoformat()}
+
+    # ===== Publicación =====
+
+    def publicar(self, sala_id, usuario, texto):
+        """Reparte el mensaje a los streams del proceso y lo deja en cola para la base"""
+        sala = self.abrir(sala_id)
+        ahora = datetime.utcnow()
+        mensaje = {'uid': uuid.uuid4().hex, 'usuario_id': usuario.id, 'autor': f'{usuario.name} {usuario.lastanme}',
+                   'texto': texto, 'fecha': ahora.isoformat()}
+
+        with self._lock:
+            if len(self._pendientes) >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise ChatSaturado()
+            self._pendientes.append({'uid': mensaje['uid'], 'sala_id': sala_id, 'usuario_id': usuario.id,
+                                     'texto': texto, 'fecha_envio': ahora})
+            self._salas.setdefault(sala_id, sala)
+            self._agregar(sala, mensaje)
+            self._stats['published'] += 1
+            lleno = len(self._pendientes) >= self.flush_batch
+
+        self._asegurar_hilo()
+        if lleno:
+            self._despertar.set()
+        return mensaje
+
+    # ===== Suscripción =====
+
+    def reservar_stream(self):
+        """Toma un lugar para un stream; False si ya hay `max_streams` abiertos en el proceso.
+
+        Quien lo toma lo devuelve con `liberar_stream` al cerrar la respuesta,
+        aunque el generador nunca haya empezado.
+        """
+        with self._lock:
+            if self._streams >= self.max_streams:
+                self._stats['streams_rejected'] += 1
+                return False
+            self._streams += 1
+            return True
+
+    def liberar_stream(self):
+        with self._lock:
+            self._streams -= 1
+
+    def mensajes_desde(self, sala_id, desde_id=0):
+        """Mensajes guardados con id mayor que `desde_id` (los últimos `buffer_size`), para el polling"""
+        filas = db.session.execute(
+            select(MensajeSala.id, MensajeSala.uid, MensajeSala.usuario_id, MensajeSala.texto,
+                   MensajeSala.fecha_envio, Usuarios.name, Usuarios.lastanme)
+            .join(Usuarios, Usuarios.id == MensajeSala.usuario_id)
+            .where(MensajeSala.sala_id == sala_id, MensajeSala.id > desde_id)
+            .order_by(MensajeSala.id.desc())
+            .limit(self.buffer_size)
+        ).all()
+        return [dict(self._desde_fila(fila), id=fila.id) for fila in reversed(filas)]
+
+    def stream(self, sala):
+        """Generador SSE: los mensajes en memoria de la sala y luego cada mensaje nuevo.
+
+        El cliente descarta los repetidos por `id` (uid) al reconectar. Entre
+        mensajes manda un comentario cada `heartbeat` segundos y cierra tras
+        `max_stream` segundos; EventSource vuelve a conectar solo.
+        """
+        with self._lock:
+            sala = self._salas.setdefault(sala.id, sala)
+            sala.suscriptores += 1
+            historial = [mensaje.evento for mensaje in sala.mensajes]
+            visto = sala.seq
+        self._asegurar_hilo()
+
+        try:
+            yield 'retry: 3000\n\n' + ''.join(historial)
+            limite = time.monotonic() + self.max_stream
+            while time.monotonic() < limite:
+                with self._lock:
+                    if sala.seq == visto:
+                        sala.cambio.wait(self.heartbeat)
+                    nuevos = []
+                    for mensaje in reversed(sala.mensajes):
+                        if mensaje.seq <= visto:
+                            break
+                        nuevos.append(mensaje.evento)
+                    visto = sala.seq
+
+                if not nuevos:
+                    yield ': ping\n\n'
+                    continue
+                yield ''.join(reversed(nuevos))
+        finally:
+            with self._lock:
+                sala.suscriptores -= 1
+
+    # ===== Hilo de escritura y lectura =====
+
+    def _asegurar_hilo(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sala-chat', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        ultima_lectura = 0.0
+        while True:
+            self._despertar.wait(self.flush_interval)
+            self._despertar.clear()
+            try:
+                with self.app.app_context():
+                    self._escribir_pendientes()
+                    if self.poll_interval and time.monotonic() - ultima_lectura >= self.poll_interval:
+                        ultima_lectura = time.monotonic()
+                        self._leer_remotos()
+            except Exception:
+                logger.exception('Error en el hilo del chat de salas')
+
+    def flush(self):
+        """Escribe ya los mensajes pendientes (al apagar el proceso, por ejemplo)"""
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self._escribir_pendientes()
+
+    def _escribir_pendientes(self):
+        with self._lock:
+            filas, self._pendientes = self._pendientes, []
+
+        for inicio in range(0, len(filas), self.flush_batch):
+            lote = filas[inicio:inicio + self.flush_batch]
+            try:
+                try:
+                    db.session.execute(insert(MensajeSala), lote)
+                    db.session.commit()
+                    escritas, descartadas = len(lote), 0
+                except (IntegrityError, DataError):
+                    # Una fila mala (sala o usuario borrados) no debe frenar al resto: fila por fila
+                    db.session.rollback()
+                    escritas, descartadas = self._escribir_por_fila(lote)
+            except Exception:
+                db.session.rollback()
+                logger.exception('No se pudieron guardar %s mensajes de chat; se reintenta', len(lote))
+                with self._lock:
+                    self._stats['write_errors'] += 1
+                    # Devolver a la cola lo que falta, delante de lo que llegó mientras tanto.
+                    # Si falló a mitad del fila por fila, las ya escritas chocan por uid y se descartan
+                    self._pendientes[:0] = filas[inicio:]
+                return
+            with self._lock:
+                self._stats['written'] += escritas
+                self._stats['dropped'] += descartadas
+                self._stats['batches'] += 1
+
+    def _escribir_por_fila(self, lote):
+        """Inserta una fila por commit; descarta (y cuenta) las que la base rechaza"""
+        escritas = descartadas = 0
+        for fila in lote:
+            try:
+                db.session.execute(insert(MensajeSala), [fila])
+                db.session.commit()
+                escritas += 1
+            except (IntegrityError, DataError):
+                db.session.rollback()
+                logger.warning('Mensaje de chat %s descartado: la base lo rechaza (sala %s, usuario %s)',
+                               fila['uid'], fila['sala_id'], fila['usuario_id'], exc_info=True)
+                descartadas += 1
+        return escritas, descartadas
+
+    def _leer_remotos(self):
+        """Mensajes de otros procesos para las salas con suscriptores en este"""
+        ahora = time.monotonic()
+        # Margen para commits que terminan en otro orden que sus ids
+        limite = ahora - max(5.0, self.flush_interval * 4)
+        with self._lock:
+            pisos = {}
+            for sala_id, sala in self._salas.items():
+                if sala.suscriptores:
+                    while len(sala.marcas) > 1 and sala.marcas[1][0] <= limite:
+                        sala.marcas.popleft()
+                    pisos[sala_id] = sala.marcas[0][1]
+        if not pisos:
+            return
+
+        filas = db.session.execute(
+            select(MensajeSala.id, MensajeSala.uid, MensajeSala.sala_id, MensajeSala.usuario_id, MensajeSala.texto,
+                   MensajeSala.fecha_envio, Usuarios.name, Usuarios.lastanme)
+            .join(Usuarios, Usuarios.id == MensajeSala.usuario_id)
+            .where(MensajeSala.sala_id.in_(pisos), MensajeSala.id > min(pisos.values()))
+            .order_by(MensajeSala.id)
+        ).all()
+        db.session.commit()
+
+        maximos = {}
+        with self._lock:
+            for fila in filas:
+                maximos[fila.sala_id] = fila.id
+                sala = self._salas.get(fila.sala_id)
+                if sala is None or fila.uid in self._vistos:
+                    continue
+                self._agregar(sala, self._desde_fila(fila))
+                self._stats['remote'] += 1
+            for sala_id, maximo in maximos.items():
+                sala = self._salas.get(sala_id)
+                if sala is not None and maximo > sala.marcas[-1][1]:
+                    sala.marcas.append((ahora, maximo))
+
+    # ===== Métricas =====
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update(rooms=len(self._salas), pending=len(self._pendientes), streams=self._streams,
+                        connections=sum(sala.suscriptores for sala in self._salas.values()))
+            return data
+
+
+chat_hub = SalaChatHub()
+
+
+# ===== Invalidación de membresías =====
+
+@event.listens_for(MiembroSala, 'after_insert')
+@event.listens_for(MiembroSala, 'after_delete')
+def _olvidar_membresia(mapper, connection, target):
+    chat_hub.olvidar_miembro(target.sala_id, target.usuario_id)
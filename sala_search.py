@@ -0,0 +1,134 @@
+import re
+
+from sqlalchemy import DDL, Double, and_, case, cast, column, event, func, literal_column, or_, select, table
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from db import db
+from models import Sala
+from pagination import decode_score_cursor, encode_score_cursor, keyset_page
+
+CONDICIONES = ('Nuevo', 'Usado')
+
+# Columna generada en PostgreSQL; no está en el modelo porque SQLite no tiene el tipo
+_busqueda = literal_column('salas.busqueda', type_=TSVECTOR)
+
+_salas_fts = table('salas_fts', column('rowid'))
+
+
+# ===== Índices de búsqueda =====
+# Las mismas sentencias que la migración 7b3f5c2e9a14, para las bases creadas
+# con db.create_all() (pruebas y desarrollo local)
+
+DDL_POSTGRESQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "ALTER TABLE salas ADD COLUMN busqueda tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('spanish', coalesce(nombre_producto, '')), 'A') || "
+    "setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')) STORED",
+    'CREATE INDEX ix_salas_busqueda ON salas USING gin (busqueda)',
+    'CREATE INDEX ix_salas_nombre_trgm ON salas USING gin (nombre_producto gin_trgm_ops)',
+)
+
+DDL_SQLITE = (
+    "CREATE VIRTUAL TABLE salas_fts USING fts5(nombre_producto, descripcion, content='salas', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER salas_fts_ai AFTER INSERT ON salas BEGIN '
+    'INSERT INTO salas_fts(rowid, nombre_producto, descripcion) '
+    'VALUES (new.id, new.nombre_producto, new.descripcion); END',
+    'CREATE TRIGGER salas_fts_ad AFTER DELETE ON salas BEGIN '
+    "INSERT INTO salas_fts(salas_fts, rowid, nombre_producto, descripcion) "
+    "VALUES ('delete', old.id, old.nombre_producto, old.descripcion); END",
+    'CREATE TRIGGER salas_fts_au AFTER UPDATE OF nombre_producto, descripcion ON salas BEGIN '
+    "INSERT INTO salas_fts(salas_fts, rowid, nombre_producto, descripcion) "
+    "VALUES ('delete', old.id, old.nombre_producto, old.descripcion); "
+    'INSERT INTO salas_fts(rowid, nombre_producto, descripcion) '
+    'VALUES (new.id, new.nombre_producto, new.descripcion); END',
+)
+
+for _sentencia in DDL_POSTGRESQL:
+    event.listen(Sala.__table__, 'after_create', DDL(_sentencia).execute_if(dialect='postgresql'))
+for _sentencia in DDL_SQLITE:
+    event.listen(Sala.__table__, 'after_create', DDL(_sentencia).execute_if(dialect='sqlite'))
+
+
+# ===== Consulta =====
+
+def consulta_fts5(texto):
+    """Convierte el texto del usuario en una consulta FTS5: todas las palabras, por prefijo.
+
+    Cada palabra va entre comillas para que los operadores de FTS5 (AND, NEAR,
+    -, ^...) que escriba el usuario se busquen como texto y no den error.
+    """
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def _coincidencia_y_puntaje(texto, dialecto):
+    """(condición, puntaje, join) para buscar `texto` según el motor"""
+    if dialecto == 'postgresql':
+        tsquery = func.websearch_to_tsquery('spanish', texto)
+        # El trigrama atrapa palabras a medio escribir ("bici") que el stemming no une;
+        # double precision para que el puntaje del cursor se compare sin redondeos
+        puntaje = cast(func.ts_rank_cd(_busqueda, tsquery) + func.similarity(Sala.nombre_producto, texto), Double)
+        coincide = or_(_busqueda.op('@@')(tsquery), Sala.nombre_producto.icontains(texto, autoescape=True))
+        return coincide, puntaje, None
+
+    if dialecto == 'sqlite':
+        consulta = consulta_fts5(texto)
+        if not consulta:
+            return None, None, None
+        fts = literal_column('salas_fts')
+        # bm25 es menor cuanto más relevante; el nombre pesa 10 veces la descripción
+        puntaje = -func.bm25(fts, 10.0, 1.0)
+        return fts.op('MATCH')(consulta), puntaje, _salas_fts
+
+    # Otros motores: LIKE sin índice, primero las que coinciden en el nombre
+    en_nombre = Sala.nombre_producto.icontains(texto, autoescape=True)
+    coincide = or_(en_nombre, Sala.descripcion.icontains(texto, autoescape=True))
+    return coincide, cast(case((en_nombre, 1.0), else_=0.0), Double), None
+
+
+def buscar_salas(texto=None, condicion=None, precio_min=None, precio_max=None, activa=True,
+                 cursor=None, limit=20):
+    """Busca salas por nombre y descripción con filtros. Devuelve (salas, siguiente_cursor).
+
+    Sin texto es un listado de las más recientes paginado por (fecha, id)
+    sobre ix_salas_activa_fecha. Con texto usa el índice de texto completo del
+    motor (tsvector + trigrama en PostgreSQL, FTS5 en SQLite), ordena por
+    relevancia y pagina por cursor sobre (puntaje, id): cada página filtra
+    por la posición de la anterior en lugar de usar OFFSET. `activa=None` no
+    filtra por estado.
+    """
+    filtros = []
+    if condicion:
+        filtros.append(Sala.condicion == condicion)
+    if precio_min is not None:
+        filtros.append(Sala.precio >= precio_min)
+    if precio_max is not None:
+        filtros.append(Sala.precio <= precio_max)
+    if activa is not None:
+        filtros.append(Sala.activa == activa)
+
+    texto = (texto or '').strip()
+    coincide, puntaje, join = _coincidencia_y_puntaje(texto, db.engine.dialect.name) if texto else (None, None, None)
+    if coincide is None:
+        return keyset_page(Sala.query.filter(*filtros), Sala.fecha_creacion, Sala.id, cursor, limit)
+
+    puntaje = puntaje.label('puntaje')
+    stmt = select(Sala, puntaje)
+    if join is not None:
+        stmt = stmt.join(join, join.c.rowid == Sala.id)
+    stmt = stmt.where(coincide, *filtros)
+
+    posicion = decode_score_cursor(cursor)
+    if posicion is not None:
+        ultimo_puntaje, ultimo_id = posicion
+        stmt = stmt.where(or_(puntaje.element < ultimo_puntaje,
+                              and_(puntaje.element == ultimo_puntaje, Sala.id < ultimo_id)))
+
+    # Uno de más para saber si hay otra página sin hacer COUNT
+    filas = db.session.execute(stmt.order_by(puntaje.desc(), Sala.id.desc()).limit(limit + 1)).all()
+    if len(filas) <= limit:
+        return [fila.Sala for fila in filas], None
+
+    filas = filas[:limit]
+    return [fila.Sala for fila in filas], encode_score_cursor(filas[-1].puntaje, filas[-1].Sala.id)
@@ -0,0 +1,117 @@
+import logging
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+
+class RequestSQLStats:
+    """Consultas ejecutadas durante un request"""
+
+    __slots__ = ('count', 'total', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0  # segundos
+        self.statements = Counter()
+
+    def n_plus_one(self, threshold):
+        """Sentencias idénticas repetidas `threshold` veces o más (candidatas a N+1)"""
+        return [(statement, veces) for statement, veces in self.statements.items() if veces >= threshold]
+
+
+def request_sql_stats():
+    """Estadísticas SQL del request actual o None si no hay request o está desactivado"""
+    if not has_request_context():
+        return None
+    return g.get('sql_stats')
+
+
+class SQLInstrumentation:
+    """Cuenta sentencias y tiempo de base de datos por request.
+
+    Se engancha a los eventos del engine de `db`. Por request agrega el total
+    de consultas y tiempo en el header `Server-Timing`, manda al log las
+    sentencias lentas con la ruta que las ejecutó y avisa de sentencias
+    idénticas repetidas (posible N+1). Solo suma un par de contadores por
+    sentencia, así que se puede dejar activo en producción.
+    """
+
+    def __init__(self, slow_query_ms=100, n_plus_one_threshold=5):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.enabled = True
+        self._engines = set()
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('SQL_INSTRUMENTATION', self.enabled)
+        self.slow_query_ms = config.setdefault('SQL_SLOW_QUERY_MS', self.slow_query_ms)
+        self.n_plus_one_threshold = config.setdefault('SQL_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        app.extensions['sql_instrumentation'] = self
+
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+
+        app.before_request(self._iniciar_request)
+        app.after_request(self._terminar_request)
+
+    def instrument_engine(self, engine):
+        if engine in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._antes_de_ejecutar)
+        event.listen(engine, 'after_cursor_execute', self._despues_de_ejecutar)
+        self._engines.add(engine)
+
+    # ===== Eventos del engine =====
+
+    def _antes_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        # El inicio vive en el contexto de ejecución: si la sentencia falla no
+        # hay after_cursor_execute, y el contexto se descarta sin dejar restos
+        # en la conexión (que vuelve al pool).
+        if context is not None:
+            context._sql_inicio = time.perf_counter()
+
+    def _despues_de_ejecutar(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = getattr(context, '_sql_inicio', None)
+        if inicio is None:
+            return
+        duracion = time.perf_counter() - inicio
+
+        stats = request_sql_stats()
+        if stats is not None:
+            stats.count += 1
+            stats.total += duracion
+            stats.statements[statement] += 1
+
+        if duracion * 1000 >= self.slow_query_ms:
+            ruta = request.endpoint if has_request_context() else None
+            logger.warning('Consulta lenta (%.1f ms) en %s: %s', duracion * 1000, ruta or '-', statement[:500])
+
+    # ===== Hooks del request =====
+
+    def _iniciar_request(self):
+        g.sql_stats = RequestSQLStats()
+
+    def _terminar_request(self, response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+
+        response.headers.add('Server-Timing', f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries"')
+
+        for statement, veces in stats.n_plus_one(self.n_plus_one_threshold):
+            logger.warning('Posible N+1 en %s: %s veces %s', request.endpoint, veces, statement[:300])
+        return response
+
+
+sql_instrumentation = SQLInstrumentation()
@@ -33,8 +33,17 @@ fi
 cd ../..
 
 echo ""
-echo "🐍 Iniciando Flask (Puerto 5000)..."
-python app.py &
+# MODO=produccion ./start-services.sh usa gunicorn con varios workers (ver gunicorn.conf.py);
+# requiere DATABASE_URL y SECRET_KEY en el entorno
+if [ "$MODO" = "produccion" ]; then
+    echo "🎨 Generando assets estáticos con huella..."
+    flask --app "app:create_app('production')" assets build
+    echo "🐍 Iniciando Flask con gunicorn (Puerto 5000)..."
+    gunicorn -c gunicorn.conf.py &
+else
+    echo "🐍 Iniciando Flask (Puerto 5000)..."
+    python app.py &
+fi
 FLASK_PID=$!
 
 sleep 3
@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete `brotli` solo se generan variantes .gz
+    brotli = None
+
+# Extensión de cada variante precomprimida, en orden de preferencia
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+UN_ANIO = 365 * 24 * 3600
+
+
+def _huella(contenido):
+    return hashlib.sha256(contenido).hexdigest()[:12]
+
+
+def _nombre_con_huella(ruta, huella):
+    base, extension = os.path.splitext(ruta)
+    return f'{base}.{huella}{extension}'
+
+
+def _escribir(ruta, contenido):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def construir_assets(static_folder, salida='dist', extensiones=('.css', '.js'), excluir=('admin',), limpiar=False):
+    """Escribe en `static/<salida>` copias con huella de contenido y sus variantes comprimidas.
+
+    Cada archivo `css/base.css` queda como `dist/css/base.<sha256[:12]>.css`
+    más `.gz` (y `.br` si está instalado `brotli`). El manifiesto
+    `dist/manifest.json` mapea el nombre original al publicado y lista las
+    variantes disponibles. Los archivos de builds anteriores se conservan para
+    las páginas que todavía los referencian, salvo con `limpiar=True`.
+    """
+    destino = os.path.join(static_folder, salida)
+    excluir = set(excluir) | {salida}
+    manifiesto = {}
+
+    for carpeta, subcarpetas, archivos in os.walk(static_folder):
+        relativa = os.path.relpath(carpeta, static_folder)
+        if relativa == '.':
+            subcarpetas[:] = [s for s in subcarpetas if s not in excluir]
+        for archivo in sorted(archivos):
+            if not archivo.endswith(tuple(extensiones)):
+                continue
+            origen = os.path.normpath(os.path.join(relativa, archivo)).replace(os.sep, '/')
+            with open(os.path.join(static_folder, origen), 'rb') as f:
+                contenido = f.read()
+
+            publicado = _nombre_con_huella(origen, _huella(contenido))
+            ruta = os.path.join(destino, publicado)
+            _escribir(ruta, contenido)
+
+            variantes = {'gzip': gzip.compress(contenido, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variantes['br'] = brotli.compress(contenido, quality=11)
+            encodings = []
+            for encoding, sufijo in ENCODINGS:
+                # Una variante que no ahorra bytes no vale la pena servirla
+                if encoding in variantes and len(variantes[encoding]) < len(contenido):
+                    _escribir(ruta + sufijo, variantes[encoding])
+                    encodings.append(encoding)
+
+            manifiesto[origen] = {'path': f'{salida}/{publicado}', 'size': len(contenido), 'encodings': encodings}
+
+    if limpiar and os.path.isdir(destino):
+        vigentes = {os.path.normpath(os.path.join(static_folder, datos['path'] + sufijo))
+                    for datos in manifiesto.values() for sufijo in ('',) + tuple(s for _, s in ENCODINGS)}
+        for carpeta, _, archivos in os.walk(destino):
+            for archivo in archivos:
+                ruta = os.path.normpath(os.path.join(carpeta, archivo))
+                if archivo != 'manifest.json' and ruta not in vigentes:
+                    os.remove(ruta)
+
+    _escribir(os.path.join(destino, 'manifest.json'),
+              json.dumps(manifiesto, indent=2, sort_keys=True).encode('utf-8'))
+    return manifiesto
+
+
+class StaticAssets:
+    """Sirve los assets estáticos con huella de contenido y caché de larga duración.
+
+    Con un manifiesto generado por `flask assets build`, `url_for('static',
+    filename='css/base.css')` devuelve la copia con huella y la ruta static la
+    sirve con `Cache-Control: immutable` de un año y la variante precomprimida
+    que acepte el navegador (br, luego gzip). Sin manifiesto, o para archivos
+    que no están en él, todo funciona como el handler static de Flask.
+    """
+
+    def __init__(self, salida='dist', max_age=UN_ANIO):
+        self.salida = salida
+        self.max_age = max_age
+        self.manifiesto = {}
+        self._publicados = {}
+        self.static_folder = None
+
+    def init_app(self, app):
+        config = app.config
+        self.salida = config.setdefault('STATIC_ASSETS_DIR', self.salida)
+        self.max_age = config.setdefault('STATIC_ASSETS_MAX_AGE', self.max_age)
+        self.static_folder = app.static_folder
+        self.cargar_manifiesto()
+
+        app.url_defaults(self._url_con_huella)
+        app.view_functions['static'] = self.servir
+        app.extensions['static_assets'] = self
+        self._registrar_comando(app)
+
+    def cargar_manifiesto(self):
+        ruta = os.path.join(self.static_folder, self.salida, 'manifest.json')
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                self.manifiesto = json.load(f)
+        except FileNotFoundError:
+            self.manifiesto = {}
+        self._publicados = {datos['path']: datos for datos in self.manifiesto.values()}
+
+    def _url_con_huella(self, endpoint, values):
+        if endpoint != 'static':
+            return
+        datos = self.manifiesto.get(values.get('filename'))
+        if datos is not None:
+            values['filename'] = datos['path']
+
+    def servir(self, filename):
+        datos = self._publicados.get(filename)
+        if datos is None:
+            return send_from_directory(self.static_folder, filename)
+
+        # Sin Content-Encoding ni Vary el navegador recibe el archivo tal cual
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, sufijo in ENCODINGS:
+            if encoding in datos['encodings'] and request.accept_encodings[encoding]:
+                response = send_from_directory(self.static_folder, filename + sufijo, mimetype=mimetype,
+                                               max_age=self.max_age)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.static_folder, filename, mimetype=mimetype, max_age=self.max_age)
+
+        if datos['encodings']:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def _registrar_comando(self, app):
+        assets = app.cli.commands.get('assets') or click.Group('assets', help='Assets estáticos.')
+
+        @assets.command('build')
+        @click.option('--limpiar', is_flag=True, help='Borra los archivos de builds anteriores.')
+        def build_command(limpiar):
+            """Genera las copias con huella y el manifiesto en static/dist."""
+            manifiesto = construir_assets(self.static_folder, self.salida, limpiar=limpiar)
+            self.cargar_manifiesto()
+            for origen, datos in sorted(manifiesto.items()):
+                variantes = ', '.join(datos['encodings']) or 'sin variantes'
+                click.echo(f'{origen} -> {datos["path"]} ({variantes})')
+            if brotli is None:
+                click.echo('brotli no está instalado: solo se generaron variantes gzip')
+
+        app.cli.add_command(assets)
+
+
+static_assets = StaticAssets()
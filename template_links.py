@@ -0,0 +1,41 @@
+import re
+from jinja2.ext import Extension
+
+# Mapeo de archivos HTML hardcodeados a endpoints de Flask
+HTML_LINK_ENDPOINTS = {
+    'index.html': 'dashboard',
+    'crear-sala.html': 'crear_sala',
+    'compartir-sala.html': 'compartir_sala',
+    'signup.html': 'signup',
+    'login.html': 'login',
+    'principal.html': 'inicio',
+}
+
+# Un solo patrón para todos los links: href="archivo.html" o href='archivo.html'
+_HREF_PATTERN = re.compile(
+    r'href=(["\'])(' + '|'.join(re.escape(archivo) for archivo in HTML_LINK_ENDPOINTS) + r')\1'
+)
+
+
+def _reemplazar_href(match):
+    comilla, archivo = match.group(1), match.group(2)
+    endpoint = HTML_LINK_ENDPOINTS[archivo]
+    # Usar la comilla contraria dentro de la expresión Jinja para no romper el atributo
+    interna = "'" if comilla == '"' else '"'
+    return f'href={comilla}{{{{ url_for({interna}{endpoint}{interna}) }}}}{comilla}'
+
+
+def rewrite_html_links(source):
+    """Reemplaza los links .html del código fuente por llamadas a url_for"""
+    return _HREF_PATTERN.sub(_reemplazar_href, source)
+
+
+class HtmlLinksExtension(Extension):
+    """Extensión de Jinja que reescribe los links .html al compilar el template.
+
+    Jinja guarda en caché el template compilado, así que la reescritura se hace
+    una sola vez por template y no en cada respuesta.
+    """
+
+    def preprocess(self, source, name, filename=None):
+        return rewrite_html_links(source)
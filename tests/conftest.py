@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['APP_ENV'] = 'testing'
+
+from app import create_app
+from db import db
+from identity import user_cache
+from idempotency import idempotency_cache
+from models import Sala, Usuarios
+from rate_limit import rate_limiter
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App con el perfil de pruebas sobre una base SQLite temporal (archivo: la comparten los hilos)"""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}'})
+    with app.app_context():
+        # Solo el primario: las réplicas no tienen tablas propias y `db` recuerda las de otras apps de prueba
+        db.create_all(bind_key=None)
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def _limpiar_extensiones():
+    # Las extensiones son globales del módulo: no arrastrar estado a la prueba siguiente
+    yield
+    user_cache.clear()
+    idempotency_cache._entries.clear()
+    rate_limiter._buckets.clear()
+
+
+@pytest.fixture
+def usuarios(app):
+    """Ids de (vendedor, comprador)"""
+    with app.app_context():
+        vendedor = Usuarios(name='Vera', lastanme='Vende', lastname2='Dora', email='vendedor@example.com',
+                            password='x')
+        comprador = Usuarios(name='Carlos', lastanme='Com', lastname2='Prador', email='comprador@example.com',
+                             password='x')
+        db.session.add_all([vendedor, comprador])
+        db.session.commit()
+        return vendedor.id, comprador.id
+
+
+@pytest.fixture
+def salas(app, usuarios):
+    """Ids de dos salas activas del vendedor, a 10 y 25 USD"""
+    vendedor_id, _ = usuarios
+    with app.app_context():
+        nuevas = [Sala(codigo=codigo, nombre_producto='Bicicleta', precio=precio, condicion='Usado',
+                       creador_id=vendedor_id)
+                  for codigo, precio in (('10000001', 10.0), ('10000002', 25.0))]
+        db.session.add_all(nuevas)
+        db.session.commit()
+        return [sala.id for sala in nuevas]
+
+
+@pytest.fixture
+def comprador(app, usuarios):
+    """Cliente de pruebas con la sesión del comprador"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = usuarios[1]
+    return client
@@ -0,0 +1,113 @@
+import shutil
+
+import pytest
+from sqlalchemy import select, text
+
+import db_routing
+from app import create_app
+from db import db
+from db_routing import db_router
+from identity import load_user_summary
+from models import Sala, Usuarios
+
+
+@pytest.fixture
+def app_replica(tmp_path):
+    """App con un primario y una "réplica" que es una copia del archivo del primario"""
+    primario, replica = tmp_path / 'primario.db', tmp_path / 'replica.db'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primario}',
+                      'SQLALCHEMY_REPLICA_URLS': [f'sqlite:///{replica}']})
+    with app.app_context():
+        db.create_all(bind_key=None)
+        vendedor = Usuarios(name='Vera', lastanme='V', lastname2='D', email='vendedor@example.com', password='x')
+        db.session.add(vendedor)
+        db.session.commit()
+        db.session.add(Sala(codigo='10000001', nombre_producto='Replicada', precio=10.0, condicion='Nuevo',
+                            creador_id=vendedor.id))
+        db.session.commit()
+        app.vendedor_id = vendedor.id
+    shutil.copy(primario, replica)
+
+    # Escrito después de la copia: solo está en el primario (la réplica va atrasada)
+    with app.app_context():
+        db.session.add(Sala(codigo='10000002', nombre_producto='Solo en primario', precio=10.0, condicion='Nuevo',
+                            creador_id=app.vendedor_id))
+        db.session.commit()
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def cliente(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = app.vendedor_id
+    return client
+
+
+def test_las_binds_de_replica_se_configuran(app_replica):
+    assert db_router.replicas == ('replica_0',)
+    assert 'replica_0' in app_replica.config['SQLALCHEMY_BINDS']
+
+
+def test_ruta_de_solo_lectura_lee_de_la_replica(app_replica):
+    pagina = cliente(app_replica).get('/mis-salas').get_data(as_text=True)
+
+    assert 'Replicada' in pagina
+    assert 'Solo en primario' not in pagina
+
+
+def test_despues_de_escribir_el_mismo_navegador_lee_del_primario(app_replica, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(db_routing.time, 'time', lambda: reloj[0])
+    escritor, otro = cliente(app_replica), cliente(app_replica)
+
+    response = escritor.post('/crear-sala', data={'nombre-producto': 'Recién creada', 'precio-producto': '5',
+                                                  'condicion-producto': 'Nuevo', 'descripcion-producto': 'd'})
+    assert response.status_code == 302
+
+    pagina = escritor.get('/mis-salas').get_data(as_text=True)
+    assert 'Recién creada' in pagina and 'Solo en primario' in pagina
+    # Otro navegador no escribió: sigue en la réplica
+    assert 'Recién creada' not in otro.get('/mis-salas').get_data(as_text=True)
+
+    reloj[0] += db_router.sticky_seconds + 1
+    assert 'Recién creada' not in escritor.get('/mis-salas').get_data(as_text=True)
+
+
+def test_fuera_de_solo_lectura_y_for_update_van_al_primario(app_replica):
+    with app_replica.test_request_context():
+        assert db_router.replica_del_request() is None
+        nombres = db.session.scalars(select(Sala.nombre_producto)).all()
+        assert 'Solo en primario' in nombres
+
+    with app_replica.test_request_context():
+        with db_router.leyendo():
+            assert db_router.replica_del_request() is not None
+            assert 'Solo en primario' not in db.session.scalars(select(Sala.nombre_producto)).all()
+            bloqueadas = db.session.scalars(select(Sala.nombre_producto).with_for_update()).all()
+            assert 'Solo en primario' in bloqueadas
+
+
+def test_despues_de_escribir_en_el_request_se_lee_del_primario(app_replica):
+    with app_replica.test_request_context():
+        with db_router.leyendo():
+            db.session.add(Sala(codigo='10000003', nombre_producto='En este request', precio=1.0,
+                                condicion='Nuevo', creador_id=app_replica.vendedor_id))
+            db.session.commit()
+            assert 'En este request' in db.session.scalars(select(Sala.nombre_producto)).all()
+
+
+def test_el_resumen_del_usuario_se_lee_del_primario(app_replica):
+    with app_replica.app_context():
+        db.session.execute(text('UPDATE usuarios SET name = :name WHERE id = :id'),
+                           {'name': 'Vera Actualizada', 'id': app_replica.vendedor_id})
+        db.session.commit()
+
+    # Se cachea para todo el proceso: no puede venir de una réplica atrasada
+    with app_replica.test_request_context():
+        with db_router.leyendo():
+            assert load_user_summary(app_replica.vendedor_id).name == 'Vera Actualizada'
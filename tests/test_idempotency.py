@@ -0,0 +1,115 @@
+import threading
+import time
+
+from flask_sqlalchemy.query import Query
+
+import app as app_module
+from db import db
+from idempotency import idempotency_cache
+from models import Transaccion
+
+
+def pagar(client, sala_id, clave=None, amount=10):
+    headers = {'Idempotency-Key': clave} if clave else {}
+    return client.post('/initiate-payment', headers=headers,
+                       json={'receiverWallet': '$wallet.example/vera', 'amount': amount, 'salaId': sala_id})
+
+
+def contar_transacciones(app):
+    with app.app_context():
+        return db.session.query(Transaccion).count()
+
+
+def test_misma_clave_repite_la_respuesta_original(app, comprador, salas):
+    primera = pagar(comprador, salas[0], 'clave-1')
+    repetida = pagar(comprador, salas[0], 'clave-1')
+
+    assert primera.status_code == repetida.status_code == 202
+    assert repetida.get_json()['transactionId'] == primera.get_json()['transactionId']
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in primera.headers
+    assert contar_transacciones(app) == 1
+
+
+def test_misma_clave_con_otro_pago_es_422(app, comprador, salas):
+    pagar(comprador, salas[0], 'clave-1')
+
+    assert pagar(comprador, salas[1], 'clave-1', amount=25).status_code == 422
+    assert contar_transacciones(app) == 1
+
+
+def test_repeticion_desde_la_base_cuando_la_cache_no_la_tiene(app, comprador, salas):
+    primera = pagar(comprador, salas[0], 'clave-1')
+    # Otro worker o la caché ya la olvidó: la respuesta sale de la fila guardada
+    idempotency_cache._entries.clear()
+    repetida = pagar(comprador, salas[0], 'clave-1')
+
+    assert repetida.status_code == 202
+    assert repetida.get_json()['transactionId'] == primera.get_json()['transactionId']
+
+    idempotency_cache._entries.clear()
+    assert pagar(comprador, salas[1], 'clave-1', amount=25).status_code == 422
+    assert contar_transacciones(app) == 1
+
+
+def test_sin_header_se_deriva_la_clave_de_la_sala(app, comprador, salas):
+    primera = pagar(comprador, salas[0])
+    segunda = pagar(comprador, salas[0])
+
+    assert segunda.get_json()['transactionId'] == primera.get_json()['transactionId']
+    assert pagar(comprador, salas[1], amount=25).get_json()['transactionId'] != primera.get_json()['transactionId']
+
+
+def test_los_errores_no_se_guardan(app, comprador, salas):
+    assert pagar(comprador, salas[0], 'clave-1', amount=3).status_code == 400
+    assert pagar(comprador, salas[0], 'clave-1').status_code == 202
+
+
+def test_duplicados_simultaneos_crean_un_solo_pago(app, usuarios, salas, monkeypatch):
+    original = app_module.crear_pago
+
+    def crear_pago_lento(*args):
+        time.sleep(0.3)
+        return original(*args)
+
+    monkeypatch.setattr(app_module, 'crear_pago', crear_pago_lento)
+    respuestas = []
+
+    def cliente():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = usuarios[1]
+        respuestas.append(pagar(client, salas[0], 'clave-1'))
+
+    hilos = [threading.Thread(target=cliente) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert [respuesta.status_code for respuesta in respuestas] == [202] * 4
+    assert len({respuesta.get_json()['transactionId'] for respuesta in respuestas}) == 1
+    assert sum(respuesta.headers.get('Idempotent-Replayed') == 'true' for respuesta in respuestas) == 3
+    assert contar_transacciones(app) == 1
+
+
+def test_conflicto_de_clave_en_el_commit_respeta_la_sala(app, comprador, salas, monkeypatch):
+    # Otro proceso insertó la misma clave entre la consulta y el commit
+    pagar(comprador, salas[0], 'clave-1')
+    idempotency_cache._entries.clear()
+    consultas = []
+    original = Query.first
+
+    def first_sin_la_primera_vez(query):
+        if not consultas:
+            consultas.append(query)
+            return None
+        return original(query)
+
+    monkeypatch.setattr(Query, 'first', first_sin_la_primera_vez)
+    assert pagar(comprador, salas[1], 'clave-1', amount=25).status_code == 422
+
+    consultas.clear()
+    idempotency_cache._entries.clear()
+    assert pagar(comprador, salas[0], 'clave-1').status_code == 202
+    assert contar_transacciones(app) == 1
@@ -0,0 +1,84 @@
+from db import db
+from models import OutboxPago, Transaccion
+
+WALLET = '$wallet.example/vera'
+
+
+def pagar_lote(client, items):
+    return client.post('/initiate-payments', json={'items': items})
+
+
+def test_lote_crea_una_transaccion_y_una_entrada_de_outbox_por_sala(app, comprador, salas):
+    response = pagar_lote(comprador, [{'salaId': salas[0], 'receiverWallet': WALLET, 'amount': 10},
+                                      {'salaId': salas[1], 'receiverWallet': WALLET}])
+    body = response.get_json()
+
+    assert response.status_code == 202
+    assert (body['aceptados'], body['rechazados']) == (2, 0)
+    assert [resultado['salaId'] for resultado in body['resultados']] == salas
+    with app.app_context():
+        transacciones = Transaccion.query.order_by(Transaccion.sala_id).all()
+        assert [(t.sala_id, t.amount, t.status) for t in transacciones] == [(salas[0], 10.0, 'initiated'),
+                                                                           (salas[1], 25.0, 'initiated')]
+        assert {e.transaction_id for e in OutboxPago.query} == {t.transaction_id for t in transacciones}
+
+
+def test_salaid_como_texto_se_acepta(app, comprador, salas):
+    response = pagar_lote(comprador, [{'salaId': str(salas[0]), 'receiverWallet': WALLET}])
+
+    assert response.status_code == 202
+    assert response.get_json()['resultados'][0]['salaId'] == salas[0]
+
+
+def test_cada_item_invalido_se_rechaza_sin_frenar_el_resto(app, comprador, salas):
+    response = pagar_lote(comprador, [
+        {'salaId': salas[0], 'receiverWallet': WALLET},
+        {'salaId': 'abc', 'receiverWallet': WALLET},
+        {'salaId': True, 'receiverWallet': WALLET},
+        {'salaId': [salas[1]], 'receiverWallet': WALLET},
+        {'salaId': salas[0], 'receiverWallet': WALLET},
+        {'salaId': 9999, 'receiverWallet': WALLET},
+        {'salaId': salas[1], 'receiverWallet': WALLET, 'amount': 1},
+        {'salaId': salas[1], 'receiverWallet': 'sin-formato'},
+        {'receiverWallet': WALLET},
+        'no es un objeto',
+    ])
+    body = response.get_json()
+
+    assert response.status_code == 202
+    assert (body['aceptados'], body['rechazados']) == (1, 9)
+    assert [(r.get('error'), r['status']) for r in body['resultados'][1:]] == [
+        ('salaId inválido', 400),
+        ('salaId inválido', 400),
+        ('salaId inválido', 400),
+        ('Sala repetida en el lote', 400),
+        ('Sala no encontrada', 404),
+        ('Monto inválido. El precio exacto es $25.00 USD', 400),
+        ('La billetera debe usar formato Payment Pointer ($domain/user)', 400),
+        ('Campos requeridos: salaId, receiverWallet', 400),
+        ('Campos requeridos: salaId, receiverWallet', 400),
+    ]
+    with app.app_context():
+        assert db.session.query(Transaccion).count() == 1
+
+
+def test_lote_sin_items_validos_es_400(app, comprador, salas):
+    response = pagar_lote(comprador, [{'salaId': 'x', 'receiverWallet': WALLET}])
+
+    assert response.status_code == 400
+    assert response.get_json()['aceptados'] == 0
+
+
+def test_no_se_paga_la_propia_sala(app, usuarios, salas):
+    vendedor = app.test_client()
+    with vendedor.session_transaction() as session:
+        session['user_id'] = usuarios[0]
+
+    response = pagar_lote(vendedor, [{'salaId': salas[0], 'receiverWallet': WALLET}])
+    assert response.get_json()['resultados'][0]['status'] == 403
+
+
+def test_limites_del_lote(app, comprador, salas):
+    assert pagar_lote(comprador, []).status_code == 400
+    demasiados = [{'salaId': salas[0], 'receiverWallet': WALLET}] * (app.config['PAYMENT_BATCH_MAX_ITEMS'] + 1)
+    assert pagar_lote(comprador, demasiados).status_code == 400
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from sqlalchemy import update
+
+from db import db
+from models import OutboxPago, Transaccion
+from outbox import outbox_dispatcher
+from payments_client import PaymentsServiceUnavailable, payments_client
+
+
+class RespuestaFalsa:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError('sin JSON')
+        return self._body
+
+
+@pytest.fixture
+def pago(app, comprador, salas):
+    """transaction_id de un pago recién creado, con su entrada de outbox sin enviar"""
+    response = comprador.post('/initiate-payment', json={'receiverWallet': '$wallet.example/vera', 'amount': 10,
+                                                         'salaId': salas[0]})
+    assert response.status_code == 202
+    return response.get_json()['transactionId']
+
+
+def servicio(monkeypatch, respuesta):
+    """Reemplaza la llamada al servicio de pagos; `respuesta` es una respuesta o una excepción"""
+    llamadas = []
+
+    def initiate_payment(payment_data):
+        llamadas.append(payment_data)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return respuesta
+
+    monkeypatch.setattr(payments_client, 'initiate_payment', initiate_payment)
+    return llamadas
+
+
+def adelantar_reintentos():
+    db.session.execute(update(OutboxPago).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def estado(transaction_id):
+    db.session.expire_all()
+    entrada = OutboxPago.query.filter_by(transaction_id=transaction_id).one()
+    return entrada, Transaccion.query.filter_by(transaction_id=transaction_id).one()
+
+
+def test_envio_exitoso_pasa_la_transaccion_a_pending(app, monkeypatch, pago):
+    llamadas = servicio(monkeypatch, RespuestaFalsa(200, {'success': True, 'interactionUrl': 'https://auth/x'}))
+    with app.app_context():
+        assert outbox_dispatcher.drain_once() == 1
+        entrada, transaccion = estado(pago)
+
+    assert [llamada['transactionId'] for llamada in llamadas] == [pago]
+    assert (entrada.status, entrada.attempts) == ('sent', 1)
+    assert (transaccion.status, transaccion.interaction_url) == ('pending', 'https://auth/x')
+
+
+def test_5xx_se_reintenta_con_backoff_y_al_agotar_intentos_queda_dead(app, monkeypatch, pago):
+    monkeypatch.setattr(outbox_dispatcher, 'max_attempts', 3)
+    llamadas = servicio(monkeypatch, RespuestaFalsa(503, {'error': 'caído'}))
+    with app.app_context():
+        outbox_dispatcher.drain_once()
+        entrada, transaccion = estado(pago)
+        assert (entrada.status, entrada.attempts, entrada.last_error) == ('pending', 1, 'caído')
+        assert entrada.next_attempt_at > datetime.utcnow()
+        assert transaccion.status == 'initiated'
+
+        # Con el backoff pendiente no se vuelve a llamar
+        assert outbox_dispatcher.drain_once() == 0
+
+        for _ in range(2):
+            adelantar_reintentos()
+            outbox_dispatcher.drain_once()
+        entrada, transaccion = estado(pago)
+
+    assert len(llamadas) == 3
+    assert (entrada.status, entrada.attempts) == ('dead', 3)
+    assert (transaccion.status, transaccion.error_message) == ('failed', 'caído')
+
+
+def test_4xx_va_directo_a_dead(app, monkeypatch, pago):
+    servicio(monkeypatch, RespuestaFalsa(400, {'error': 'Wallet inválida'}))
+    with app.app_context():
+        outbox_dispatcher.drain_once()
+        entrada, transaccion = estado(pago)
+
+    assert (entrada.status, entrada.attempts) == ('dead', 1)
+    assert transaccion.status == 'failed'
+
+
+def test_error_de_conexion_se_reintenta(app, monkeypatch, pago):
+    servicio(monkeypatch, requests.ConnectionError('connection refused'))
+    with app.app_context():
+        outbox_dispatcher.drain_once()
+        entrada, transaccion = estado(pago)
+
+    assert (entrada.status, entrada.attempts) == ('pending', 1)
+    assert entrada.last_error.startswith('Error de conexión')
+    assert transaccion.status == 'initiated'
+
+
+def test_circuito_abierto_pospone_sin_gastar_intentos(app, monkeypatch, pago):
+    monkeypatch.setattr(outbox_dispatcher, 'max_attempts', 1)
+    servicio(monkeypatch, PaymentsServiceUnavailable('Circuito abierto'))
+    with app.app_context():
+        for _ in range(3):
+            adelantar_reintentos()
+            outbox_dispatcher.drain_once()
+        entrada, transaccion = estado(pago)
+
+    assert (entrada.status, entrada.attempts) == ('pending', 0)
+    assert entrada.next_attempt_at > datetime.utcnow()
+    assert transaccion.status == 'initiated'
+
+
+def test_entrada_de_un_proceso_muerto_se_vuelve_a_reclamar(app, monkeypatch, pago):
+    servicio(monkeypatch, RespuestaFalsa(200, {'success': True}))
+    with app.app_context():
+        vencida = datetime.utcnow() - timedelta(seconds=outbox_dispatcher.visibility_timeout + 1)
+        db.session.execute(update(OutboxPago).values(status='processing', locked_at=vencida, attempts=1))
+        db.session.commit()
+        assert outbox_dispatcher.drain_once() == 1
+        entrada, _ = estado(pago)
+
+    assert (entrada.status, entrada.attempts) == ('sent', 2)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import db
+from models import Transaccion
+from pagination import decode_cursor, decode_score_cursor, encode_cursor, encode_score_cursor, parse_limit
+
+
+def test_cursores_ida_y_vuelta():
+    fecha = datetime(2026, 3, 1, 12, 30, 15, 250)
+    assert decode_cursor(encode_cursor(fecha, 42)) == (fecha, 42)
+    assert decode_score_cursor(encode_score_cursor(0.1 + 0.2, 7)) == (0.1 + 0.2, 7)
+
+
+@pytest.mark.parametrize('cursor', [None, '', 'no-es-base64!', encode_score_cursor(1.5, 3)[:-2], 'Zm9v'])
+def test_cursor_invalido_es_none(cursor):
+    assert decode_cursor(cursor) is None
+
+
+def test_parse_limit():
+    assert parse_limit(None) == 20
+    assert parse_limit('abc', default=12) == 12
+    assert parse_limit('0') == 1
+    assert parse_limit('500') == 100
+
+
+def recorrer(client, url, clave):
+    """Todas las páginas siguiendo next_cursor; devuelve la lista de páginas"""
+    paginas, cursor = [], None
+    while True:
+        body = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        paginas.append(body[clave])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return paginas
+
+
+def test_mis_transacciones_recorre_todo_sin_repetir_aunque_haya_fechas_iguales(app, comprador, usuarios, salas):
+    # Varias transacciones con la misma fecha: el id desempata dentro de la página y entre páginas
+    base = datetime(2026, 1, 1)
+    with app.app_context():
+        db.session.add_all([
+            Transaccion(transaction_id=f't{i}', sala_id=salas[0], sender_id=usuarios[1], receiver_wallet='$w/v',
+                        amount=10.0, currency='USD', status='completed' if i % 3 else 'failed',
+                        fecha_creacion=base + timedelta(minutes=i // 3))
+            for i in range(11)
+        ])
+        db.session.commit()
+
+    paginas = recorrer(comprador, '/mis-transacciones?limit=4', 'transacciones')
+    ids = [t['transaction_id'] for pagina in paginas for t in pagina]
+
+    assert [len(pagina) for pagina in paginas] == [4, 4, 3]
+    assert ids == [f't{i}' for i in (10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0)]
+
+    fallidas = recorrer(comprador, '/mis-transacciones?limit=2&status=failed', 'transacciones')
+    assert [t['transaction_id'] for pagina in fallidas for t in pagina] == ['t9', 't6', 't3', 't0']
+
+
+def test_una_fila_nueva_no_desplaza_la_pagina_siguiente(app, comprador, usuarios, salas):
+    with app.app_context():
+        for i in range(4):
+            db.session.add(Transaccion(transaction_id=f't{i}', sala_id=salas[0], sender_id=usuarios[1],
+                                       receiver_wallet='$w/v', amount=10.0, currency='USD', status='completed',
+                                       fecha_creacion=datetime(2026, 1, 1) + timedelta(minutes=i)))
+        db.session.commit()
+
+    primera = comprador.get('/mis-transacciones?limit=2').get_json()
+    with app.app_context():
+        db.session.add(Transaccion(transaction_id='nueva', sala_id=salas[0], sender_id=usuarios[1],
+                                   receiver_wallet='$w/v', amount=10.0, currency='USD', status='completed',
+                                   fecha_creacion=datetime(2026, 2, 1)))
+        db.session.commit()
+    segunda = comprador.get(f'/mis-transacciones?limit=2&cursor={primera["next_cursor"]}').get_json()
+
+    assert [t['transaction_id'] for t in primera['transacciones']] == ['t3', 't2']
+    assert [t['transaction_id'] for t in segunda['transacciones']] == ['t1', 't0']
+    assert segunda['next_cursor'] is None
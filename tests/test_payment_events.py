@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from payment_events import payment_events
+
+
+@pytest.fixture
+def pago(comprador, salas):
+    response = comprador.post('/initiate-payment', json={'receiverWallet': '$wallet.example/vera', 'amount': 10,
+                                                         'salaId': salas[0]})
+    return response.get_json()
+
+
+def test_stream_envia_el_estado_actual(comprador, pago):
+    response = comprador.get(pago['eventsUrl'], buffered=False)
+    primero = next(iter(response.response)).decode()
+    response.close()
+
+    assert response.mimetype == 'text/event-stream'
+    assert primero.startswith('id: 1\nevent: estado\n')
+    estado = json.loads(primero.split('data: ', 1)[1])
+    assert estado['transaccion']['status'] == 'initiated'
+
+
+def test_streams_por_worker_limitados_con_503(app, comprador, pago, monkeypatch):
+    monkeypatch.setattr(payment_events, 'max_streams', 2)
+    abiertos = [comprador.get(pago['eventsUrl'], buffered=False) for _ in range(2)]
+
+    rechazado = comprador.get(pago['eventsUrl'], buffered=False)
+    assert rechazado.status_code == 503
+    assert rechazado.headers['Retry-After'] == '30'
+    # El polling de estado sigue disponible
+    assert comprador.get(pago['statusUrl']).status_code == 200
+
+    # Se libera al cerrar la respuesta, aunque el generador no haya empezado
+    next(iter(abiertos[0].response))
+    for response in abiertos:
+        response.close()
+    assert payment_events.stats()['streams'] == 0
+
+    otra = comprador.get(pago['eventsUrl'], buffered=False)
+    assert otra.status_code == 200
+    otra.close()
+
+
+def test_transaccion_ajena_no_reserva_lugar(app, salas, usuarios, pago):
+    vendedor = app.test_client()
+    with vendedor.session_transaction() as session:
+        session['user_id'] = usuarios[0]
+
+    assert vendedor.get(pago['eventsUrl']).status_code == 404
+    assert payment_events.stats()['streams'] == 0
@@ -0,0 +1,109 @@
+import pytest
+
+import rate_limit
+from rate_limit import RateLimitExceeded, RateLimiter, _espera, _rellenar, rate_limiter
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', reloj)
+    return reloj
+
+
+def test_rellenar_es_proporcional_al_tiempo_y_no_pasa_la_capacidad():
+    # 10 tokens por minuto: uno cada 6 segundos
+    assert _rellenar(0, 100, 106, 10, 60) == pytest.approx(1)
+    assert _rellenar(2.5, 100, 130, 10, 60) == pytest.approx(7.5)
+    assert _rellenar(9, 100, 1000, 10, 60) == 10
+
+
+def test_espera_redondea_hacia_arriba_y_es_al_menos_un_segundo():
+    assert _espera(0, 1, 10, 60) == 6
+    assert _espera(0.5, 1, 10, 60) == 3
+    assert _espera(0.99, 1, 10, 60) == 1
+    assert _espera(0, 3, 10, 60) == 18
+
+
+def test_bucket_local_agota_la_rafaga_y_se_rellena(reloj):
+    limitador = RateLimiter(limites={'regla': (3, 30)})
+    for _ in range(3):
+        limitador.consumir('regla', 'ip-1')
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limitador.consumir('regla', 'ip-1')
+    assert excinfo.value.retry_after == 10
+
+    # Otra clave tiene su propio bucket
+    limitador.consumir('regla', 'ip-2')
+
+    reloj.ahora += 10
+    limitador.consumir('regla', 'ip-1')
+    with pytest.raises(RateLimitExceeded):
+        limitador.consumir('regla', 'ip-1')
+
+    reloj.ahora += 300
+    for _ in range(3):
+        limitador.consumir('regla', 'ip-1')
+    assert limitador.stats()['rejected'] == 2
+
+
+def test_costo_mayor_que_uno(reloj):
+    limitador = RateLimiter(limites={'regla': (5, 50)})
+    limitador.consumir('regla', 'u', costo=4)
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limitador.consumir('regla', 'u', costo=3)
+    assert excinfo.value.retry_after == 20
+    limitador.consumir('regla', 'u', costo=1)
+
+
+def test_bucket_expulsado_vuelve_lleno(reloj):
+    limitador = RateLimiter(limites={'regla': (1, 60)}, max_keys=2)
+    limitador.consumir('regla', 'a')
+    limitador.consumir('regla', 'b')
+    limitador.consumir('regla', 'c')
+    limitador.consumir('regla', 'a')
+    assert len(limitador._buckets) == 2
+
+
+def test_sin_clave_o_deshabilitado_no_limita(reloj):
+    limitador = RateLimiter(limites={'regla': (1, 60)})
+    for _ in range(3):
+        limitador.consumir('regla', None)
+    limitador.enabled = False
+    for _ in range(3):
+        limitador.consumir('regla', 'x')
+
+
+def test_bucket_compartido_en_la_base_vale_para_todos_los_procesos(app, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'enabled', True)
+    monkeypatch.setattr(rate_limiter, 'backend', 'database')
+    monkeypatch.setitem(rate_limiter.limites, 'prueba', (2, 60))
+    with app.app_context():
+        rate_limiter.consumir('prueba', 'ip')
+        rate_limiter.consumir('prueba', 'ip')
+        # Otro worker: su bucket local está lleno, pero el de la tabla no
+        rate_limiter._buckets.clear()
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            rate_limiter.consumir('prueba', 'ip')
+    assert 1 <= excinfo.value.retry_after <= 30
+
+
+def test_login_responde_429_con_retry_after(app, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'enabled', True)
+    client = app.test_client()
+    capacidad = rate_limiter.limites['login_usuario'][0]
+    codigos = [client.post('/login', data={'email': 'nadie@example.com', 'password': 'incorrecta'}).status_code
+               for _ in range(capacidad)]
+
+    assert 429 not in codigos
+    respuesta = client.post('/login', data={'email': 'nadie@example.com', 'password': 'incorrecta'})
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers['Retry-After']) >= 1
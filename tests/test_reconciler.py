@@ -0,0 +1,135 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from db import db
+from models import IngresoVendedor, Transaccion
+from payments_client import payments_client
+from reconciler import transaction_reconciler
+
+
+class RespuestaFalsa:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def pendientes(app, usuarios, salas):
+    """Crea `cantidad` transacciones 'pending' más viejas que stale_after; devuelve sus transaction_id"""
+    def crear(cantidad, edad=timedelta(minutes=10), status='pending'):
+        creada = datetime.utcnow() - edad
+        with app.app_context():
+            inicio = db.session.query(Transaccion).count()
+            ids = [f't{inicio + i}' for i in range(cantidad)]
+            db.session.add_all([
+                Transaccion(transaction_id=transaction_id, sala_id=salas[0], sender_id=usuarios[1],
+                            receiver_wallet='$w/v', amount=10.0, currency='USD', status=status,
+                            fecha_creacion=creada)
+                for transaction_id in ids
+            ])
+            db.session.commit()
+        return ids
+    return crear
+
+
+def servicio(monkeypatch, estados):
+    """El servicio de pagos responde `estados[transaction_id]` (un status o un código HTTP)"""
+    consultadas = []
+
+    def transaction_status(transaction_id):
+        consultadas.append(transaction_id)
+        estado = estados.get(transaction_id, 'pending')
+        if isinstance(estado, int):
+            return RespuestaFalsa(estado)
+        return RespuestaFalsa(200, {'status': estado, 'error': 'Rechazado' if estado == 'failed' else None})
+
+    monkeypatch.setattr(payments_client, 'transaction_status', transaction_status)
+    return consultadas
+
+
+def estados(app):
+    with app.app_context():
+        return dict(db.session.query(Transaccion.transaction_id, Transaccion.status))
+
+
+def test_dos_procesos_nunca_reclaman_la_misma_fila(app, pendientes, monkeypatch):
+    ids = pendientes(60)
+    monkeypatch.setattr(transaction_reconciler, 'page_size', 7)
+    reclamadas = []
+    lock = threading.Lock()
+
+    def reclamar():
+        with app.app_context():
+            ultimo_id = 0
+            while True:
+                pagina, ultimo_id = transaction_reconciler._reclamar_pagina(ultimo_id)
+                if ultimo_id is None:
+                    return
+                with lock:
+                    reclamadas.extend(transaction_id for _, transaction_id in pagina)
+
+    hilos = [threading.Thread(target=reclamar) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sorted(reclamadas) == sorted(ids)
+
+    # Reclamadas hace menos de recheck_interval: nadie las vuelve a tomar
+    with app.app_context():
+        assert transaction_reconciler._reclamar_pagina(0) == ([], None)
+
+
+def test_pasada_aplica_los_estados_del_servicio(app, pendientes, salas, monkeypatch):
+    completada, fallida, sigue, desconocida, con_error = pendientes(5)
+    recien_creada, = pendientes(1, edad=timedelta(seconds=0))
+    consultadas = servicio(monkeypatch, {completada: 'completed', fallida: 'failed', desconocida: 404,
+                                         con_error: 500})
+
+    with app.app_context():
+        pasada = transaction_reconciler.run_once()
+
+    assert recien_creada not in consultadas
+    assert (pasada['checked'], pasada['completed'], pasada['failed'], pasada['errors']) == (4, 1, 1, 1)
+    assert estados(app) == {completada: 'completed', fallida: 'failed', sigue: 'pending', desconocida: 'pending',
+                            con_error: 'pending', recien_creada: 'pending'}
+    with app.app_context():
+        assert [(fila.sala_id, fila.pagos) for fila in db.session.query(IngresoVendedor)] == [(salas[0], 1)]
+
+    # Todas quedaron revisadas: la pasada siguiente no vuelve a consultarlas
+    consultadas.clear()
+    with app.app_context():
+        transaction_reconciler.run_once()
+    assert consultadas == []
+
+
+def test_aplicar_no_pisa_una_transaccion_ya_cerrada(app, pendientes):
+    transaction_id, = pendientes(1, status='failed')
+    with app.app_context():
+        resultado = transaction_reconciler._aplicar([(transaction_id, 'completed', None)])
+        assert db.session.query(IngresoVendedor).count() == 0
+
+    assert resultado['completed'] == 0
+    assert estados(app) == {transaction_id: 'failed'}
+
+
+def test_las_expiradas_no_se_completan(app, pendientes, monkeypatch):
+    vieja, = pendientes(1, edad=timedelta(seconds=transaction_reconciler.expire_after + 60))
+    iniciada, = pendientes(1, edad=timedelta(seconds=transaction_reconciler.expire_after + 60), status='initiated')
+    consultadas = servicio(monkeypatch, {vieja: 'completed', iniciada: 'completed'})
+
+    with app.app_context():
+        pasada = transaction_reconciler.run_once()
+        # Aunque llegue tarde un 'completed' para ella, una expirada ya no cambia
+        transaction_reconciler._aplicar([(vieja, 'completed', None)])
+        assert db.session.query(IngresoVendedor).count() == 0
+
+    assert pasada['expired'] == 2
+    assert consultadas == []
+    assert estados(app) == {vieja: 'expired', iniciada: 'expired'}
@@ -0,0 +1,185 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+import revenue
+from db import db
+from models import IngresoVendedor, Transaccion
+from payments_client import payments_client
+from reconciler import transaction_reconciler
+from revenue import recalcular_ingresos, totales_vendedor
+
+
+class RespuestaFalsa:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def ingresos(app):
+    with app.app_context():
+        return [(fila.sala_id, fila.pagos, fila.total_minor) for fila in db.session.query(IngresoVendedor)]
+
+
+@pytest.fixture
+def pago(app, comprador, salas):
+    """transaction_id de un pago a la espera de la autorización del comprador"""
+    response = comprador.post('/initiate-payment', json={'receiverWallet': '$wallet.example/vera', 'amount': 10,
+                                                         'salaId': salas[0]})
+    transaction_id = response.get_json()['transactionId']
+    with app.app_context():
+        db.session.query(Transaccion).filter_by(transaction_id=transaction_id).update({'status': 'pending'})
+        db.session.commit()
+    return transaction_id
+
+
+def completar_desde_el_reconciliador(app, transaction_id):
+    # En otro hilo, con su propia sesión, como el hilo del reconciliador
+    def aplicar():
+        with app.app_context():
+            transaction_reconciler._aplicar([(transaction_id, 'completed', None)])
+
+    hilo = threading.Thread(target=aplicar)
+    hilo.start()
+    hilo.join()
+
+
+def servicio_completa(monkeypatch, antes=None):
+    def complete_payment(transaction_id, data):
+        if antes is not None:
+            antes(transaction_id)
+        return RespuestaFalsa(200, {'success': True, 'paymentId': 'pago-1'})
+
+    monkeypatch.setattr(payments_client, 'complete_payment', complete_payment)
+
+
+def test_callback_completa_y_suma_al_acumulado(app, comprador, salas, pago, monkeypatch):
+    servicio_completa(monkeypatch)
+
+    response = comprador.get(f'/payment-callback/{pago}?interact_ref=ref')
+
+    assert response.status_code == 302
+    with app.app_context():
+        transaccion = Transaccion.query.filter_by(transaction_id=pago).one()
+        assert (transaccion.status, transaccion.payment_id) == ('completed', 'pago-1')
+        assert transaccion.fecha_completado is not None
+    assert ingresos(app) == [(salas[0], 1, 1000)]
+
+
+def test_reconciliador_antes_del_callback_se_cuenta_una_vez(app, comprador, salas, pago, monkeypatch):
+    completar_desde_el_reconciliador(app, pago)
+    servicio_completa(monkeypatch)
+
+    comprador.get(f'/payment-callback/{pago}?interact_ref=ref')
+
+    assert ingresos(app) == [(salas[0], 1, 1000)]
+
+
+def test_reconciliador_durante_el_callback_se_cuenta_una_vez(app, comprador, salas, pago, monkeypatch):
+    # El reconciliador confirma mientras el callback espera al servicio de pagos
+    servicio_completa(monkeypatch, antes=lambda transaction_id: completar_desde_el_reconciliador(app, transaction_id))
+
+    comprador.get(f'/payment-callback/{pago}?interact_ref=ref')
+
+    assert ingresos(app) == [(salas[0], 1, 1000)]
+
+
+def test_callback_antes_del_reconciliador_se_cuenta_una_vez(app, comprador, salas, pago, monkeypatch):
+    servicio_completa(monkeypatch)
+    comprador.get(f'/payment-callback/{pago}?interact_ref=ref')
+
+    completar_desde_el_reconciliador(app, pago)
+
+    assert ingresos(app) == [(salas[0], 1, 1000)]
+
+
+def test_callback_fallido_no_pisa_un_pago_completado(app, comprador, pago, monkeypatch):
+    completar_desde_el_reconciliador(app, pago)
+    monkeypatch.setattr(payments_client, 'complete_payment',
+                        lambda transaction_id, data: RespuestaFalsa(200, {'success': False, 'error': 'Rechazado'}))
+
+    comprador.get(f'/payment-callback/{pago}?interact_ref=ref')
+
+    with app.app_context():
+        assert Transaccion.query.filter_by(transaction_id=pago).one().status == 'completed'
+
+
+def completadas(app, usuarios, salas, pagos):
+    """Inserta transacciones completadas con el ORM: (sala, monto, moneda, fecha_completado)"""
+    with app.app_context():
+        db.session.add_all([
+            Transaccion(transaction_id=f'c{i}', sala_id=salas[sala], sender_id=usuarios[1], receiver_wallet='$w/v',
+                        amount=monto, currency=moneda, status='completed', fecha_completado=fecha)
+            for i, (sala, monto, moneda, fecha) in enumerate(pagos)
+        ])
+        db.session.commit()
+
+
+def acumulado(app):
+    with app.app_context():
+        return sorted((fila.sala_id, fila.dia, fila.currency, fila.pagos, fila.total_minor)
+                      for fila in db.session.query(IngresoVendedor))
+
+
+def test_upsert_suma_en_la_misma_clave_y_separa_por_dia_y_moneda(app, usuarios, salas):
+    hoy = datetime.utcnow()
+    completadas(app, usuarios, salas, [(0, 10.0, 'USD', hoy), (0, 0.1 + 0.2, 'USD', hoy),
+                                       (0, 10.0, 'USD', hoy - timedelta(days=1)), (1, 1500, 'JPY', hoy)])
+    with app.app_context():
+        # Una transacción que no está completada no suma
+        db.session.add(Transaccion(transaction_id='en-curso', sala_id=salas[0], sender_id=usuarios[1],
+                                   receiver_wallet='$w/v', amount=10.0, currency='USD', status='pending'))
+        db.session.commit()
+
+    assert acumulado(app) == [
+        (salas[0], hoy.date() - timedelta(days=1), 'USD', 1, 1000),
+        (salas[0], hoy.date(), 'USD', 2, 1030),
+        (salas[1], hoy.date(), 'JPY', 1, 1500),
+    ]
+
+
+def test_recalcular_reconstruye_el_mismo_acumulado(app, usuarios, salas):
+    hoy = datetime.utcnow()
+    completadas(app, usuarios, salas, [(0, 10.0, 'USD', hoy), (1, 25.0, 'USD', hoy - timedelta(days=3)),
+                                       (1, 25.0, 'USD', hoy - timedelta(days=3)), (0, 7.5, 'EUR', hoy)])
+    incremental = acumulado(app)
+    with app.app_context():
+        # Un acumulado corrupto (o vacío, antes del backfill) se descarta y se vuelve a sumar
+        db.session.query(IngresoVendedor).update({'pagos': 99})
+        db.session.commit()
+        assert recalcular_ingresos(lote=2) == 4
+
+    assert acumulado(app) == incremental
+
+
+def test_totales_vendedor_separa_la_ventana_reciente(app, usuarios, salas):
+    hoy = datetime.utcnow()
+    completadas(app, usuarios, salas, [(0, 10.0, 'USD', hoy), (1, 25.0, 'USD', hoy - timedelta(days=40)),
+                                       (0, 10.0, 'USD', hoy - timedelta(days=29))])
+    with app.app_context():
+        totales = totales_vendedor(usuarios[0], dias=30)
+
+    assert totales == [{'currency': 'USD', 'pagos': 3, 'total': Decimal('45.00'),
+                        'pagos_recientes': 2, 'total_reciente': Decimal('20.00')}]
+
+
+def test_ventana_de_totales_en_dias_utc(app, usuarios, salas, monkeypatch):
+    # La ventana se cuenta desde el día UTC, el mismo con el que se agrupan los pagos
+    # (a las 23:30 UTC un servidor en UTC-3 todavía está en el día anterior)
+    ahora_utc = datetime(2026, 5, 10, 23, 30)
+    completadas(app, usuarios, salas, [(0, 10.0, 'USD', ahora_utc - timedelta(days=30))])
+
+    class Reloj(datetime):
+        @classmethod
+        def utcnow(cls):
+            return ahora_utc
+
+    monkeypatch.setattr(revenue, 'datetime', Reloj)
+    with app.app_context():
+        assert totales_vendedor(usuarios[0], dias=30)[0]['pagos_recientes'] == 1
+        assert totales_vendedor(usuarios[0], dias=29)[0]['pagos_recientes'] == 0
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+from db import db
+from models import Sala
+from room_codes import FeistelPermutation, RoomCodeAllocator
+
+
+def test_feistel_es_una_permutacion_del_dominio():
+    permutacion = FeistelPermutation('llave', digits=4)
+    salidas = [permutacion.encrypt(n) for n in range(permutacion.domain)]
+
+    assert sorted(salidas) == list(range(10000))
+    assert all(permutacion.decrypt(salida) == n for n, salida in enumerate(salidas))
+
+
+def test_feistel_depende_de_la_llave():
+    a, b = FeistelPermutation('llave-a'), FeistelPermutation('llave-b')
+    assert [a.encrypt(n) for n in range(20)] != [b.encrypt(n) for n in range(20)]
+    # Valores consecutivos del contador no dan códigos consecutivos
+    assert sorted(a.encrypt(n) for n in range(20)) != [a.encrypt(0) + n for n in range(20)]
+
+
+def test_digitos_impares_no_se_aceptan():
+    with pytest.raises(ValueError):
+        FeistelPermutation('llave', digits=7)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "codigos.db"}', connect_args={'timeout': 15})
+    db.metadata.create_all(engine, tables=[db.metadata.tables['secuencias']])
+    yield engine
+    engine.dispose()
+
+
+def test_varios_asignadores_sobre_el_mismo_contador_no_repiten(engine):
+    # Como dos workers: cada uno reserva sus propios bloques del contador compartido
+    asignadores = [RoomCodeAllocator(key='secreta', block_size=7, engine=engine) for _ in range(3)]
+    codigos = []
+    lock = threading.Lock()
+
+    def asignar(asignador):
+        propios = [asignador.allocate() for _ in range(200)]
+        with lock:
+            codigos.extend(propios)
+
+    hilos = [threading.Thread(target=asignar, args=(asignador,)) for asignador in asignadores for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(codigos) == 1200
+    assert len(set(codigos)) == 1200
+    assert all(len(codigo) == 8 and codigo.isdigit() for codigo in codigos)
+
+
+def test_se_agotan_los_codigos(engine):
+    asignador = RoomCodeAllocator(key='secreta', digits=2, block_size=50, engine=engine)
+    codigos = {asignador.allocate() for _ in range(100)}
+
+    assert codigos == {f'{n:02d}' for n in range(100)}
+    with pytest.raises(RuntimeError):
+        asignador.allocate()
+
+
+def test_crear_sala_usa_codigos_unicos(app, usuarios):
+    vendedor = app.test_client()
+    with vendedor.session_transaction() as session:
+        session['user_id'] = usuarios[0]
+    for _ in range(5):
+        response = vendedor.post('/crear-sala', data={'nombre-producto': 'Lámpara', 'precio-producto': '10',
+                                                      'condicion-producto': 'Nuevo', 'descripcion-producto': 'd'})
+        assert response.status_code == 302
+
+    with app.app_context():
+        codigos = [sala.codigo for sala in Sala.query]
+    assert len(set(codigos)) == 5
+    assert all(len(codigo) == 8 and codigo.isdigit() for codigo in codigos)
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from db import db
+from models import Sala
+
+
+def recorrer(client, url, clave):
+    """Todas las páginas siguiendo next_cursor; devuelve la lista de páginas"""
+    paginas, cursor = [], None
+    while True:
+        body = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        paginas.append(body[clave])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return paginas
+
+
+def test_busqueda_por_texto_pagina_por_relevancia(app, comprador, usuarios):
+    with app.app_context():
+        nombres = ['Bicicleta de montaña', 'Casco para bicicleta', 'Bicicleta urbana', 'Mesa de madera',
+                   'Bicicleta infantil', 'Bomba de aire']
+        db.session.add_all([
+            Sala(codigo=f'2000000{i}', nombre_producto=nombre, descripcion='En buen estado', precio=50.0 + i,
+                 condicion='Usado', creador_id=usuarios[0])
+            for i, nombre in enumerate(nombres)
+        ])
+        db.session.commit()
+
+    paginas = recorrer(comprador, '/buscar-salas?q=bicicleta&limit=2', 'salas')
+    encontradas = [sala['nombre_producto'] for pagina in paginas for sala in pagina]
+
+    assert sorted(encontradas) == sorted(n for n in nombres if 'icicleta' in n)
+    assert len(set(encontradas)) == len(encontradas)
+
+    # Por prefijo y sin acentos
+    body = comprador.get('/buscar-salas?q=monta').get_json()
+    assert [sala['nombre_producto'] for sala in body['salas']] == ['Bicicleta de montaña']
+
+
+def test_busqueda_sin_texto_lista_por_fecha_con_filtros(app, comprador, usuarios):
+    with app.app_context():
+        db.session.add_all([
+            Sala(codigo=f'3000000{i}', nombre_producto=f'Producto {i}', precio=10.0 * (i + 1),
+                 condicion='Nuevo' if i % 2 else 'Usado', creador_id=usuarios[0],
+                 fecha_creacion=datetime(2026, 1, 1) + timedelta(days=i))
+            for i in range(6)
+        ])
+        db.session.commit()
+
+    paginas = recorrer(comprador, '/buscar-salas?condicion=Nuevo&precio_min=20&limit=2', 'salas')
+    assert [s['nombre_producto'] for pagina in paginas for s in pagina] == ['Producto 5', 'Producto 3', 'Producto 1']
+    assert comprador.get('/buscar-salas?condicion=Roto').status_code == 400
@@ -0,0 +1,23 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from db import db
+
+
+def test_sentencia_fallida_no_deja_restos_en_la_conexion(app):
+    with app.test_request_context():
+        app.preprocess_request()
+        conexion = db.session.connection()
+
+        with pytest.raises(OperationalError):
+            conexion.execute(text('SELECT * FROM tabla_que_no_existe'))
+        db.session.rollback()
+
+        conexion = db.session.connection()
+        conexion.execute(text('SELECT 1'))
+
+        assert not any(clave.startswith('sql') for clave in conexion.info)
+        assert g.sql_stats.count == 1
+        assert g.sql_stats.statements == {'SELECT 1': 1}